@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-20
+# modified: 2024-08-21
+#
+# Host-side micro-benchmarks of the I2C slave hot path, run under CPython
+# against the simulated register bank in i2c_sim.py. Register accesses are
+# counted by the simulated bank, dictionary lookups by wrapping the register
+# tables of RP2040_I2C_Registers. Timings are CPython timings and are only
+# meaningful relative to each other.
+#
+# usage:  benchmark.py [name...]
+#
+
+import sys, time, tracemalloc
+
+import i2c_sim
+i2c_sim.install()
+
+import RP2040_Slave
+from RP2040_Slave import i2c_slave
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class CountingDict(dict):
+    '''
+    A dict that counts keyed lookups and the entries visited by items().
+    '''
+    lookups = 0
+
+    def __getitem__(self, key):
+        CountingDict.lookups += 1
+        return dict.__getitem__(self, key)
+
+    def items(self):
+        CountingDict.lookups += len(self)
+        return dict.items(self)
+
+def count_lookups():
+    '''
+    Replaces the register tables seen by RP2040_Slave with counting copies.
+    '''
+    for _name in dir(RP2040_Slave):
+        if _name.startswith('I2C_') and isinstance(getattr(RP2040_Slave, _name), dict):
+            setattr(RP2040_Slave, _name, CountingDict(getattr(RP2040_Slave, _name)))
+
+def new_slave():
+    i2c_sim.mem32.reset()
+    return i2c_slave(0, sda=24, scl=25, slaveAddress=0x44)
+
+def fill_rx(count):
+    _controller = i2c_sim.mem32.controller(0)
+    _controller.start(0x44, read=False)
+    for i in range(count):
+        _controller.put(0x20 + ( i % 95 ))
+
+def measure(label, count, fn, unit='byte'):
+    '''
+    Runs fn() and reports register accesses, dict lookups and time per unit.
+    '''
+    i2c_sim.mem32.reset_counts()
+    CountingDict.lookups = 0
+    _t0 = time.perf_counter()
+    fn()
+    _elapsed = time.perf_counter() - _t0
+    print('  {:<28} {:>8.2f} reg/{} {:>8.2f} lookups/{} {:>9.3f} µs/{}'.format(
+            label, i2c_sim.mem32.accesses / count, unit, CountingDict.lookups / count, unit, _elapsed * 1e6 / count, unit))
+
+class AllocationCounter(object):
+    '''
+    Measures the heap allocated by a function. On the device this would be
+    the growth of gc.mem_alloc() with the collector disabled. CPython frees
+    most objects as soon as they are released, so tracemalloc's peak is used
+    instead: the most memory held above the starting point at any moment.
+    This undercounts, but any allocation that grows with the data shows up.
+    '''
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def run(self, fn):
+        _base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        self.total += tracemalloc.get_traced_memory()[1] - _base
+        self.count += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+# legacy access path, as RP2040_Slave performed it before the registers were resolved
+def legacy_available(s):
+    return s.RP2040_Get_32b_i2c_Bits(RP2040_Slave.I2C_OFFSET["I2C_IC_STATUS"],
+            s.get_Bits_Mask("RFNE", RP2040_Slave.I2C_IC_STATUS))
+
+def legacy_read_data_received(s):
+    return s.RP2040_Read_32b_i2c_Reg(RP2040_Slave.I2C_OFFSET["I2C_IC_DATA_CMD"]) \
+            & s.get_Bits_Mask("DAT", RP2040_Slave.I2C_IC_DATA_CMD)
+
+# benchmarks ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+def bench_register_access(rounds=2000):
+    '''
+    Cost of draining the RX FIFO one byte at a time, before and after
+    resolving register addresses and masks at construction, and as a chunk
+    sized by a single read of IC_RXFLR.
+    '''
+    print('register access per received byte (16-byte FIFO, {:d} rounds):'.format(rounds))
+    count_lookups()
+    _slave = new_slave()
+
+    def _legacy():
+        for i in range(rounds):
+            fill_rx(16)
+            while legacy_available(_slave):
+                legacy_read_data_received(_slave)
+
+    def _resolved():
+        for i in range(rounds):
+            fill_rx(16)
+            while _slave.Available():
+                _slave.Read_Data_Received()
+
+    _buffer = bytearray(16)
+
+    def _read_into():
+        for i in range(rounds):
+            fill_rx(16)
+            _slave.read_into(_buffer)
+
+    measure('before (dict lookups)', rounds * 16, _legacy)
+    measure('after (resolved)', rounds * 16, _resolved)
+    measure('read_into() (IC_RXFLR)', rounds * 16, _read_into)
+
+def bench_event_dispatch(rounds=2000):
+    '''
+    Cost of picking up a short write transaction (START, four data bytes,
+    STOP all pending together), handle_event() versus poll_events().
+    '''
+    print('event dispatch per transaction ({:d} rounds):'.format(rounds))
+    _slave = new_slave()
+    _controller = i2c_sim.mem32.controller(0)
+    _state = i2c_slave.I2CStateMachine
+    _passes = [0]
+
+    def _transaction():
+        fill_rx(4)
+        _controller.stop()
+
+    def _handle_event():
+        for i in range(rounds):
+            _transaction()
+            while True:
+                _passes[0] += 1
+                _result = _slave.handle_event()
+                if _result is None:
+                    break
+                elif _result == _state.I2C_RECEIVE:
+                    while _slave.Available():
+                        _slave.Read_Data_Received()
+
+    def _poll_events():
+        for i in range(rounds):
+            _transaction()
+            _passes[0] += 1
+            if _slave.poll_events() & i2c_slave.I2CEvent.RECEIVE:
+                while _slave.Available():
+                    _slave.Read_Data_Received()
+
+    def _idle(fn):
+        def _run():
+            for i in range(rounds):
+                fn()
+        return _run
+
+    measure('handle_event()', rounds, _handle_event, 'txn')
+    print('  {:<28} {:>8.2f} passes/transaction'.format('', _passes[0] / rounds))
+    _passes[0] = 0
+    measure('poll_events()', rounds, _poll_events, 'txn')
+    print('  {:<28} {:>8.2f} passes/transaction'.format('', _passes[0] / rounds))
+    measure('idle handle_event()', rounds, _idle(_slave.handle_event), 'poll')
+    measure('idle poll_events()', rounds, _idle(_slave.poll_events), 'poll')
+
+def bench_irq_latency(requests=200):
+    '''
+    Time from the master's read request (RD_REQ raised, bus held) to the
+    response byte being in the TX FIFO, with the slave running enable() in
+    its own thread: the polling loop against IRQ mode. A status callback
+    costing ~300µs stands in for the NeoPixel, and the heartbeat blink is on.
+    Both are rendered by the slave's StatusIndicator, whose simulated timer
+    runs on bus events in the master's thread, not in the bus loop. The
+    IRQ figures include waiting for the GIL.
+    '''
+    import threading
+    from i2c_slave import I2CSlave
+    print('read request latency, polling loop vs IRQ mode ({:d} requests):'.format(requests))
+    sys.setswitchinterval(0.0001)
+    _bank = i2c_sim.mem32
+
+    def _neopixel(message, color):
+        _t0 = time.perf_counter()
+        while time.perf_counter() - _t0 < 0.0003:
+            pass
+
+    for _label, _irq in ( ('polling loop', False), ('IRQ mode', True) ):
+        _bank.reset()
+        _slave = I2CSlave(blink=True, callback=_neopixel, irq=_irq)
+        _thread = threading.Thread(target=_slave.enable, daemon=True)
+        _thread.start()
+        time.sleep(0.01)
+        _master = i2c_sim.SimulatedMaster(_bank)
+        _controller = _bank.controller(0)
+        _master.write(0x44, [1, 4] + list(b'ping') + [1, 0xFF])
+        time.sleep(0.01)
+        _latencies = []
+        for i in range(requests):
+            _controller.start(0x44, read=True)
+            _bank.raise_irq()
+            _t0 = time.perf_counter()
+            _byte = _controller.get()
+            while _byte is None:
+                _bank.raise_irq()
+                time.sleep(0)
+                _byte = _controller.get()
+            _latencies.append(time.perf_counter() - _t0)
+            _controller.nack()
+            _controller.stop()
+            _bank.raise_irq()
+            time.sleep(0.002)
+        _slave.disable()
+        _thread.join(1.0)
+        _latencies.sort()
+        print('  {:<28} mean {:>9.1f} µs  median {:>9.1f} µs  max {:>9.1f} µs'.format(_label,
+                sum(_latencies) * 1e6 / len(_latencies), _latencies[len(_latencies) // 2] * 1e6, _latencies[-1] * 1e6))
+
+def bench_dma(rounds=500, length=14):
+    '''
+    CPU cost of a write of 'length' bytes and a read of 32 bytes through
+    I2CSlave, serviced by poll(): byte by byte against DMA channels. Bytes
+    moved by the simulated DMA channel are not counted as register accesses,
+    as on the device they are not made by the CPU. The written frame is a
+    legacy text frame so that the byte parser accepts it.
+    '''
+    from i2c_slave import I2CSlave
+    print('bulk transfer, byte by byte vs DMA ({:d} rounds):'.format(rounds))
+    _frame = [1, length - 4] + [0x41 + ( i % 26 ) for i in range(length - 4)] + [1, 0xFF]
+    _response = bytearray(range(32))
+    for _label, _dma in ( ('byte by byte', None), ('DMA', i2c_sim.SimulatedDmaChannel) ):
+        _slave = i2c_sim.new_slave(I2CSlave, dma=_dma)
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+        if _dma:
+            _slave.receive_into(bytearray(64))
+
+        def _write():
+            for i in range(rounds):
+                _master.write(0x44, _frame)
+                _slave.reset() # as the master's read of the response would
+
+        def _read():
+            for i in range(rounds):
+                if _dma:
+                    _slave.transmit_from(_response)
+                _master.read(0x44, 32)
+
+        measure('{} write'.format(_label), rounds * length, _write)
+        measure('{} read'.format(_label), rounds * 32, _read)
+
+def bench_tx_preload(rounds=500, length=32):
+    '''
+    A read of 'length' bytes answered one byte per read request (so one
+    clock stretch per byte) against respond_with(), which preloads the TX
+    FIFO. The simulated slave only runs while the master is held, so the
+    master still waits each time the FIFO runs dry; on the device the
+    TX_EMPTY refill keeps ahead of the bus.
+    '''
+    from i2c_slave import I2CSlave
+    print('multi-byte read of {:d} bytes ({:d} rounds):'.format(length, rounds))
+    _response = bytearray(range(length))
+    for _label, _preload in ( ('byte per request', False), ('respond_with()', True) ):
+        _slave = i2c_sim.new_slave(I2CSlave)
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+
+        def _read():
+            for i in range(rounds):
+                if _preload:
+                    _slave.respond_with(_response)
+                _master.read(0x44, length)
+
+        measure(_label, rounds * length, _read)
+        print('  {:<28} {:>8.2f} stalls/byte'.format('', _master.stalls / ( rounds * length )))
+
+def bench_allocation(rounds=200, lengths=(2, 12)):
+    '''
+    Heap allocated per received frame, for frames of the given lengths: the
+    former receive path, which appended one chr() per byte to a StringBuilder
+    (checking its length() per byte) and to the transaction's data_byte
+    list, against I2CSlave.poll() copying into its preallocated FrameBuffer.
+    The difference between the two lengths, per byte, is what the path
+    allocates for each byte received.
+    '''
+    from i2c_slave import I2CSlave
+    from stringbuilder import StringBuilder
+    print('heap allocated per frame ({:d} rounds):'.format(rounds))
+
+    class _BufferSlave(I2CSlave):
+        # a handler that uses the bytes in place rather than asking for text
+        def process_buffer(self, buffer):
+            return buffer
+
+    def _legacy(payload):
+        def _receive():
+            _sb = StringBuilder()
+            _data_byte = []
+            for _byte in payload:
+                _data_byte.append(_byte)
+                _sb.append(chr(_byte))
+                if _sb.length() > I2CSlave.MAX_CHARS:
+                    break
+            return _sb.to_string()
+        return _receive
+
+    def _slave(cls):
+        def _factory(payload):
+            _slave = i2c_sim.new_slave(cls)
+            _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+            _frame = [1, len(payload)] + list(payload) + [1, 0xFF]
+            def _receive():
+                _master.write(0x44, _frame)
+                _slave.reset()
+            return _receive
+        return _factory
+
+    tracemalloc.start()
+    try:
+        for _label, _factory in ( ('StringBuilder per byte', _legacy),
+                                  ('poll(), FrameBuffer', _slave(_BufferSlave)),
+                                  ('poll(), to_string()', _slave(I2CSlave)) ):
+            _means = []
+            for _length in lengths:
+                _fn = _factory(bytes(0x41 + ( i % 26 ) for i in range(_length)))
+                _fn() # warm up
+                _counter = AllocationCounter()
+                for i in range(rounds):
+                    _counter.run(_fn)
+                _means.append(_counter.mean)
+            _per_byte = ( _means[-1] - _means[0] ) / ( lengths[-1] - lengths[0] )
+            print('  {:<28} {:>8.1f} B/frame ({:d} chars) {:>8.1f} B/frame ({:d} chars) {:>6.2f} B/byte'.format(
+                    _label, _means[0], lengths[0], _means[-1], lengths[-1], _per_byte))
+    finally:
+        tracemalloc.stop()
+
+def bench_frame_parser(rounds=2000, seed=1):
+    '''
+    Throughput of the FrameParser fed a stream of legacy text frames whole,
+    split into random chunks of 1 to 16 bytes (as drained from the RX FIFO
+    by successive RX events), and one byte at a time. Every frame must be
+    recovered however the stream is split.
+    '''
+    import random
+    from frame_parser import FrameParser
+    print('frame parser throughput ({:d} frames):'.format(rounds))
+    _random = random.Random(seed)
+    _texts = [ ''.join(chr(_random.randint(32, 126)) for i in range(_random.randint(2, 32))) for j in range(rounds) ]
+    _data = bytearray()
+    for _text in _texts:
+        _payload = _text.encode('ascii')
+        _data.extend(bytes([1, len(_payload)]) + _payload + bytes([1, 0xFF]))
+    _splits = {
+        'whole stream':       [ len(_data) ],
+        'random 1-16 bytes':  [],
+        'one byte at a time': list(range(1, len(_data) + 1)),
+    }
+    _index = 0
+    while _index < len(_data):
+        _index = min(len(_data), _index + _random.randint(1, 16))
+        _splits['random 1-16 bytes'].append(_index)
+    for _label, _ends in _splits.items():
+        _parser = FrameParser()
+        _frames = 0
+        _t0 = time.perf_counter()
+        _start = 0
+        for _end in _ends:
+            while _start < _end:
+                _start = _parser.feed(_data, _start, _end)
+                if _parser.complete:
+                    _frames += 1
+        _elapsed = time.perf_counter() - _t0
+        assert _frames == rounds, '{}: {:d} of {:d} frames'.format(_label, _frames, rounds)
+        print('  {:<28} {:>8.3f} µs/byte {:>10.0f} frames/s {:>8d} chunks'.format(
+                _label, _elapsed * 1e6 / len(_data), _frames / _elapsed, len(_ends)))
+
+def bench_stream(length=2048, seed=1):
+    '''
+    Effective throughput of a message of 'length' bytes on the simulated
+    bus: sent 32 bytes at a time as text frames (two writes and a response
+    read each) and as binary frames (one write and a response read each),
+    each also as combined requests (the write and the read joined by a
+    repeated start), then as one chunked transfer with an acknowledgement read per window.
+    The bus time is computed from the bytes clocked at 400kHz, ignoring
+    clock stretching: each stall is a further wait for the slave, typically
+    a response being prepared. The wall time is CPython time and only
+    relative.
+    '''
+    import random
+    from i2c_master import I2CMaster
+    from i2c_transfer_slave import I2CTransferSlave
+    print('{:d}-byte message, effective throughput at 400kHz:'.format(length))
+    _random = random.Random(seed)
+    _text = ''.join(chr(_random.randint(32, 126)) for i in range(length))
+    _blob = _text.encode('ascii')
+
+    def _frames(send, step):
+        def _run(master):
+            for _offset in range(0, length, step):
+                send(master)(_blob[_offset:_offset + step])
+        return _run
+
+    _cases = (
+        ( 'text frames (32 B)',  False, _frames(lambda m: lambda b: m.send(b.decode('ascii')), 32) ),
+        ( 'text requests (32 B)', False, _frames(lambda m: lambda b: m.request(b.decode('ascii')), 32) ),
+        ( 'binary frames (32 B)', True, _frames(lambda m: m.send_binary, 32) ),
+        ( 'binary requests (32 B)', True, _frames(lambda m: m.request_binary, 32) ),
+        ( 'stream, window 1',     True, lambda m: m.send_stream(_blob, window=1) ),
+        ( 'stream, window 4',     True, lambda m: m.send_stream(_blob, window=4) ),
+        ( 'stream, window 16',    True, lambda m: m.send_stream(_blob, window=16) ),
+    )
+    for _label, _binary, _run in _cases:
+        if _binary:
+            _slave = i2c_sim.new_slave(I2CTransferSlave, capacity=length)
+        else:
+            _slave = i2c_sim.new_slave()
+        _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+        _master = I2CMaster(bus=_bus)
+        _t0 = time.perf_counter()
+        _run(_master)
+        _elapsed = time.perf_counter() - _t0
+        _bus_time = _bus.bus_time(400000)
+        print('  {:<24} {:>5d} txns {:>5d} stalls {:>6d} wire B {:>6.1f} ms bus {:>6.2f} kB/s {:>7.1f} ms wall'.format(
+                _label, _bus.starts, _bus.stalls, _bus.wire_bytes, _bus_time * 1e3, length / _bus_time / 1000, _elapsed * 1e3))
+
+def bench_work_queue(frames=64, burst=8, work_us=500):
+    '''
+    The time the master is held per frame when process_buffer() takes
+    'work_us' µs: inline, the bus waits for it, while with a work queue the
+    frames are only copied, then processed between bursts of 'burst' frames,
+    as an application loop would.
+    '''
+    from i2c_slave import I2CSlave
+    print('{:d} frames, {:d} µs of work each, in bursts of {:d}:'.format(frames, work_us, burst))
+
+    class _SlowSlave(I2CSlave):
+        def process_buffer(self, buffer):
+            _t0 = time.perf_counter()
+            while ( time.perf_counter() - _t0 ) * 1e6 < work_us:
+                pass
+            return buffer.to_string()
+
+    _frame = [0x01, 5] + list(b'hello') + [0x01, 0xFF]
+    for _label, _queue in ( ('inline', 0), ('work queue', burst) ):
+        _slave = i2c_sim.new_slave(_SlowSlave, queue=_queue)
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+        _held = 0.0
+        for i in range(frames // burst):
+            _t0 = time.perf_counter()
+            for j in range(burst):
+                _master.write(0x44, _frame)
+            _held += time.perf_counter() - _t0
+            if _queue:
+                _slave.process_frames()
+        print('  {:<28} {:>9.1f} µs/frame on the bus; {:d} dropped'.format(
+                _label, _held * 1e6 / frames, _slave.frames_dropped if _queue else 0))
+
+def bench_profiling(frames=500):
+    '''
+    The cost of a frame and its response, with and without profiling: off,
+    the only addition to the loop is a few tests per event snapshot.
+    '''
+    from i2c_slave import I2CSlave
+    print('{:d} frames with responses, profiling off and on:'.format(frames))
+    _frame = [0x01, 5] + list(b'hello') + [0x01, 0xFF]
+    for _label, _profile in ( ('off', False), ('on', True) ):
+        _slave = i2c_sim.new_slave(I2CSlave, profile=_profile)
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+        _t0 = time.perf_counter()
+        for i in range(frames):
+            _master.write(0x44, _frame)
+            _master.read_byte_data(0x44, 0x01)
+        _elapsed = time.perf_counter() - _t0
+        print('  {:<28} {:>9.1f} µs/frame'.format(_label, _elapsed * 1e6 / frames))
+        if _profile:
+            _slave.profiler.dump()
+
+BENCHMARKS = {
+    'register_access': bench_register_access,
+    'event_dispatch':  bench_event_dispatch,
+    'irq_latency':     bench_irq_latency,
+    'dma':             bench_dma,
+    'tx_preload':      bench_tx_preload,
+    'allocation':      bench_allocation,
+    'frame_parser':    bench_frame_parser,
+    'stream':          bench_stream,
+    'work_queue':      bench_work_queue,
+    'profiling':       bench_profiling,
+}
+
+# main ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+if __name__ == '__main__':
+    _names = sys.argv[1:] or list(BENCHMARKS)
+    for _name in _names:
+        if _name not in BENCHMARKS:
+            print("unknown benchmark '{}'; choose from: {}".format(_name, ', '.join(BENCHMARKS)))
+            sys.exit(1)
+        BENCHMARKS[_name]()
+
+#EOF
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# The master side of the I2C slave protocol, for use on a Raspberry Pi.
+#
+# see smbus2
+# https://smbus2.readthedocs.io/en/latest/#smbus2.SMBus.write_block_data
+#
+
+from response import Response
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class I2CMaster(object):
+    '''
+    Sends messages to an RP2040 I2C slave and returns its responses.
+
+    :param bus_number:  the I2C bus number; default is 1
+    :param address:     the I2C address of the slave; default is 0x44
+    :param register:    the register the messages are written to; default is 1
+    :param bus:         an optional SMBus-compatible object used in place of
+                        opening the bus, e.g. for testing
+    :param sequenced:   if True, number each message for a slave constructed
+                        with sequenced=True, so that it may be resent safely
+    :param retries:     when sequenced, the number of times a message is
+                        resent after a bus error; default is 2
+    '''
+    I2C_SLAVE_ADDRESS    = 0x44
+    CONFIG_REGISTER      = 1
+    MAX_CHARS            = 32
+    SMBUS_BLOCK_MAX      = 32    # the most bytes an SMBus block read returns
+    RESPONSE_REGISTER    = 0xA0  # reads return the slave's set_response() block
+    STATS_REGISTER       = 0xC0  # reads return the slave's performance counters
+    TRACE_REGISTER       = 0xE0  # reads return the slave's bus trace
+    TRACE_HEADER_SIZE    = 16
+    GENERAL_CALL_ADDRESS = 0x00
+    # chunked transfers (see upy/i2c_transfer_slave.py)
+    BEGIN_REGISTER       = 0xB0
+    CHUNK_REGISTER       = 0xB1
+    ACK_REGISTER         = 0xB2
+    CHUNK_SIZE           = MAX_CHARS - 2
+    MAX_RESENDS          = 8  # windows resent in a row without progress
+    # general call commands with a meaning defined by the I2C specification
+    RESERVED_COMMANDS    = ( 0x00, 0x04, 0x06 )
+    # the slave's performance counters, in the order of its STAT_ indices
+    STAT_NAMES           = ( 'transactions', 'bytes_in', 'bytes_out', 'tx_aborts',
+                             'loop_max_us', 'loop_mean_us', 'request_max_us',
+                             'bad_address', 'out_of_sync', 'invalid_char', 'source_too_large',
+                             'unvalidated', 'empty_payload', 'payload_too_large',
+                             'unknown_error', 'busy', 'duplicates' )
+
+    def __init__(self, bus_number=1, address=I2C_SLAVE_ADDRESS, register=CONFIG_REGISTER, bus=None, sequenced=False, retries=2):
+        if bus is None:
+            try:
+                # smbus2 also supports i2c_rdwr(), as used by request()
+                from smbus2 import SMBus
+            except ImportError:
+                from smbus import SMBus
+            bus = SMBus(bus_number)
+        self._bus = bus
+        self._address = address
+        self._register = register
+        # the first message of a sequence is numbered 0, which clears the slave's
+        # cache unless it is a resend of the frame before, also numbered 0
+        self._sequence = 0 if sequenced else None
+        self._retries = retries if sequenced else 0
+
+    @property
+    def address(self):
+        return self._address
+
+    def _payload(self, data):
+        '''
+        Returns data as a list of bytes, preceded when sequenced by the next
+        sequence number: 0 for the first message, then 1 to 255 in turn.
+        '''
+        _payload = list(data)
+        if self._sequence is not None:
+            _payload.insert(0, self._sequence)
+            self._sequence = self._sequence % 255 + 1
+        return _payload
+
+    def _text_payload(self, value):
+        # convert source string to a list of bytes as a payload
+        _payload = self._payload(bytes(value, 'utf-8'))
+        if len(_payload) > self.MAX_CHARS:
+            raise ValueError('source text ({:d} chars) too long: {:d} maximum.'.format(len(_payload), self.MAX_CHARS))
+        if len(_payload) == 1 and self._sequence is not None:
+            # a length byte of 0x01 would be taken as 'validate'
+            raise ValueError('a sequenced message needs at least one character.')
+        return _payload
+
+    def _attempt(self, transfer, *args):
+        '''
+        Calls transfer with args, and when sequenced calls it again after a
+        bus error, up to the number of retries: the slave answers a message
+        it has already handled from its cache rather than handling it again.
+        '''
+        for _attempt in range(self._retries + 1):
+            try:
+                return transfer(*args)
+            except OSError:
+                if _attempt == self._retries:
+                    raise
+
+    def send(self, value):
+        '''
+        Sends the string to the slave as a packet, then reads and returns
+        the slave's Response. When sequenced the sequence number takes one
+        of the MAX_CHARS bytes.
+        '''
+        return self._attempt(self._send, self._text_payload(value))
+
+    def _send(self, payload):
+        self._bus.write_block_data(self._address, self._register, payload)
+        # completion code
+        self._bus.write_byte_data(self._address, self._register, 0xff)
+        return Response.from_value(self._bus.read_byte_data(self._address, self._register))
+
+    def request(self, value):
+        '''
+        Sends the string to the slave as a validated packet and reads the
+        slave's Response in a single combined transaction: the write and the
+        read are joined by a repeated start, which the slave takes as the end
+        of the packet. This needs a bus supporting i2c_rdwr(), e.g. smbus2,
+        and is one bus transaction rather than the three of send().
+        '''
+        _payload = self._text_payload(value)
+        # register, length, characters, then 0x01 to validate
+        return self._attempt(self._request, [ self._register, len(_payload) ] + _payload + [ 0x01 ])
+
+    def request_binary(self, data):
+        '''
+        As send_binary(), but in a single combined transaction, as request().
+        '''
+        return self._attempt(self._request, [ self._register ] + self.encode_frame(self._payload(data)))
+
+    def _request(self, data):
+        return Response.from_value(self._write_then_read(data, 1)[0])
+
+    def _write_then_read(self, data, length):
+        from smbus2 import i2c_msg
+        _write = i2c_msg.write(self._address, data)
+        _read = i2c_msg.read(self._address, length)
+        self._bus.i2c_rdwr(_write, _read)
+        return list(_read)
+
+    @staticmethod
+    def encode_frame(data):
+        '''
+        Returns the binary frame for data (bytes, a bytearray or a list of
+        ints): the length, then the data unchanged. Preceded by the register,
+        as an SMBus block write sends it, this is what the slave expects.
+        '''
+        _payload = list(data)
+        if len(_payload) > I2CMaster.MAX_CHARS:
+            raise ValueError('binary payload ({:d} bytes) too long: {:d} maximum.'.format(len(_payload), I2CMaster.MAX_CHARS))
+        return [ len(_payload) ] + _payload
+
+    def send_binary(self, data):
+        '''
+        Sends data to a slave in binary mode in a single write, then
+        reads and returns the slave's Response. Any byte values may be sent,
+        e.g. a struct packed with struct.pack().
+        '''
+        return self._attempt(self._send_binary, self.encode_frame(self._payload(data)))
+
+    def _send_binary(self, frame):
+        self._bus.write_i2c_block_data(self._address, self._register, frame)
+        return Response.from_value(self._bus.read_byte_data(self._address, self._register))
+
+    def read_response(self, length=MAX_CHARS - 1):
+        '''
+        Reads the block set by the slave's set_response() in one transaction,
+        returning its data as bytes. The slave sends a count byte, then the
+        data; length is the most data bytes expected, so length + 1 bytes are
+        read. An SMBus block read is limited to 32 bytes, so a longer one is
+        made as a combined transaction, which (as request()) needs a bus
+        supporting i2c_rdwr(). A ValueError is raised if the slave's response
+        is longer than length.
+        '''
+        if length + 1 > self.SMBUS_BLOCK_MAX:
+            _block = self._write_then_read([ self.RESPONSE_REGISTER ], length + 1)
+        else:
+            _block = self._bus.read_i2c_block_data(self._address, self.RESPONSE_REGISTER, length + 1)
+        _count = _block[0]
+        if _count > length:
+            raise ValueError('response ({:d} bytes) longer than the {:d} bytes read.'.format(_count, length))
+        return bytes(_block[1:_count + 1])
+
+    def read_stats(self):
+        '''
+        Reads the slave's performance counters in one combined transaction
+        (as request(), this needs a bus supporting i2c_rdwr()), returning
+        them decoded by decode_stats(). The counters wrap at 2**32, so a
+        scraper should take the difference of successive readings modulo
+        2**32. The slave answers in polled mode only.
+        '''
+        _data = self._write_then_read([ self.STATS_REGISTER ], 4 * len(self.STAT_NAMES))
+        return self.decode_stats(_data)
+
+    @staticmethod
+    def decode_stats(data, first=0):
+        '''
+        Decodes the counters read from the slave's STATS_REGISTER + first,
+        four bytes each, least significant first, returning a dict of the
+        values keyed by their STAT_NAMES.
+        '''
+        _stats = {}
+        for i in range(len(data) // 4):
+            _stats[I2CMaster.STAT_NAMES[first + i]] = int.from_bytes(bytes(data[4 * i:4 * i + 4]), 'little')
+        return _stats
+
+    def read_trace(self):
+        '''
+        Reads the slave's bus trace, returning it as bytes to be decoded by
+        trace_decoder.py. The header is read first for the size of the
+        trace, then the whole trace in one combined transaction (as
+        request(), this needs a bus supporting i2c_rdwr()). The slave
+        answers in polled mode only, when constructed with a trace.
+        '''
+        _header = self._write_then_read([ self.TRACE_REGISTER ], self.TRACE_HEADER_SIZE)
+        _capacity = _header[2] | ( _header[3] << 8 )
+        return bytes(self._write_then_read([ self.TRACE_REGISTER ], self.TRACE_HEADER_SIZE + _capacity * _header[1]))
+
+    def send_stream(self, data, window=8):
+        '''
+        Sends data (bytes or a bytearray) of any length up to the slave's
+        capacity as a chunked transfer to an I2CTransferSlave: a BEGIN frame
+        with the total length, then numbered chunks of up to CHUNK_SIZE bytes.
+        The slave's acknowledgement is read once per window of chunks rather
+        than after each one; if chunks were dropped, sending resumes from the
+        first the slave is missing. Returns the slave's final Response, OKAY
+        once the whole message has been accepted.
+        '''
+        if window < 1:
+            raise ValueError('window must be at least 1.')
+        _length = len(data)
+        _view = memoryview(bytes(data))
+        _chunks = ( _length + self.CHUNK_SIZE - 1 ) // self.CHUNK_SIZE
+        if _chunks > 0x10000:
+            raise ValueError('message ({:d} bytes) too long for a chunked transfer.'.format(_length))
+        self._bus.write_i2c_block_data(self._address, self.BEGIN_REGISTER,
+                self.encode_frame(_length.to_bytes(4, 'little')))
+        _sequence = 0
+        _resends = 0
+        while True:
+            _end = min(_sequence + window, _chunks)
+            for _chunk in range(_sequence, _end):
+                _offset = _chunk * self.CHUNK_SIZE
+                _frame = list(( _chunk & 0xFFFF ).to_bytes(2, 'little')) + list(_view[_offset:_offset + self.CHUNK_SIZE])
+                self._bus.write_i2c_block_data(self._address, self.CHUNK_REGISTER, self.encode_frame(_frame))
+            _ack = self._bus.read_i2c_block_data(self._address, self.ACK_REGISTER, 3)
+            _response = Response.from_value(_ack[0])
+            _next = _ack[1] | ( _ack[2] << 8 )
+            if _response == Response.OUT_OF_SYNC:
+                # chunks were dropped: give up only if none are getting through
+                _resends = _resends + 1 if _next <= _sequence else 0
+                if _resends > self.MAX_RESENDS:
+                    return _response
+            elif _response != Response.OKAY:
+                return _response
+            if _next >= _chunks:
+                return _response
+            _sequence = _next
+
+    def broadcast(self, command, data=()):
+        '''
+        Writes a command byte followed by the data to the general call address,
+        so that every slave acknowledging general calls receives it in a single
+        transaction. No response is returned. The command values reserved by
+        the I2C specification (0x00, 0x04 and 0x06, which may reset or
+        re-address other devices on the bus) are refused.
+        '''
+        if command in self.RESERVED_COMMANDS:
+            raise ValueError('general call command 0x{:02X} is reserved.'.format(command))
+        self._bus.write_i2c_block_data(self.GENERAL_CALL_ADDRESS, command, list(data))
+
+    def close(self):
+        if hasattr(self._bus, 'close'):
+            self._bus.close()
+
+#EOF
@@ -0,0 +1,853 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-20
+# modified: 2024-08-21
+#
+# A host-side simulation of the RP2040 I2C peripheral, used to exercise the
+# MicroPython slave code in ./upy/ under CPython on Linux.
+#
+# Calling install() registers stand-ins for the MicroPython 'machine', 'utime'
+# and 'micropython' modules and adds ./upy/ to the module path, so that the
+# slave classes can then be imported unchanged. The 'mem32' stand-in is a
+# SimulatedRegisterBank that models the DW_apb_i2c slave registers of both
+# I2C controllers, counting every register access so that the cost of the
+# slave's hot path can be measured. A 'uasyncio' stand-in wraps CPython's
+# asyncio, and an 'smbus2' stand-in provides the i2c_msg class used with
+# SimulatedMaster.i2c_rdwr().
+#
+# A SimulatedDmaChannel stands in for an RP2040 DMA channel (see
+# upy/i2c_dma.py), moving bytes between a controller's FIFOs and a buffer
+# whenever the controller's DMA handshake would request it.
+#
+# A SimulatedMaster drives the bus side of a controller with an SMBus-like
+# API. Whenever the slave would clock-stretch the bus (RX FIFO full, or a
+# read request with the TX FIFO empty), the master calls a 'pump' function,
+# normally a single pass of the slave's service loop.
+#
+# The slave samples its interrupt line from a machine.Timer callback. The
+# stand-in Timer is never scheduled; instead the register bank "raises the
+# IRQ" by running every attached timer callback after each bus event, as
+# if the interrupt were taken the moment the hardware asserted it. While the
+# slave has interrupts disabled (machine.disable_irq()) the bus side waits.
+#
+# new_slave() and new_slave_pair() reset the register bank and construct the
+# slaves used by the tests and benchmarks, once install() has been called.
+#
+
+import asyncio, os, sys, threading, time, types
+from collections import deque
+
+I2C0_BASE     = 0x40044000
+I2C1_BASE     = 0x40048000
+FIFO_DEPTH    = 16
+GENERAL_CALL_ADDRESS = 0x00
+
+# register offsets (see RP2040_I2C_Registers.py) ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+IC_CON              = 0x00
+IC_SAR              = 0x08
+IC_DATA_CMD         = 0x10
+IC_INTR_STAT        = 0x2c
+IC_INTR_MASK        = 0x30
+IC_RAW_INTR_STAT    = 0x34
+IC_RX_TL            = 0x38
+IC_TX_TL            = 0x3c
+IC_CLR_INTR         = 0x40
+IC_CLR_RX_UNDER     = 0x44
+IC_CLR_RX_OVER      = 0x48
+IC_CLR_TX_OVER      = 0x4c
+IC_CLR_RD_REQ       = 0x50
+IC_CLR_TX_ABRT      = 0x54
+IC_CLR_RX_DONE      = 0x58
+IC_CLR_ACTIVITY     = 0x5c
+IC_CLR_STOP_DET     = 0x60
+IC_CLR_START_DET    = 0x64
+IC_CLR_GEN_CALL     = 0x68
+IC_ENABLE           = 0x6c
+IC_STATUS           = 0x70
+IC_TXFLR            = 0x74
+IC_RXFLR            = 0x78
+IC_SDA_HOLD         = 0x7c
+IC_TX_ABRT_SOURCE   = 0x80
+IC_DMA_CR           = 0x88
+IC_DMA_TDLR         = 0x8c
+IC_DMA_RDLR         = 0x90
+IC_SDA_SETUP        = 0x94
+IC_ACK_GENERAL_CALL = 0x98
+IC_ENABLE_STATUS    = 0x9c
+IC_FS_SPKLEN        = 0xa0
+IC_CLR_RESTART_DET  = 0xa8
+
+# raw interrupt bits
+RX_UNDER    = 0x0001
+RX_OVER     = 0x0002
+RX_FULL     = 0x0004
+TX_OVER     = 0x0008
+TX_EMPTY    = 0x0010
+RD_REQ      = 0x0020
+TX_ABRT     = 0x0040
+RX_DONE     = 0x0080
+ACTIVITY    = 0x0100
+STOP_DET    = 0x0200
+START_DET   = 0x0400
+GEN_CALL    = 0x0800
+RESTART_DET = 0x1000
+
+FIRST_DATA_BYTE      = 0x800
+RX_FIFO_FULL_HLD_CTRL = 0x200
+ABRT_SLVFLUSH_TXFIFO = 0x2000
+
+# read-to-clear registers and the raw interrupt bit(s) each one clears
+_CLEAR_REGISTERS = {
+    IC_CLR_RX_UNDER:    RX_UNDER,
+    IC_CLR_RX_OVER:     RX_OVER,
+    IC_CLR_TX_OVER:     TX_OVER,
+    IC_CLR_RD_REQ:      RD_REQ,
+    IC_CLR_TX_ABRT:     TX_ABRT,
+    IC_CLR_RX_DONE:     RX_DONE,
+    IC_CLR_ACTIVITY:    ACTIVITY,
+    IC_CLR_STOP_DET:    STOP_DET,
+    IC_CLR_START_DET:   START_DET,
+    IC_CLR_GEN_CALL:    GEN_CALL,
+    IC_CLR_RESTART_DET: RESTART_DET,
+}
+# registers that can only be written while the controller is disabled
+_DISABLED_ONLY = ( IC_SDA_HOLD, IC_SDA_SETUP, IC_FS_SPKLEN )
+# all bits cleared by a read of IC_CLR_INTR (RX_FULL and TX_EMPTY are hardware-managed)
+_CLEARABLE = RX_UNDER | RX_OVER | TX_OVER | RD_REQ | TX_ABRT | RX_DONE \
+        | ACTIVITY | STOP_DET | START_DET | GEN_CALL | RESTART_DET
+
+# RP2040 reset values of the registers the slave touches
+_RESET_VALUES = {
+    IC_CON:              0x00000065,
+    IC_SAR:              0x00000055,
+    IC_INTR_MASK:        0x000008ff,
+    IC_RX_TL:            0x00000000,
+    IC_TX_TL:            0x00000000,
+    IC_ENABLE:           0x00000000,
+    IC_SDA_HOLD:         0x00000001,
+    IC_DMA_CR:           0x00000000,
+    IC_DMA_TDLR:         0x00000000,
+    IC_DMA_RDLR:         0x00000000,
+    IC_SDA_SETUP:        0x00000064,
+    IC_ACK_GENERAL_CALL: 0x00000001,
+    IC_FS_SPKLEN:        0x00000007,
+}
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class SimulatedI2C(object):
+    '''
+    Models the slave side of one DW_apb_i2c controller: its registers, RX and
+    TX FIFOs and raw interrupt status. Register access comes from the slave
+    via the SimulatedRegisterBank, bus activity from a SimulatedMaster.
+    '''
+    def __init__(self, i2c_id):
+        self.i2c_id = i2c_id
+        self.reset()
+
+    def reset(self):
+        self.registers = dict(_RESET_VALUES)
+        self.rx_fifo = deque()
+        self.tx_fifo = deque()
+        self.raw = 0
+        self.abort_source = 0
+        self._first = False
+        self._held = False
+        self._active = False
+        self.rx_dma = None
+        self.tx_dma = None
+
+    def service_dma(self):
+        '''
+        Lets an active DMA channel move bytes while its DREQ is asserted:
+        RX while the RX FIFO holds more than IC_DMA_RDLR bytes, TX while the
+        TX FIFO holds no more than IC_DMA_TDLR bytes.
+        '''
+        _dma_cr = self.registers[IC_DMA_CR]
+        if _dma_cr & 0x1 and self.rx_dma:
+            while len(self.rx_fifo) > self.registers[IC_DMA_RDLR] and self.rx_dma.active():
+                self.rx_dma.transfer(self.rx_fifo.popleft() & 0xFF)
+        if _dma_cr & 0x2 and self.tx_dma:
+            while len(self.tx_fifo) <= self.registers[IC_DMA_TDLR] and self.tx_dma.active():
+                self.tx_fifo.append(self.tx_dma.transfer())
+
+    # register interface ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def raw_status(self):
+        _raw = self.raw
+        if len(self.tx_fifo) <= self.registers[IC_TX_TL]:
+            _raw |= TX_EMPTY
+        if len(self.rx_fifo) > self.registers[IC_RX_TL]:
+            _raw |= RX_FULL
+        return _raw
+
+    def read(self, offset):
+        if offset == IC_DATA_CMD:
+            if self.rx_fifo:
+                return self.rx_fifo.popleft()
+            self.raw |= RX_UNDER
+            return 0
+        elif offset == IC_INTR_STAT:
+            return self.raw_status() & self.registers[IC_INTR_MASK]
+        elif offset == IC_RAW_INTR_STAT:
+            return self.raw_status()
+        elif offset == IC_STATUS:
+            _status = 0
+            if len(self.rx_fifo) == FIFO_DEPTH:
+                _status |= 0x10 # RFF
+            if self.rx_fifo:
+                _status |= 0x08 # RFNE
+            if not self.tx_fifo:
+                _status |= 0x04 # TFE
+            if len(self.tx_fifo) < FIFO_DEPTH:
+                _status |= 0x02 # TFNF
+            if self._active:
+                _status |= 0x40 # SLV_ACTIVITY
+            return _status
+        elif offset == IC_TXFLR:
+            return len(self.tx_fifo)
+        elif offset == IC_RXFLR:
+            return len(self.rx_fifo)
+        elif offset == IC_TX_ABRT_SOURCE:
+            return self.abort_source
+        elif offset == IC_ENABLE_STATUS:
+            return self.registers[IC_ENABLE] & 0x1
+        elif offset == IC_CLR_INTR:
+            self.raw &= ~_CLEARABLE
+            self.abort_source = 0
+            return 0
+        elif offset in _CLEAR_REGISTERS:
+            _bit = _CLEAR_REGISTERS[offset]
+            self.raw &= ~_bit
+            if _bit == TX_ABRT:
+                self.abort_source = 0
+            return 0
+        return self.registers.get(offset, 0)
+
+    def write(self, offset, value, alias):
+        if offset == IC_DATA_CMD:
+            if len(self.tx_fifo) < FIFO_DEPTH:
+                self.tx_fifo.append(value & 0xFF)
+            else:
+                self.raw |= TX_OVER
+            return
+        if offset in _DISABLED_ONLY and self.registers[IC_ENABLE] & 0x1:
+            return
+        _current = self.registers.get(offset, 0)
+        if alias == 0x1000:
+            value = _current ^ value
+        elif alias == 0x2000:
+            value = _current | value
+        elif alias == 0x3000:
+            value = _current & ~value
+        self.registers[offset] = value & 0xFFFFFFFF
+        if offset == IC_DMA_CR:
+            self.service_dma()
+
+    # bus interface ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    @property
+    def slave_address(self):
+        return self.registers[IC_SAR] & 0x3FF
+
+    @property
+    def enabled(self):
+        return ( self.registers[IC_ENABLE] & 0x1 ) and not ( self.registers[IC_CON] & 0x40 )
+
+    def start(self, address, read, restart=False):
+        '''
+        A START (or repeated START) addressed to this controller. Returns
+        True if the address is acknowledged.
+        '''
+        if not self.enabled:
+            return False
+        if address == GENERAL_CALL_ADDRESS and not read:
+            if not self.registers[IC_ACK_GENERAL_CALL] & 0x1:
+                return False
+            self.raw |= GEN_CALL
+        elif address != self.slave_address:
+            return False
+        self.raw |= START_DET | ACTIVITY
+        if restart:
+            self.raw |= RESTART_DET
+        if read and self.tx_fifo:
+            # stale data left from a previous read is flushed
+            self.tx_fifo.clear()
+            self.raw |= TX_ABRT
+            self.abort_source |= ABRT_SLVFLUSH_TXFIFO
+        self._first = True
+        self._held = False
+        self._active = True
+        return True
+
+    def put(self, byte):
+        '''
+        The master writes a byte. Returns False if the RX FIFO is full and the
+        bus is being held, in which case the master must retry.
+        '''
+        if len(self.rx_fifo) >= FIFO_DEPTH:
+            if self.registers[IC_CON] & RX_FIFO_FULL_HLD_CTRL:
+                return False
+            self.raw |= RX_OVER
+            return True
+        self.rx_fifo.append(( byte & 0xFF ) | ( FIRST_DATA_BYTE if self._first else 0 ))
+        self._first = False
+        self.service_dma()
+        return True
+
+    def get(self):
+        '''
+        The master reads a byte. Returns None if the TX FIFO is empty, in
+        which case the bus is held and the master must retry; RD_REQ is
+        raised once for each byte held, not on every retry.
+        '''
+        if self.tx_fifo:
+            _byte = self.tx_fifo.popleft()
+            self._held = False
+            self.service_dma()
+            return _byte
+        if not self._held:
+            self._held = True
+            self.raw |= RD_REQ
+        return None
+
+    def nack(self):
+        '''
+        The master NACKs the last byte of a read.
+        '''
+        self.raw |= RX_DONE
+
+    def stop(self):
+        self.raw |= STOP_DET
+        self._active = False
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class SimulatedRegisterBank(object):
+    '''
+    Stands in for MicroPython's machine.mem32, dispatching accesses within
+    the I2C0 and I2C1 register blocks (including the atomic XOR/set/clear
+    aliases) to a SimulatedI2C. All other addresses are plain storage.
+    Every access is counted.
+    '''
+    def __init__(self):
+        self.controllers = {
+            I2C0_BASE: SimulatedI2C(0),
+            I2C1_BASE: SimulatedI2C(1)
+        }
+        self._memory = {}
+        self._timers = []
+        self.irq_lock = threading.RLock()
+        self.reset_counts()
+
+    def reset(self):
+        for _controller in self.controllers.values():
+            _controller.reset()
+        self._memory.clear()
+        self._timers.clear()
+        self.reset_counts()
+
+    def attach(self, timer):
+        self._timers.append(timer)
+
+    def detach(self, timer):
+        if timer in self._timers:
+            self._timers.remove(timer)
+
+    def raise_irq(self):
+        '''
+        Runs the attached timer callbacks, i.e. the slave's interrupt handler.
+        '''
+        if self._timers:
+            with self.irq_lock:
+                for _timer in list(self._timers):
+                    _timer.fire()
+
+    def reset_counts(self):
+        self.reads  = 0
+        self.writes = 0
+
+    @property
+    def accesses(self):
+        return self.reads + self.writes
+
+    def controller(self, i2c_id=0):
+        return self.controllers[I2C1_BASE if i2c_id else I2C0_BASE]
+
+    def __getitem__(self, address):
+        self.reads += 1
+        _controller = self.controllers.get(address & ~0x3FFF)
+        if _controller:
+            return _controller.read(address & 0xFFF)
+        return self._memory.get(address, 0)
+
+    def __setitem__(self, address, value):
+        self.writes += 1
+        _controller = self.controllers.get(address & ~0x3FFF)
+        if _controller:
+            _controller.write(address & 0xFFF, value, address & 0x3000)
+        else:
+            self._memory[address] = value
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class SimulatedDmaChannel(object):
+    '''
+    Implements the DmaChannel interface of upy/i2c_dma.py against the
+    simulated controller of the given i2c_slave. As on the device, the
+    bytes it moves are not register accesses made by the CPU and so are
+    not counted by the register bank.
+    '''
+    def __init__(self, s_i2c, transmit=False):
+        self._controller = mem32.controller(s_i2c.i2c_ID)
+        self._transmit = transmit
+        self._buffer = None
+        self._index = 0
+        self._count = 0
+        if transmit:
+            self._controller.tx_dma = self
+        else:
+            self._controller.rx_dma = self
+
+    def start(self, buf, count):
+        self._buffer = buf
+        self._index = 0
+        self._count = count
+        self._controller.service_dma()
+
+    def remaining(self):
+        return self._count - self._index
+
+    def active(self):
+        return self._index < self._count
+
+    def abort(self):
+        self._count = self._index
+
+    def transfer(self, byte=None):
+        '''
+        Called by the controller for each byte its DREQ requests.
+        '''
+        _index = self._index
+        self._index = _index + 1
+        if self._transmit:
+            return self._buffer[_index]
+        self._buffer[_index] = byte
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class SimulatedBusError(Exception):
+    pass
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class SimulatedMaster(object):
+    '''
+    Drives the bus side of the simulated controllers with a subset of the
+    smbus API, as used by master.py.
+
+    :param bank:       the SimulatedRegisterBank
+    :param pump:       called whenever the slave holds the bus; typically a
+                       single pass of the slave's service loop. If None the
+                       master simply waits (for a slave running in a thread).
+    The number of times the slave has held the bus is counted in 'stalls'.
+    The bytes clocked on the bus, address bytes included, are counted in
+    'wire_bytes' and the STARTs (repeated or not) in 'starts'.
+
+    :param max_stall:  the number of pump calls (or wait iterations) after
+                       which a held bus is treated as a timeout
+    '''
+    def __init__(self, bank, pump=None, max_stall=10000):
+        self._bank = bank
+        self.pump = pump
+        self._max_stall = max_stall
+        self.stalls = 0
+        self.wire_bytes = 0
+        self.starts = 0
+
+    def bus_time(self, freq=400000):
+        '''
+        The time in seconds the counted traffic would occupy a bus clocked at
+        freq: nine clocks for each byte and its acknowledge bit, and about one
+        more for each START and STOP. Clock stretching is not included.
+        '''
+        return ( self.wire_bytes * 9 + self.starts * 2 ) / freq
+
+    def _controller(self, address):
+        for _controller in self._bank.controllers.values():
+            if _controller.enabled and _controller.slave_address == address:
+                return _controller
+        raise SimulatedBusError('no slave acknowledged address 0x{:02X}'.format(address))
+
+    def _stall(self, count):
+        if count >= self._max_stall:
+            raise TimeoutError('slave held the bus')
+        self.stalls += 1
+        self._bank.raise_irq()
+        if self.pump:
+            self.pump()
+        else:
+            time.sleep(0)
+
+    def _start(self, controller, address, read, restart=False):
+        self.starts += 1
+        self.wire_bytes += 1
+        controller.start(address, read, restart)
+        self._bank.raise_irq()
+
+    def _stop(self, controller):
+        controller.stop()
+        self._bank.raise_irq()
+
+    def _write(self, controller, data):
+        for _byte in data:
+            _stalls = 0
+            while not controller.put(_byte):
+                self._stall(_stalls)
+                _stalls += 1
+            self.wire_bytes += 1
+            self._bank.raise_irq()
+
+    def _read(self, controller, length):
+        _data = []
+        for i in range(length):
+            _stalls = 0
+            _byte = controller.get()
+            while _byte is None:
+                self._stall(_stalls)
+                _stalls += 1
+                _byte = controller.get()
+            _data.append(_byte)
+            self.wire_bytes += 1
+        controller.nack()
+        self._bank.raise_irq()
+        return _data
+
+    def settle(self, passes=4):
+        '''
+        Gives the slave a few passes to process whatever is pending.
+        '''
+        if self.pump:
+            for i in range(passes):
+                # as a timer tick would, sample the interrupt line again
+                self._bank.raise_irq()
+                self.pump()
+
+    def write(self, address, data):
+        '''
+        A single write transaction: START, address, data bytes, STOP. A write
+        to the general call address goes to every controller that ACKs it.
+        '''
+        if address == GENERAL_CALL_ADDRESS:
+            return self.general_call(data)
+        _controller = self._controller(address)
+        self._start(_controller, address, read=False)
+        self._write(_controller, data)
+        self._stop(_controller)
+        self.settle()
+
+    def general_call(self, data):
+        '''
+        A write to the general call address, seen by every controller
+        acknowledging it, byte by byte as on the wire.
+        '''
+        _controllers = [ _controller for _controller in self._bank.controllers.values()
+                if _controller.start(GENERAL_CALL_ADDRESS, read=False) ]
+        if not _controllers:
+            raise SimulatedBusError('no slave acknowledged the general call')
+        self._bank.raise_irq()
+        for _byte in data:
+            for _controller in _controllers:
+                self._write(_controller, [ _byte ])
+        for _controller in _controllers:
+            _controller.stop()
+        self._bank.raise_irq()
+        self.settle()
+
+    def read(self, address, length):
+        '''
+        A single read transaction: START, address, 'length' bytes, STOP.
+        '''
+        _controller = self._controller(address)
+        self._start(_controller, address, read=True)
+        _data = self._read(_controller, length)
+        self._stop(_controller)
+        self.settle()
+        return _data
+
+    def write_then_read(self, address, data, length):
+        '''
+        A write followed by a read joined by a repeated START.
+        '''
+        _controller = self._controller(address)
+        self._start(_controller, address, read=False)
+        self._write(_controller, data)
+        self._start(_controller, address, read=True, restart=True)
+        _data = self._read(_controller, length)
+        self._stop(_controller)
+        self.settle()
+        return _data
+
+    # smbus API ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+    def write_block_data(self, address, register, data):
+        self.write(address, [register, len(data)] + list(data))
+
+    def write_i2c_block_data(self, address, register, data):
+        self.write(address, [register] + list(data))
+
+    def read_byte(self, address):
+        return self.read(address, 1)[0]
+
+    def write_byte_data(self, address, register, value):
+        self.write(address, [register, value])
+
+    def read_byte_data(self, address, register):
+        return self.write_then_read(address, [register], 1)[0]
+
+    def read_i2c_block_data(self, address, register, length):
+        # as smbus2, limited to an SMBus block
+        if length > 32:
+            raise ValueError('Desired block length over 32 bytes')
+        return self.write_then_read(address, [register], length)
+
+    def i2c_rdwr(self, *messages):
+        '''
+        As smbus2: performs the i2c_msg reads and writes as one combined
+        transaction, joined by repeated STARTs, with a single STOP at the end.
+        '''
+        _controller = None
+        for _message in messages:
+            _next = self._controller(_message.addr)
+            if _controller is not None and _next is not _controller:
+                self._stop(_controller)
+                _controller = None
+            self._start(_next, _message.addr, read=_message.is_read(), restart=_controller is not None)
+            _controller = _next
+            if _message.is_read():
+                _message.buf[:] = self._read(_controller, _message.len)
+            else:
+                self._write(_controller, _message.buf)
+        if _controller is not None:
+            self._stop(_controller)
+        self.settle()
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class i2c_msg(object):
+    '''
+    Stands in for smbus2.i2c_msg, one message of an i2c_rdwr() transaction:
+    created with i2c_msg.write(address, data) or i2c_msg.read(address,
+    length), and iterated for the bytes written or read.
+    '''
+    I2C_M_RD = 0x0001
+
+    def __init__(self, address, flags, data):
+        self.addr = address
+        self.flags = flags
+        self.buf = bytearray(data)
+        self.len = len(self.buf)
+
+    @staticmethod
+    def write(address, buf):
+        if isinstance(buf, str):
+            buf = buf.encode('utf-8')
+        return i2c_msg(address, 0, buf)
+
+    @staticmethod
+    def read(address, length):
+        return i2c_msg(address, i2c_msg.I2C_M_RD, bytes(length))
+
+    def is_read(self):
+        return bool(self.flags & self.I2C_M_RD)
+
+    def __iter__(self):
+        return iter(self.buf)
+
+    def __len__(self):
+        return self.len
+
+    def __bytes__(self):
+        return bytes(self.buf)
+
+# MicroPython stand-ins ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+mem32 = SimulatedRegisterBank()
+
+class Pin(object):
+    IN  = 0
+    OUT = 1
+    def __init__(self, id, mode=IN, value=0):
+        self._id = id
+        self._value = value
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+    def on(self):
+        self._value = 1
+    def off(self):
+        self._value = 0
+
+class Timer(object):
+    '''
+    Stands in for machine.Timer: the callback is run by the register bank
+    on every bus event rather than at the requested frequency.
+    '''
+    ONE_SHOT = 0
+    PERIODIC = 1
+    def __init__(self, id=-1, mode=PERIODIC, freq=None, period=None, callback=None, hard=True):
+        self._callback = callback
+        self.hard = hard
+        mem32.attach(self)
+    def fire(self):
+        self._callback(self)
+    def deinit(self):
+        mem32.detach(self)
+
+class ThreadSafeFlag(object):
+    '''
+    Stands in for uasyncio.ThreadSafeFlag: set() may be called from any
+    thread, here that of the master, in which the simulated interrupt
+    handler runs; wait() is awaited by a single task. Sets made before the
+    wait are not lost, and several are seen as one.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._set = False
+        self._waiter = None
+
+    def set(self):
+        with self._lock:
+            self._set = True
+            _waiter = self._waiter
+            self._waiter = None
+        if _waiter is not None:
+            _loop, _future = _waiter
+            _loop.call_soon_threadsafe(self._wake, _future)
+
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(None)
+
+    async def wait(self):
+        with self._lock:
+            if self._set:
+                self._set = False
+                return
+            _loop = asyncio.get_running_loop()
+            _future = _loop.create_future()
+            self._waiter = ( _loop, _future )
+        await _future
+        with self._lock:
+            self._set = False
+
+def _disable_irq():
+    mem32.irq_lock.acquire()
+    return True
+
+def _enable_irq(state=True):
+    mem32.irq_lock.release()
+
+def _freq():
+    return 125000000
+
+def _idle():
+    time.sleep(0)
+
+def _t0():
+    return time.perf_counter_ns()
+
+_EPOCH = _t0()
+
+def _ticks_us():
+    return ( _t0() - _EPOCH ) // 1000
+
+def _ticks_ms():
+    return ( _t0() - _EPOCH ) // 1000000
+
+def _ticks_diff(a, b):
+    return a - b
+
+def _identity(f):
+    return f
+
+def install():
+    '''
+    Registers the MicroPython stand-ins and adds ./upy/ to the module path.
+    Safe to call more than once.
+    '''
+    if 'machine' not in sys.modules:
+        _machine = types.ModuleType('machine')
+        _machine.mem32 = mem32
+        _machine.Pin = Pin
+        _machine.Timer = Timer
+        _machine.disable_irq = _disable_irq
+        _machine.enable_irq = _enable_irq
+        _machine.idle = _idle
+        _machine.freq = _freq
+        sys.modules['machine'] = _machine
+    if 'utime' not in sys.modules:
+        _utime = types.ModuleType('utime')
+        _utime.ticks_us   = _ticks_us
+        _utime.ticks_ms   = _ticks_ms
+        _utime.ticks_diff = _ticks_diff
+        _utime.sleep      = time.sleep
+        _utime.sleep_ms   = lambda ms: time.sleep(ms / 1000)
+        _utime.sleep_us   = lambda us: time.sleep(us / 1000000)
+        sys.modules['utime'] = _utime
+    if 'micropython' not in sys.modules:
+        _micropython = types.ModuleType('micropython')
+        _micropython.native = _identity
+        _micropython.viper  = _identity
+        _micropython.const  = lambda value: value
+        _micropython.alloc_emergency_exception_buf = lambda size: None
+        sys.modules['micropython'] = _micropython
+    if 'uasyncio' not in sys.modules:
+        _uasyncio = types.ModuleType('uasyncio')
+        for _name in asyncio.__all__:
+            setattr(_uasyncio, _name, getattr(asyncio, _name))
+        _uasyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+        _uasyncio.ThreadSafeFlag = ThreadSafeFlag
+        sys.modules['uasyncio'] = _uasyncio
+    if 'smbus2' not in sys.modules:
+        _smbus2 = types.ModuleType('smbus2')
+        _smbus2.i2c_msg = i2c_msg
+        sys.modules['smbus2'] = _smbus2
+    _upy = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upy')
+    if _upy not in sys.path:
+        sys.path.insert(0, _upy)
+
+# slaves ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+def new_slave(cls=None, attach=False, **kwargs):
+    '''
+    Resets the register bank and returns a slave of class cls (by default
+    I2CSlave) on controller 0, without the LED, constructed with kwargs.
+    With attach set it runs in IRQ mode, its interrupt handler attached to
+    the controller as enable() would, so that the master's bus events run
+    the handler and the test calls service().
+    '''
+    if cls is None:
+        from i2c_slave import I2CSlave
+        cls = I2CSlave
+    mem32.reset()
+    if attach:
+        kwargs['irq'] = True
+    _slave = cls(blink=False, **kwargs)
+    if attach:
+        _slave.s_i2c.irq(_slave._irq_handler)
+    return _slave
+
+def new_slave_pair(cls=None, **kwargs):
+    '''
+    Resets the register bank and returns two slaves of class cls (by default
+    I2CSlave) constructed with kwargs: one on controller 0 at the default
+    address, one on controller 1 at the address after it.
+    '''
+    if cls is None:
+        from i2c_slave import I2CSlave
+        cls = I2CSlave
+    mem32.reset()
+    _first = cls(blink=False, **kwargs)
+    return ( _first, cls(i2c_id=1, sda=26, scl=27, i2c_address=_first.s_i2c.slaveAddress + 1, blink=False, **kwargs) )
+
+#EOF
@@ -0,0 +1,1157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-20
+# modified: 2024-08-21
+#
+# Host-side tests of the I2C slave classes in ./upy/, run under CPython
+# against the simulated register bank in i2c_sim.py. Run directly or with
+# pytest, whose pytest.ini leaves out the on-board test scripts in ./upy/:
+#
+#   % python3 i2c_sim_test.py
+#   % python3 -m pytest -q
+#
+
+import i2c_sim
+i2c_sim.install()
+from i2c_sim import new_slave, new_slave_pair
+
+from ring_buffer import RingBuffer
+from frame_buffer import FrameBuffer
+from frame_parser import FrameParser, BinaryFrameParser, FrameError
+from i2c_slave import I2CSlave
+from i2c_register_slave import I2CRegisterSlave
+from i2c_slave_group import I2CSlaveGroup
+from i2c_transfer_slave import I2CTransferSlave
+from i2c_timing import I2CTiming
+
+ADDRESS = 0x44
+REGISTER = 1
+
+def legacy_frame(text):
+    '''
+    The byte stream of master.py's two writes: register, length, text,
+    then the register (seen as 'validate') and end-of-record.
+    '''
+    _data = list(text.encode('ascii'))
+    return [REGISTER, len(_data)] + _data + [0x01, 0xFF]
+
+# tests ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+def test_ring_buffer():
+    _ring = RingBuffer(4)
+    assert _ring.is_empty() and _ring.get() is None
+    for i in range(4):
+        assert _ring.put(i)
+    assert _ring.is_full() and not _ring.put(99)
+    assert [ _ring.get() for i in range(2) ] == [0, 1]
+    # wrap around
+    assert _ring.put(4) and _ring.put(5)
+    assert len(_ring) == 4 and _ring.peek() == 2
+    assert [ _ring.get() for i in range(4) ] == [2, 3, 4, 5]
+    assert _ring.is_empty()
+
+def test_frame_buffer():
+    _frame = FrameBuffer(8)
+    assert _frame.length() == 0 and _frame.to_string() == ''
+    assert _frame.copy_from(b'..hello..', 2, 7) == 5
+    assert len(_frame) == 5 and _frame[0] == ord('h') and _frame[-1] == ord('o')
+    assert _frame.to_string() == 'hello' and bytes(_frame.view()) == b'hello'
+    # truncated to the size of the buffer
+    assert _frame.copy_from(b'0123456789', 0, 10) == 8
+    assert _frame.to_bytes() == b'01234567'
+    _frame.clear()
+    _frame.append(0x41)
+    assert str(_frame) == 'A'
+
+def test_process_buffer_frame():
+    _frames = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _frames.append(bytes(buffer.view()))
+            return buffer
+    _slave = new_slave(_Slave)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master.write(ADDRESS, legacy_frame('abc'))
+    assert _master.read_byte(ADDRESS) == I2CSlave.OKAY
+    _master.write(ADDRESS, legacy_frame('de'))
+    assert _frames == [ b'abc', b'de' ]
+    # the same preallocated buffer is passed each time
+    assert _slave._payload is _slave._frame
+
+def parse_chunks(parser, data, cuts, ends=()):
+    '''
+    Feeds data to the parser split at the given indices, calling end() at
+    those in ends, and returns the payloads completed.
+    '''
+    _frames = []
+    _bounds = sorted(set(cuts) | set(ends) | { 0, len(data) })
+    for _start, _stop in zip(_bounds, _bounds[1:]):
+        _index = _start
+        while _index < _stop:
+            _index = parser.feed(data, _index, _stop)
+            if parser.complete:
+                _frames.append(parser.frame.to_string())
+        if _stop in ends and parser.end():
+            _frames.append(parser.frame.to_string())
+    return _frames
+
+def test_frame_parser_chunks():
+    import random
+    # (a one-character payload would have a length byte of 0x01, read as 'validate')
+    _texts = [ 'ab', 'hello', 'x' * 32, 'The quick brown fox', '~ !' ]
+    _data = bytes(_byte for _text in _texts for _byte in legacy_frame(_text))
+    assert parse_chunks(FrameParser(), _data, ()) == _texts
+    # one byte at a time
+    assert parse_chunks(FrameParser(), _data, range(len(_data))) == _texts
+    _random = random.Random(1)
+    for i in range(200):
+        _cuts = _random.sample(range(1, len(_data)), _random.randint(1, 20))
+        assert parse_chunks(FrameParser(), _data, _cuts) == _texts
+
+def test_frame_parser_two_writes():
+    # master.py: [register, length, text], STOP, then [register, 0xFF]
+    _data = bytes([REGISTER, 5]) + b'hello' + bytes([REGISTER, 0xFF])
+    _parser = FrameParser()
+    assert parse_chunks(_parser, _data, (3,), ends=(7, len(_data))) == [ 'hello' ]
+    assert _parser.address == REGISTER
+    # a validated frame is complete at the end of the write
+    _data = bytes([REGISTER, 2]) + b'ok' + bytes([0x01])
+    assert parse_chunks(FrameParser(), _data, (), ends=(len(_data),)) == [ 'ok' ]
+
+def test_frame_parser_errors():
+    for _data, _code in ( ( [REGISTER, 3, 0x41, 0x07, 0x42, 0x01, 0xFF], FrameParser.INVALID_CHAR ),
+                          ( [REGISTER, 2, 0x41, 0x42, 0x43, 0x01, 0xFF], FrameParser.OUT_OF_SYNC ),
+                          ( [REGISTER, 40], FrameParser.SOURCE_TOO_LARGE ),
+                          ( [REGISTER, 2, 0x41, 0x42, 0xFF], FrameParser.UNVALIDATED ),
+                          ( [REGISTER, 3, 0x41, 0x42, 0x01, 0xFF], FrameParser.PAYLOAD_TOO_LARGE ) ):
+        _parser = FrameParser()
+        try:
+            parse_chunks(_parser, bytes(_data), (2,))
+            assert False, 'expected error 0x{:02X}'.format(_code)
+        except FrameError as fe:
+            assert fe.code == _code
+            # the message is formatted from the raw values only when printed
+            if _code == FrameParser.INVALID_CHAR:
+                assert fe.args[0].startswith('invalid character received: \'0x{:02X}\'')
+                assert str(fe) == "invalid character received: '0x07' (int: '7'); buf length: 1; sb: 'A'"
+        # the rest of the write is ignored, then parsing starts afresh
+        assert _parser.feed(bytes(legacy_frame('lost')), 0, 8) == 8
+        assert not _parser.end()
+        assert parse_chunks(_parser, bytes(legacy_frame('next')), (4,)) == [ 'next' ]
+
+def test_frame_split_across_fifo():
+    # longer than the 16-byte RX FIFO, so received over several RX events
+    _slave = new_slave()
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _text = 'abcdefghijklmnopqrstuvwxyz012345'
+    _master.write(ADDRESS, legacy_frame(_text))
+    assert _slave._payload == _text
+    assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+
+def test_i2c_master_send():
+    from i2c_master import I2CMaster
+    from response import Response
+    _slave = new_slave()
+    _master = I2CMaster(bus=i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll))
+    assert _master.send('hello') == Response.OKAY
+    assert _slave.frames_received == 1
+    assert _master.send('x' * 32) == Response.OKAY
+    assert _master.send('bad\x07') == Response.INVALID_CHAR
+    assert _master.send('again') == Response.OKAY
+    assert _slave.frames_received == 3
+
+def test_combined_request():
+    from i2c_master import I2CMaster
+    from response import Response
+    _payloads = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _payloads.append(buffer.to_bytes())
+            return super().process_buffer(buffer)
+    for _irq in ( False, True ):
+        _slave = new_slave(_Slave, attach=_irq)
+        _pump = _slave.service if _irq else _slave.poll
+        _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_pump)
+        _master = I2CMaster(bus=_bus)
+        # one transaction: the repeated start commits the packet before the read
+        assert _master.request('hello') == Response.OKAY
+        assert _bus.starts == 2
+        assert _payloads.pop() == b'hello' and _slave.frames_received == 1
+        assert _master.request('bad\x07') == Response.INVALID_CHAR
+        assert _master.request('x' * 32) == Response.OKAY
+        # mixed with the three-transaction protocol
+        assert _master.send('again') == Response.OKAY
+        assert _master.request('ab') == Response.OKAY
+        assert _slave.frames_received == 4 and _payloads[-1] == b'ab'
+    _slave = new_slave(_Slave, binary=True)
+    _master = I2CMaster(bus=i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll))
+    assert _master.request_binary(bytes([0x00, 0x01, 0xFF])) == Response.OKAY
+    assert _payloads[-1] == bytes([0x00, 0x01, 0xFF])
+
+def test_binary_frame_parser():
+    import random
+    _payloads = [ bytes([0x00, 0x01, 0xFF]), bytes(range(32)), b'', bytes([0xFF] * 5) ]
+    _random = random.Random(2)
+    for _payload in _payloads:
+        _data = bytes([REGISTER, len(_payload)]) + _payload
+        for i in range(20):
+            _cuts = _random.sample(range(1, len(_data)), min(len(_data) - 1, _random.randint(0, 6)))
+            _parser = BinaryFrameParser()
+            _frames = []
+            _bounds = sorted(set(_cuts) | { 0, len(_data) })
+            for _start, _stop in zip(_bounds, _bounds[1:]):
+                assert _parser.feed(_data, _start, _stop) == _stop
+                assert not _parser.complete
+            assert _parser.end()
+            assert _parser.frame.to_bytes() == _payload and _parser.address == REGISTER
+    # the register alone (as before a read) is not a frame
+    _parser = BinaryFrameParser()
+    _parser.feed(bytes([REGISTER]), 0, 1)
+    assert not _parser.end()
+    for _data, _code in ( ( [REGISTER, 2, 1, 2, 3], BinaryFrameParser.OUT_OF_SYNC ),
+                          ( [REGISTER, 3, 1, 2], BinaryFrameParser.PAYLOAD_TOO_LARGE ),
+                          ( [REGISTER, 33], BinaryFrameParser.SOURCE_TOO_LARGE ) ):
+        _parser = BinaryFrameParser()
+        try:
+            _parser.feed(bytes(_data), 0, len(_data))
+            _parser.end()
+            assert False, 'expected error 0x{:02X}'.format(_code)
+        except FrameError as fe:
+            assert fe.code == _code
+        _parser.end()
+        _parser.feed(bytes([REGISTER, 1, 0x01]), 0, 3)
+        assert _parser.end() and _parser.frame.to_bytes() == bytes([0x01])
+
+def test_binary_mode():
+    import struct
+    from i2c_master import I2CMaster
+    from response import Response
+    _frames = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _frames.append(struct.unpack_from('<hHf', buffer.buffer))
+            return super().process_buffer(buffer)
+    _slave = new_slave(_Slave, binary=True)
+    _master = I2CMaster(bus=i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll))
+    assert _master.send_binary(struct.pack('<hHf', -1, 0xFF01, 0.5)) == Response.OKAY
+    assert _frames == [ ( -1, 0xFF01, 0.5 ) ]
+    assert _master.send_binary(bytes(range(256))[-32:]) == Response.OKAY
+    assert _slave.frames_received == 2
+    try:
+        I2CMaster.encode_frame(bytes(33))
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+    # a frame longer than its length byte
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _bus.write(ADDRESS, [REGISTER, 2, 0, 1, 2])
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OUT_OF_SYNC
+    assert _master.send_binary([0xFF, 0x01, 0x00]) == Response.OKAY
+
+def test_binary_writes_back_to_back():
+    _frames = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _frames.append(buffer.to_bytes())
+            return super().process_buffer(buffer)
+    for _irq in ( False, True ):
+        _frames.clear()
+        _slave = new_slave(_Slave, binary=True, irq=_irq)
+        # both writes are queued before the slave looks at either
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32)
+        _master.write(ADDRESS, [ REGISTER, 2, 0x61, 0xFF ])
+        _master.write(ADDRESS, [ REGISTER, 3, 0x01, 0x63, 0x64 ])
+        if _irq:
+            _slave._irq_handler(_slave.s_i2c)
+            _slave.service()
+        else:
+            _slave.poll()
+        assert _frames == [ b'a\xff', b'\x01cd' ] and _slave.error_count == 0
+
+def test_chunked_transfer():
+    import random
+    from i2c_master import I2CMaster
+    from response import Response
+    _messages = []
+    class _Slave(I2CTransferSlave):
+        def transfer_received(self, message, length):
+            _messages.append(bytes(message))
+    _slave = new_slave(_Slave, capacity=4096)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master = I2CMaster(bus=_bus)
+    _random = random.Random(3)
+    _blob = bytes(_random.randrange(256) for i in range(3000))
+    assert _master.send_stream(_blob, window=8) == Response.OKAY
+    assert _messages == [ _blob ]
+    assert _slave.chunks_received == 100 and _slave.chunks_dropped == 0
+    # exact multiples of the chunk size, a single chunk and an empty message
+    for _length in ( 60, 5, 0 ):
+        assert _master.send_stream(_blob[:_length], window=4) == Response.OKAY
+        assert _messages[-1] == _blob[:_length]
+    # ordinary binary frames still reach process_buffer()
+    assert _master.send_binary(b'\x00\x01') == Response.OKAY
+    assert _master.send_stream(bytes(4097)) == Response.SOURCE_TOO_LARGE
+    assert len(_messages) == 4
+    # with a bus trace a failed transfer is recorded, not formatted and printed
+    import contextlib, io
+    _slave = new_slave(_Slave, capacity=64, trace=16)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _out = io.StringIO()
+    with contextlib.redirect_stdout(_out):
+        assert I2CMaster(bus=_bus).send_stream(bytes(65)) == Response.SOURCE_TOO_LARGE
+    assert _out.getvalue() == '' and _slave.error_count == 1
+    import trace_decoder
+    _header, _records = trace_decoder.decode(_slave.trace.seal())
+    assert any(trace_decoder.EVENTS[r.event] == 'ERROR' and r.code == I2CSlave.SOURCE_TOO_LARGE for r in _records)
+
+def test_chunked_transfer_resend():
+    from i2c_master import I2CMaster
+    from response import Response
+    _messages = []
+    class _Slave(I2CTransferSlave):
+        def transfer_received(self, message, length):
+            _messages.append(bytes(message))
+    class _LossyBus(i2c_sim.SimulatedMaster):
+        # loses every fifth chunk written
+        _count = 0
+        def write_i2c_block_data(self, address, register, data):
+            if register == I2CMaster.CHUNK_REGISTER:
+                self._count += 1
+                if self._count % 5 == 0:
+                    return
+            super().write_i2c_block_data(address, register, data)
+    _slave = new_slave(_Slave, capacity=1024)
+    _master = I2CMaster(bus=_LossyBus(i2c_sim.mem32, pump=_slave.poll))
+    _blob = bytes(range(256)) * 4
+    assert _master.send_stream(_blob, window=4) == Response.OKAY
+    assert _messages == [ _blob ]
+    assert _slave.chunks_dropped > 0
+
+def test_polled_message_and_response():
+    _slave = new_slave()
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master.write(ADDRESS, legacy_frame('hello'))
+    assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    # the read completes the exchange
+    assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.EMPTY_PAYLOAD
+
+def test_poll_events():
+    _slave = new_slave()
+    _s_i2c = _slave.s_i2c
+    _event = _s_i2c.I2CEvent
+    _controller = i2c_sim.mem32.controller(0)
+    assert _s_i2c.poll_events() == 0
+    _controller.start(ADDRESS, read=False)
+    _controller.put(1)
+    # still in the transaction after the snapshot
+    assert _s_i2c.poll_events() == _event.START | _event.RECEIVE | _event.ACTIVE
+    # the conditions seen are cleared, the bytes left waiting
+    assert _s_i2c.poll_events() == _event.RECEIVE | _event.ACTIVE
+    _controller.stop()
+    assert _s_i2c.poll_events() == _event.STOP | _event.RECEIVE
+    _s_i2c.read_into(bytearray(4))
+    assert _s_i2c.poll_events() == 0
+    # a read request clears everything seen with it
+    _controller.start(ADDRESS, read=True)
+    assert _controller.get() is None
+    assert _s_i2c.poll_events() == _event.START | _event.REQUEST | _event.ACTIVE
+    assert _s_i2c.poll_events() == 0
+
+def test_poll_events_clears():
+    _slave = new_slave()
+    _s_i2c = _slave.s_i2c
+    _event = _s_i2c.I2CEvent
+    _controller = i2c_sim.mem32.controller(0)
+    _cleared = []
+    _late = []
+    _read = _controller.read
+    def _recording_read(offset):
+        _value = _read(offset)
+        if offset == i2c_sim.IC_INTR_STAT and _late:
+            # a condition arriving just after the snapshot
+            _controller.raw |= _late.pop()
+        if offset == i2c_sim.IC_CLR_INTR or offset in i2c_sim._CLEAR_REGISTERS:
+            _cleared.append(offset)
+        return _value
+    _controller.read = _recording_read
+    # without a read request the bus is live: only what was seen is cleared
+    _controller.start(ADDRESS, read=False)
+    _controller.put(1)
+    _late.append(i2c_sim.STOP_DET)
+    assert _s_i2c.poll_events() == _event.START | _event.RECEIVE | _event.ACTIVE
+    assert _cleared == [ i2c_sim.IC_CLR_START_DET ]
+    # so a STOP arriving meanwhile is still pending for the next snapshot
+    del _cleared[:]
+    assert _s_i2c.poll_events() & _event.STOP
+    assert _cleared == [ i2c_sim.IC_CLR_STOP_DET ]
+    _s_i2c.read_into(bytearray(4))
+    # the injected STOP ended the transaction
+    _controller._active = False
+    assert _s_i2c.poll_events() == 0
+    # with RD_REQ pending SCL is held, so one read of IC_CLR_INTR clears it all
+    del _cleared[:]
+    _controller.start(ADDRESS, read=True)
+    assert _controller.get() is None
+    assert _s_i2c.poll_events() == _event.START | _event.REQUEST | _event.ACTIVE
+    assert _cleared == [ i2c_sim.IC_CLR_INTR ]
+    assert _controller.raw_status() & ( i2c_sim.RD_REQ | i2c_sim.START_DET ) == 0
+
+def test_dispatch_across_transactions():
+    _frames = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _frames.append(buffer.to_bytes())
+            return super().process_buffer(buffer)
+    # two writes in one snapshot: each is ended at its own boundary
+    _slave = new_slave(_Slave)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32)
+    _master.write(ADDRESS, [REGISTER, 2, 0x61, 0x62, 0x01])
+    _master.write(ADDRESS, [REGISTER, 2, 0x63, 0x64, 0x01])
+    _slave._dispatch(_slave.s_i2c.poll_events())
+    assert _frames == [ b'ab', b'cd' ] and _slave.error_count == 0
+    _frames.clear()
+    # a STOP seen with the start of a write still going ended the one before
+    _slave = new_slave(_Slave, binary=True)
+    _controller = i2c_sim.mem32.controller(0)
+    _controller.start(ADDRESS, read=False)
+    for _byte in [ REGISTER, 2, 0x61, 0x62 ]:
+        _controller.put(_byte)
+    _slave._dispatch(_slave.s_i2c.poll_events())
+    _controller.stop()
+    _controller.start(ADDRESS, read=False)
+    for _byte in [ REGISTER, 2, 0x63 ]:
+        _controller.put(_byte)
+    _slave._dispatch(_slave.s_i2c.poll_events())
+    assert _frames == [ b'ab' ] and _slave.error_count == 0
+    _controller.put(0x64)
+    _controller.stop()
+    _slave._dispatch(_slave.s_i2c.poll_events())
+    assert _frames == [ b'ab', b'cd' ] and _slave.error_count == 0
+    # an error leaves the write after it for the next pass
+    _slave = new_slave(_Slave)
+    _master.write(ADDRESS, [ REGISTER, 3, 0x41, 0x07, 0x42, 0x01, 0xFF ])
+    _master.write(ADDRESS, legacy_frame('ok'))
+    _slave.poll()
+    _slave.poll()
+    assert _slave.error_count == 1 and _frames[-1] == b'ok'
+
+def test_read_into():
+    _slave = new_slave()
+    _controller = i2c_sim.mem32.controller(0)
+    _controller.start(ADDRESS, read=False)
+    for _byte in range(10, 22):
+        _controller.put(_byte)
+    _buffer = bytearray(8)
+    # rx_first tells whether the first byte returned began the write
+    assert _slave.s_i2c.read_into(_buffer, 3) == 5 and _slave.s_i2c.rx_first
+    assert _buffer == bytearray([0, 0, 0, 10, 11, 12, 13, 14])
+    assert _slave.s_i2c.read_into(_buffer) == 7 and not _slave.s_i2c.rx_first
+    assert _buffer[:7] == bytearray(range(15, 22))
+    assert _slave.s_i2c.read_into(_buffer) == 0
+    # two writes waiting together are returned one at a time
+    _controller.stop()
+    _controller.start(ADDRESS, read=False)
+    _controller.put(1)
+    _controller.put(2)
+    _controller.stop()
+    _controller.start(ADDRESS, read=False)
+    _controller.put(3)
+    assert _slave.s_i2c.read_into(_buffer) == 2 and _buffer[:2] == bytearray([1, 2]) and _slave.s_i2c.rx_first
+    assert _slave.s_i2c.Available()
+    assert _slave.s_i2c.read_into(_buffer) == 1 and _buffer[0] == 3 and _slave.s_i2c.rx_first
+    assert not _slave.s_i2c.Available()
+
+def test_polled_error_response():
+    _slave = new_slave()
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master.write(ADDRESS, [REGISTER, 3, 0x41, 0x07, 0x42, 0x01, 0xFF])
+    assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.INVALID_CHAR
+
+def test_stats():
+    from i2c_master import I2CMaster
+    _slave = new_slave()
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master = I2CMaster(bus=_bus)
+    _bus.write(ADDRESS, legacy_frame('hello'))
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    _bus.write(ADDRESS, [REGISTER, 3, 0x41, 0x07, 0x42, 0x01, 0xFF])
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.INVALID_CHAR
+    _stats = _slave.stats
+    # a repeated start is seen as part of the transaction it continues
+    assert _stats[I2CSlave.STAT_TRANSACTIONS] == 4
+    assert _stats[I2CSlave.STAT_BYTES_IN] == len(legacy_frame('hello')) + 7 + 2
+    assert _stats[I2CSlave.STAT_BYTES_OUT] == 2
+    assert _stats[I2CSlave.STAT_ERRORS + I2CSlave.INVALID_CHAR - I2CSlave.BAD_ADDRESS] == 1
+    assert _stats[I2CSlave.STAT_LOOP_MAX_US] >= _stats[I2CSlave.STAT_LOOP_MEAN_US] > 0
+    # the master reads a snapshot of every counter in one transaction
+    _starts = _bus.starts
+    _read = _master.read_stats()
+    assert _bus.starts == _starts + 2
+    assert list(_read) == list(I2CMaster.STAT_NAMES)
+    assert _read['transactions'] == 5
+    assert _read['invalid_char'] == 1 and _read['out_of_sync'] == 0
+    assert _read['bytes_out'] == 2 and _slave.stats[I2CSlave.STAT_BYTES_OUT] == 2 + 4 * I2CSlave.STAT_COUNT
+    assert _read['request_max_us'] <= _read['loop_max_us']
+    # or from any counter on
+    _tail = _bus.write_then_read(ADDRESS, [I2CSlave.STATS_REGISTER + I2CSlave.STAT_ERRORS], 8)
+    assert I2CMaster.decode_stats(_tail, I2CSlave.STAT_ERRORS) == { 'bad_address': 0, 'out_of_sync': 0 }
+    # the last counter has its own register, clear of the trace
+    _last = I2CSlave.STATS_REGISTER + I2CSlave.STAT_COUNT - 1
+    assert I2CMaster.STATS_REGISTER + len(I2CMaster.STAT_NAMES) - 1 == _last < I2CSlave.TRACE_REGISTER == I2CMaster.TRACE_REGISTER
+    _tail = _bus.write_then_read(ADDRESS, [_last], 4)
+    assert I2CMaster.decode_stats(_tail, I2CSlave.STAT_DUPLICATES) == { 'duplicates': 0 }
+    _slave.reset_stats()
+    assert sum(_slave.stats) == 0
+    # IRQ mode keeps the counters too
+    _slave = new_slave(attach=True)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.service)
+    _bus.write(ADDRESS, legacy_frame('hello'))
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    assert _slave.stats[I2CSlave.STAT_BYTES_IN] == len(legacy_frame('hello')) + 1
+    assert _slave.stats[I2CSlave.STAT_BYTES_OUT] == 1
+
+def test_sequenced_requests():
+    from i2c_master import I2CMaster
+    from response import Response
+    _payloads = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _payloads.append(buffer.to_bytes())
+            return super().process_buffer(buffer)
+    class _LossyBus(i2c_sim.SimulatedMaster):
+        # loses the response to the next read, after the frame has arrived
+        lose = 0
+        def read_byte_data(self, address, register):
+            _value = super().read_byte_data(address, register)
+            if self.lose:
+                self.lose -= 1
+                raise OSError(121, 'Remote I/O error')
+            return _value
+    for _irq in ( False, True ):
+        _slave = new_slave(_Slave, attach=_irq, sequenced=True)
+        _bus = _LossyBus(i2c_sim.mem32, pump=_slave.service if _irq else _slave.poll)
+        _master = I2CMaster(bus=_bus, sequenced=True)
+        # the sequence number is taken off before the frame is handled
+        assert _master.send('hello') == Response.OKAY
+        assert _payloads.pop() == b'hello'
+        # a resend after a lost response is answered from the cache
+        _bus.lose = 1
+        assert _master.send('again') == Response.OKAY
+        assert _payloads == [ b'again' ] and _slave.frames_received == 2
+        assert _slave.stats[I2CSlave.STAT_DUPLICATES] == 1
+        _payloads.clear()
+        # a sequence number may be any byte, such as 0xFF
+        _bus.write(ADDRESS, [ REGISTER, 3, 0xFF, 0x41, 0x07, 0x01, 0xFF ])
+        assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.INVALID_CHAR
+        # the slot of 'again', but another number
+        _bus.write(ADDRESS, [ REGISTER, 3, 0x81, 0x41, 0x42, 0x01, 0xFF ])
+        assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+        _bus.write(ADDRESS, [ REGISTER, 3, 0x81, 0x41, 0x42, 0x01, 0xFF ])
+        assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+        assert _payloads == [ b'AB' ] and _slave.stats[I2CSlave.STAT_DUPLICATES] == 2
+        _payloads.clear()
+        # 0 starts a new sequence, so is handled
+        _master = I2CMaster(bus=_bus, sequenced=True)
+        assert _master.request('one') == Response.OKAY
+        assert _master.request('two') == Response.OKAY
+        assert _payloads == [ b'one', b'two' ]
+        _payloads.clear()
+        # but the resend of the first frame of a sequence is not handled again
+        _duplicates = _slave.stats[I2CSlave.STAT_DUPLICATES]
+        _master = I2CMaster(bus=_bus, sequenced=True)
+        _bus.lose = 1
+        assert _master.send('go') == Response.OKAY
+        assert _payloads == [ b'go' ] and _slave.stats[I2CSlave.STAT_DUPLICATES] == _duplicates + 1
+        assert _master.send('on') == Response.OKAY
+        assert _payloads == [ b'go', b'on' ]
+        _payloads.clear()
+        # retries run out
+        _bus.lose = 3
+        try:
+            _master.send('lost')
+            assert False, 'expected OSError'
+        except OSError:
+            pass
+        assert _payloads == [ b'lost' ]
+        _payloads.clear()
+    # the sequence number counts towards the maximum length
+    try:
+        _master.send('x' * I2CSlave.MAX_CHARS)
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+    # binary frames
+    _slave = new_slave(_Slave, binary=True, sequenced=True)
+    _bus = _LossyBus(i2c_sim.mem32, pump=_slave.poll)
+    _master = I2CMaster(bus=_bus, sequenced=True)
+    assert _master.request_binary(bytes([ 0x00, 0x01, 0xFF ])) == Response.OKAY
+    _bus.lose = 1
+    assert _master.send_binary(bytes([ 0x02 ])) == Response.OKAY
+    assert _payloads == [ bytes([ 0x00, 0x01, 0xFF ]), bytes([ 0x02 ]) ]
+    assert I2CMaster(bus=_bus).read_stats()['duplicates'] == 1
+    _payloads.clear()
+    # a frame refused with BUSY was not handled, so its resend is
+    _slave = new_slave(_Slave, queue=1, sequenced=True)
+    _bus = _LossyBus(i2c_sim.mem32, pump=_slave.poll)
+    _master = I2CMaster(bus=_bus, sequenced=True)
+    assert _master.send('one') == Response.OKAY
+    _bus.write_block_data(ADDRESS, REGISTER, [ 1 ] + list(b'two'))
+    _bus.write_byte_data(ADDRESS, REGISTER, 0xFF)
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.BUSY
+    assert _slave.process_frames() == 1
+    _bus.write_block_data(ADDRESS, REGISTER, [ 1 ] + list(b'two'))
+    _bus.write_byte_data(ADDRESS, REGISTER, 0xFF)
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    assert _slave.process_frames() == 1
+    assert _payloads == [ b'one', b'two' ] and _slave.stats[I2CSlave.STAT_DUPLICATES] == 0
+
+def test_bus_trace_ring():
+    import trace_decoder
+    from bus_trace import BusTrace
+    _trace = BusTrace(4)
+    assert _trace.held == 0 and trace_decoder.decode(_trace.seal())[1] == []
+    for i in range(6):
+        _trace.record(BusTrace.FRAME, i, 2 * i)
+    _trace.record(BusTrace.TRANSMIT, 0x10, 300)
+    # the newest records are kept, decoded oldest first
+    _header, _records = trace_decoder.decode(_trace.seal())
+    assert _trace.held == 4 and _header.written == 7
+    assert [ ( r.register, r.count ) for r in _records ] == [ (3, 6), (4, 8), (5, 10), (0x10, 255) ]
+    _times = [ r.time_us for r in _records ]
+    assert _times[0] == 0 and _times == sorted(_times)
+    try:
+        trace_decoder.decode(_trace.seal()[:20])
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+
+def test_bus_trace():
+    import contextlib, io, os, tempfile
+    import trace_decoder
+    from i2c_master import I2CMaster
+    _slave = new_slave(trace=32)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _bus.write(ADDRESS, legacy_frame('hello'))
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    _out = io.StringIO()
+    with contextlib.redirect_stdout(_out):
+        _bus.write(ADDRESS, [REGISTER, 3, 0x41, 0x07, 0x42, 0x01, 0xFF])
+        assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.INVALID_CHAR
+    # the error is recorded, not formatted
+    assert _out.getvalue() == ''
+    _header, _records = trace_decoder.decode(I2CMaster(bus=_bus).read_trace())
+    _events = [ ( trace_decoder.EVENTS[r.event], r.register, r.count, r.code ) for r in _records ]
+    assert ( 'FRAME', REGISTER, 5, 0 ) in _events
+    assert ( 'RESPONSE', REGISTER, 1, I2CSlave.OKAY ) in _events
+    assert ( 'ERROR', REGISTER, 0, I2CSlave.INVALID_CHAR ) in _events
+    assert ( 'RESPONSE', REGISTER, 1, I2CSlave.INVALID_CHAR ) in _events
+    assert _events.index(( 'FRAME', REGISTER, 5, 0 )) < _events.index(( 'ERROR', REGISTER, 0, I2CSlave.INVALID_CHAR ))
+    # up to and including the start of the read returning the trace
+    assert _events.count(( 'START', 0, 0, 0 )) == _slave.stats[I2CSlave.STAT_TRANSACTIONS]
+    _lines = trace_decoder.timeline(_slave.trace.seal())
+    assert any('ERROR' in _line and 'invalid character' in _line for _line in _lines)
+    # or saved to flash and decoded from the file
+    with tempfile.TemporaryDirectory() as _dir:
+        _path = os.path.join(_dir, 'trace.bin')
+        _slave.trace.save(_path)
+        with open(_path, 'rb') as _file:
+            _saved = trace_decoder.decode(_file.read())[1]
+    # including the trace read's own transaction
+    assert _saved[:len(_records)] == _records
+    assert [ trace_decoder.EVENTS[r.event] for r in _saved[len(_records):] ] == [ 'TRANSMIT', 'STOP' ]
+
+def test_irq_message_and_response():
+    _slave = new_slave(attach=True)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.service)
+    _master.write(ADDRESS, legacy_frame('hello'))
+    assert _slave._payload == 'hello'
+    assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.EMPTY_PAYLOAD
+
+def test_irq_answers_from_handler():
+    _slave = new_slave(attach=True)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.service)
+    _master.write(ADDRESS, legacy_frame('hello'))
+    # with nothing queued the handler answers without the main context
+    _master.pump = None
+    assert _master.read_byte(ADDRESS) == I2CSlave.OKAY
+
+def test_irq_ring_overflow_keeps_order():
+    class RecordingSlave(I2CSlave):
+        RING_SIZE = 8
+        def _dispatch(self, events):
+            if events & self.s_i2c.I2CEvent.RECEIVE:
+                while self._rx_available():
+                    _log.append(self._rx_read())
+            if events & self.s_i2c.I2CEvent.STOP:
+                _log.append('stop')
+    _log = []
+    _slave = new_slave(RecordingSlave, attach=True)
+    # the handler runs in a hard interrupt
+    assert _slave.s_i2c.irq_timer.hard
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.service)
+    # more bytes than the ring holds: the handler must defer the STOP
+    _master.write(ADDRESS, list(range(2, 22)))
+    assert _log == list(range(2, 22)) + ['stop']
+
+def test_irq_ring_exactly_full():
+    class RecordingSlave(I2CSlave):
+        RING_SIZE = 8
+        def _dispatch(self, events):
+            if events & self.s_i2c.I2CEvent.RECEIVE:
+                while self._rx_available():
+                    _log.append(self._rx_read())
+            if events & self.s_i2c.I2CEvent.STOP:
+                _log.append('stop')
+    _log = []
+    _slave = new_slave(RecordingSlave, attach=True)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32)
+    # the START word and seven bytes fill the ring: the STOP must wait, not be lost
+    _master.write(ADDRESS, list(range(2, 9)))
+    assert len(_slave._ring) == 8 and _slave._deferred
+    while _slave.service():
+        pass
+    assert _log == list(range(2, 9)) + ['stop']
+    # a read request that arrives with the ring full is answered once there is room
+    _slave = new_slave(type('SmallRingSlave', (I2CSlave,), { 'RING_SIZE': 8 }), attach=True)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.service)
+    _master.pump = None
+    _master.write(ADDRESS, legacy_frame('abc'))
+    _master.pump = _slave.service
+    assert _master.read_byte(ADDRESS) == I2CSlave.OKAY
+
+def test_multi_byte_response():
+    class SendingSlave(I2CSlave):
+        def transmit_complete(self, count):
+            _sent.append(count)
+    _sent = []
+    _slave = new_slave(SendingSlave)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _response = bytearray(range(40))
+    _slave.respond_with(_response)
+    assert _master.read(ADDRESS, 40) == list(_response)
+    # one wait for the preload, then one each time the FIFO ran dry
+    assert _master.stalls <= 3
+    assert _sent == [40]
+    # a short read: the unread bytes are flushed, not sent on the next read
+    _slave.respond_with(_response)
+    assert _master.read(ADDRESS, 5) == list(range(5))
+    assert _sent == [40, 5]
+    assert _master.read_byte(ADDRESS) == I2CSlave.EMPTY_PAYLOAD
+
+def test_register_handlers():
+    _written = []
+    _slave = new_slave(binary=True)
+    _slave.register(0x10, on_write=lambda frame: _written.append(frame.to_bytes()))
+    _slave.register(0x11, on_write=lambda frame: 0x30 + frame[0])
+    _slave.register(0x13, on_read=lambda: 0x42)
+    _slave.register(0x12, on_read=lambda: b'abc')
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _bus.write_i2c_block_data(ADDRESS, 0x10, [2, 0xAA, 0x55])
+    assert _written == [ bytes([0xAA, 0x55]) ]
+    assert _bus.read_byte_data(ADDRESS, 0x10) == I2CSlave.OKAY
+    # a write handler's return value answers the next read
+    _bus.write_i2c_block_data(ADDRESS, 0x11, [1, 5])
+    assert _bus.read_byte(ADDRESS) == 0x35
+    assert _bus.read_byte_data(ADDRESS, 0x13) == 0x42
+    assert _bus.read_i2c_block_data(ADDRESS, 0x12, 3) == list(b'abc')
+    assert _slave.frames_received == 2 and _slave._payload == ''
+    # other registers are handled as before
+    _bus.write_i2c_block_data(ADDRESS, REGISTER, [2, 1, 2])
+    assert _slave._payload == bytes([1, 2])
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    _slave.register(0x10)
+    _bus.write_i2c_block_data(ADDRESS, 0x10, [1, 0])
+    assert len(_written) == 1 and _slave.frames_received == 4
+    try:
+        _slave.register(0x100, on_read=lambda: 0)
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+
+def test_profiler():
+    from i2c_profiler import I2CProfiler
+    _slave = new_slave()
+    assert _slave.profiler is None and 'process_buffer' not in vars(_slave)
+    _shown = []
+    _slave = new_slave(binary=True, profile=True, callback=lambda message, color: _shown.append(color))
+    _profiler = _slave.profiler
+    _slave.register(0x10, on_write=lambda frame: None)
+    _slave.register(0x13, on_read=lambda: 0x42)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _bus.write_i2c_block_data(ADDRESS, REGISTER, [2, 1, 2])
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    _bus.write_i2c_block_data(ADDRESS, 0x10, [1, 0])
+    assert _bus.read_byte_data(ADDRESS, 0x13) == 0x42
+    _slave.indicator.render()
+    for _section in ( I2CProfiler.START, I2CProfiler.RECEIVE, I2CProfiler.REQUEST, I2CProfiler.FINISH ):
+        assert _profiler.count(_section) > 0
+    assert _profiler.count(I2CProfiler.PROCESS_BUFFER) == 1
+    assert _profiler.count(I2CProfiler.ON_WRITE) == 1
+    assert _profiler.count(I2CProfiler.ON_READ) == 1
+    assert _profiler.count(I2CProfiler.STATUS) == len(_shown) > 0
+    # a state includes the callbacks run within it
+    assert _profiler.max_us(I2CProfiler.RECEIVE) >= _profiler.max_us(I2CProfiler.PROCESS_BUFFER)
+    _profiler.reset()
+    assert sum(_profiler.count(_section) for _section in range(len(I2CProfiler.SECTIONS))) == 0
+
+def test_profiler_buckets():
+    import contextlib, io, utime
+    from i2c_profiler import I2CProfiler
+    _profiler = I2CProfiler()
+    _ticks_us = utime.ticks_us
+    try:
+        # bucket b counts durations from 2**(b-1) up to 2**b µs, the last anything longer
+        for _us, _bucket in ( ( 0, 0 ), ( 1, 1 ), ( 3, 2 ), ( 4, 3 ), ( 1000, 10 ), ( 10**6, 15 ) ):
+            utime.ticks_us = lambda: 5000000 + _us
+            _profiler.record(I2CProfiler.START, 5000000)
+            assert _profiler.histogram(I2CProfiler.START)[_bucket] == 1, _us
+    finally:
+        utime.ticks_us = _ticks_us
+    assert _profiler.count(I2CProfiler.START) == 6 and _profiler.max_us(I2CProfiler.START) == 10**6
+    _out = io.StringIO()
+    with contextlib.redirect_stdout(_out):
+        _profiler.dump()
+    assert '16384+: 1' in _out.getvalue() and 'receive' not in _out.getvalue()
+
+def test_work_queue():
+    from i2c_master import I2CMaster
+    from response import Response
+    _processed = []
+    class _Slave(I2CSlave):
+        def process_buffer(self, buffer):
+            _processed.append(buffer.to_string())
+            return super().process_buffer(buffer)
+    _slave = new_slave(_Slave, queue=2)
+    _master = I2CMaster(bus=i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll))
+    # queued, not processed, while the bus is serviced
+    assert _master.send('one') == Response.OKAY
+    assert _master.send('two') == Response.OKAY
+    assert _processed == [] and _slave.queue_depth == 2
+    assert _master.send('three') == Response.BUSY
+    assert _slave.frames_dropped == 1 and _slave.frames_received == 2
+    assert _slave.process_frames(limit=1) == 1 and _processed == [ 'one' ]
+    assert _master.send('four') == Response.OKAY
+    assert _slave.process_frames() == 2 and _processed == [ 'one', 'two', 'four' ]
+    assert _slave.queue_depth == 0 and _slave.queue_high_water == 2
+    _frame = bytearray(I2CSlave.MAX_CHARS)
+    assert _master.send('five') == Response.OKAY
+    assert _frame[:_slave.receive_frame(_frame)] == b'five'
+    assert _slave.receive_frame(_frame) == -1
+
+def test_status_indicator():
+    import time
+    from status_indicator import StatusIndicator
+    from colors import COLOR_BLACK, COLOR_GREEN, COLOR_RED
+    _shown = []
+    _indicator = StatusIndicator(lambda message, color: _shown.append(( message, color )))
+    _indicator.post('a', COLOR_RED)
+    _indicator.post('b', COLOR_GREEN)
+    assert _shown == []
+    # the latest status wins
+    _indicator.render()
+    assert _shown == [ ( 'b', COLOR_GREEN ) ]
+    # a color already shown is not shown again without a message
+    _indicator.post(None, COLOR_GREEN)
+    _indicator.render()
+    _indicator.render()
+    assert len(_shown) == 1 and _indicator.posted == 3 and _indicator.rendered == 1
+    # a held status is turned off once it expires
+    _indicator.post(None, COLOR_RED, hold_ms=5)
+    _indicator.render()
+    _indicator.render()
+    assert _shown[-1] == ( None, COLOR_RED )
+    time.sleep(0.01)
+    _indicator.render()
+    assert _shown[-1] == ( None, COLOR_BLACK ) and _indicator.rendered == 3
+    # rendered from a soft timer, as the callback may allocate
+    _indicator.start()
+    assert _indicator._timer.hard is False
+    _indicator.stop()
+
+def test_status_off_bus_loop():
+    from colors import COLOR_BLACK
+    _shown = []
+    _slave = new_slave(callback=lambda message, color: _shown.append(( message, color )))
+    del _shown[:]
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master.write(ADDRESS, legacy_frame('hello'))
+    assert _master.read_byte(ADDRESS) == I2CSlave.OKAY
+    # nothing is shown from the bus loop
+    assert _shown == [] and _slave.indicator.posted > 1
+    _slave.indicator.render()
+    assert len(_shown) == 1
+    # started with enable(), the indicator runs from a timer
+    _slave.indicator.start()
+    _master.write(ADDRESS, legacy_frame('again'))
+    assert len(_shown) > 1 and _slave.indicator.rendered < _slave.indicator.posted
+    _slave.indicator.stop()
+
+def test_async_slave():
+    import asyncio
+    from async_i2c_slave import AsyncI2CSlave
+    _frames = []
+    class _Slave(AsyncI2CSlave):
+        async def handle_frame(self, buffer):
+            _text = buffer.to_string()
+            if _text == 'hello':
+                # the bus is still serviced while a frame is being handled
+                await _released.wait()
+            _frames.append(_text)
+    for _irq in ( False, True ):
+        del _frames[:]
+        _slave = new_slave(_Slave, irq=_irq)
+        # the master runs in its own thread, waiting while the slave holds the bus
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, max_stall=1000000)
+        _ticks = []
+        _released = asyncio.Event()
+
+        async def _ticker():
+            while True:
+                _ticks.append(1)
+                await asyncio.sleep(0)
+
+        def _bus():
+            _master.write(ADDRESS, legacy_frame('hello'))
+            _response = _master.read_byte(ADDRESS)
+            _master.write(ADDRESS, legacy_frame('world'))
+            return _response
+
+        async def _main():
+            _task = _slave.start()
+            _other = asyncio.create_task(_ticker())
+            _response = await asyncio.to_thread(_bus)
+            # 'hello' is still being handled while 'world' is received and queued
+            for i in range(1000):
+                if _slave.queue_depth == 1:
+                    break
+                await asyncio.sleep(0.001)
+            assert _frames == [] and _slave.queue_depth == 1
+            _released.set()
+            for i in range(1000):
+                if len(_frames) == 2:
+                    break
+                await asyncio.sleep(0.001)
+            _slave.disable()
+            await asyncio.wait_for(_task, 1.0)
+            _other.cancel()
+            return _response
+
+        assert asyncio.run(_main()) == I2CSlave.OKAY
+        assert _frames == [ 'hello', 'world' ]
+        # the other task ran alongside the slave
+        assert len(_ticks) > 1
+
+def test_block_response():
+    from i2c_master import I2CMaster
+    from response import Response
+    class EchoSlave(I2CSlave):
+        def process_buffer(self, buffer):
+            _payload = super().process_buffer(buffer)
+            self.set_response(buffer.view()[::-1])
+            return _payload
+    _slave = new_slave(EchoSlave)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master = I2CMaster(bus=_bus)
+    # nothing set yet: a count of zero
+    assert _master.read_response() == b''
+    assert _master.send('hello world') == Response.OKAY
+    _starts = _bus.starts
+    assert _master.read_response() == b'dlrow olleh'
+    # the write of the register and the read, joined by a repeated start
+    assert _bus.starts - _starts == 2
+    # kept until replaced, and the frames that follow are still parsed
+    assert _master.read_response(11) == b'dlrow olleh'
+    assert _master.send('ab') == Response.OKAY
+    assert _master.read_response() == b'ba'
+    try:
+        _master.read_response(1)
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+    _slave.set_response(bytes(range(200)))
+    assert _bus.write_then_read(ADDRESS, [I2CSlave.RESPONSE_REGISTER], 201) == [200] + list(range(200))
+    # longer than an SMBus block read allows: read in a combined transaction
+    assert _master.read_response(200) == bytes(range(200))
+    _slave.set_response(bytes(range(31)))
+    assert _master.read_response() == bytes(range(31))
+    # bytes read past the end of the block are the response byte
+    _slave.set_response(b'xy')
+    assert _bus.read_i2c_block_data(ADDRESS, I2CSlave.RESPONSE_REGISTER, 4) == [2, 0x78, 0x79, I2CSlave.EMPTY_PAYLOAD]
+    try:
+        _slave.set_response(bytes(256))
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+
+def test_core1_frames_and_responses():
+    import time
+    _slave = new_slave(core1=True)
+    _slave.enable()
+    # the loop runs in its own thread and enable() returns
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32)
+    try:
+        _master.write(ADDRESS, legacy_frame('hello'))
+        _frame = bytearray(I2CSlave.FRAME_SIZE)
+        _count = -1
+        for i in range(1000):
+            _count = _slave.receive_frame(_frame)
+            if _count >= 0:
+                break
+            time.sleep(0.001)
+        assert _frame[:_count] == b'hello'
+        assert _slave.send_response(b'world')
+        while _slave._tx_buffer is None:
+            time.sleep(0.001)
+        assert _master.read(ADDRESS, 5) == list(b'world')
+    finally:
+        _slave.disable()
+        time.sleep(0.01)
+
+def test_slave_group():
+    for _irq in ( False, True ):
+        _slaves = new_slave_pair(irq=_irq)
+        _group = I2CSlaveGroup(*_slaves)
+        if _irq:
+            _group.attach()
+            # the handlers run in a hard interrupt
+            assert _group._timer.hard
+        _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_group.service if _irq else _group.poll)
+        _master.write(ADDRESS, legacy_frame('first'))
+        _master.write(ADDRESS + 1, legacy_frame('second'))
+        assert [ _slave._payload for _slave in _slaves ] == ['first', 'second']
+        # an error on one leaves the other's state alone
+        _master.write(ADDRESS, [REGISTER, 3, 0x41, 0x07, 0x42, 0x01, 0xFF])
+        assert _master.read_byte_data(ADDRESS, REGISTER) == I2CSlave.INVALID_CHAR
+        assert _master.read_byte_data(ADDRESS + 1, REGISTER) == I2CSlave.OKAY
+        assert [ ( _slave.frames_received, _slave.error_count ) for _slave in _slaves ] == [ (1, 1), (1, 0) ]
+
+def test_general_call():
+    from i2c_master import I2CMaster
+    class ListeningSlave(I2CSlave):
+        def process_general_call(self, buf, count):
+            _heard.append(( self.s_i2c.i2c_ID, bytes(buf[:count]) ))
+    _heard = []
+    _slaves = new_slave_pair(ListeningSlave, general_call=True)
+    _group = I2CSlaveGroup(*_slaves)
+    _bus = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_group.poll)
+    _master = I2CMaster(bus=_bus)
+    _bus.write(ADDRESS, legacy_frame('hello'))
+    _master.broadcast(0x10, [1, 2, 3])
+    assert _heard == [ (0, bytes([0x10, 1, 2, 3])), (1, bytes([0x10, 1, 2, 3])) ]
+    # the broadcast leaves the pending frame and response alone
+    assert _bus.read_byte_data(ADDRESS, REGISTER) == I2CSlave.OKAY
+    # a slave not accepting general calls NACKs them
+    _slaves[1].s_i2c.general_Call(False)
+    _master.broadcast(0x11)
+    assert _heard[2:] == [ (0, bytes([0x11])) ]
+
+def test_register_slave():
+    _slave = new_slave(I2CRegisterSlave, size=32)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master.write_i2c_block_data(ADDRESS, 4, [1, 2, 3])
+    assert _slave.registers[3:8] == bytearray([0, 1, 2, 3, 0])
+    assert _master.read_i2c_block_data(ADDRESS, 3, 5) == [0, 1, 2, 3, 0]
+    # a read without a register address continues from the pointer
+    assert _slave.pointer == 8
+    _slave.registers[8] = 0x42
+    assert _master.read_byte(ADDRESS) == 0x42
+    # writes wrap at the end of the bank, reads stop there
+    _master.write_i2c_block_data(ADDRESS, 30, list(range(20, 40)))
+    assert _slave.registers[30:] == bytearray([20, 21]) and _slave.registers[:18] == bytearray(range(22, 40))
+    assert _master.read_i2c_block_data(ADDRESS, 30, 4) == [20, 21, 0xFF, 0xFF]
+    # two writes queued before the slave looks at either each set the pointer
+    _master.pump = None
+    _master.write_i2c_block_data(ADDRESS, 4, [1, 2])
+    _master.write_i2c_block_data(ADDRESS, 10, [7, 8])
+    _slave.poll()
+    assert _slave.registers[4:6] == bytearray([1, 2]) and _slave.registers[10:12] == bytearray([7, 8])
+    assert _slave.registers[6] == 28 and _slave.pointer == 12
+
+def test_dma_receive_and_transmit():
+    class DmaSlave(I2CSlave):
+        def transmit_complete(self, count):
+            _sent.append(count)
+    _sent = []
+    _slave = new_slave(DmaSlave, dma=i2c_sim.SimulatedDmaChannel)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _buffer = bytearray(64)
+    _slave.receive_into(_buffer)
+    # longer than the 16-byte FIFO, and binary
+    _master.write(ADDRESS, list(range(40)))
+    assert _slave._payload == bytes(range(40))
+    # the channel is re-armed on the same buffer
+    _master.write(ADDRESS, [0xFF, 0x00, 0x7F])
+    assert _slave._payload == bytes([0xFF, 0x00, 0x7F])
+    _response = bytearray(range(100, 132))
+    _slave.transmit_from(_response)
+    assert _master.read(ADDRESS, 32) == list(_response)
+    assert _sent == [32]
+    # with nothing staged a read falls back to the response byte
+    assert _master.read_byte(ADDRESS) == I2CSlave.EMPTY_PAYLOAD
+
+def test_dma_receive_overrun():
+    _slave = new_slave(dma=i2c_sim.SimulatedDmaChannel)
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _slave.receive_into(bytearray(8))
+    _master.write(ADDRESS, list(range(12)))
+    assert _master.read_byte(ADDRESS) == I2CSlave.PAYLOAD_TOO_LARGE
+    _master.write(ADDRESS, [1, 2, 3])
+    assert _slave._payload == bytes([1, 2, 3])
+
+def test_timing_table():
+    # bus speed, system clock, IC_SDA_HOLD, IC_SDA_SETUP, IC_FS_SPKLEN
+    _table = (
+        (  100000, 125000000, 38, 33,  7 ),
+        (  400000, 125000000, 38, 14,  7 ),
+        ( 1000000, 125000000, 16,  8,  7 ),
+        (  100000,  48000000, 15, 13,  3 ),
+        (  400000,  48000000, 15,  6,  3 ),
+        ( 1000000,  48000000,  6,  4,  3 ),
+        ( 1000000, 133000000, 16,  8,  7 ),
+    )
+    for _speed, _clock, _hold, _setup, _spklen in _table:
+        _timing = I2CTiming(_speed, _clock)
+        assert ( _timing.sda_hold, _timing.sda_setup, _timing.fs_spklen ) == ( _hold, _setup, _spklen ), str(_timing)
+    for _speed, _clock in ( ( 0, 125000000 ), ( 3400000, 125000000 ), ( 1000000, 4000000 ) ):
+        try:
+            I2CTiming(_speed, _clock)
+            assert False, 'expected ValueError for {:d}Hz at {:d}Hz'.format(_speed, _clock)
+        except ValueError:
+            pass
+
+def test_timing_applied():
+    _slave = new_slave(bus_speed=1000000)
+    _controller = i2c_sim.mem32.controller(0)
+    assert _controller.registers[i2c_sim.IC_SDA_HOLD] & 0xFFFF == 16
+    assert _controller.registers[i2c_sim.IC_SDA_SETUP] == 8
+    assert _controller.registers[i2c_sim.IC_FS_SPKLEN] == 7
+    _master = i2c_sim.SimulatedMaster(i2c_sim.mem32, pump=_slave.poll)
+    _master.write(ADDRESS, legacy_frame('fast'))
+    assert _master.read_byte(ADDRESS) == I2CSlave.OKAY
+    # a running controller is disabled while the timing changes
+    _slave.s_i2c.set_Timing(I2CTiming(100000))
+    assert _controller.registers[i2c_sim.IC_SDA_SETUP] == 33
+    assert _controller.enabled
+    try:
+        _slave.s_i2c.write_Timing(I2CTiming(400000))
+        assert False, 'expected the write to be refused while enabled'
+    except RuntimeError:
+        pass
+
+# main ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+if __name__ == '__main__':
+    _tests = [ (_name, _fn) for _name, _fn in sorted(globals().items()) if _name.startswith('test_') ]
+    for _name, _fn in _tests:
+        _fn()
+        print('{}: passed.'.format(_name))
+    print('{:d} tests passed.'.format(len(_tests)))
+
+#EOF
@@ -7,17 +7,15 @@
 #
 # author:   Murray Altheim
 # created:  2024-08-13
-# modified: 2024-08-18
+# modified: 2024-08-21
 #
 # A script that sends the command line argument as a packet to an I2C slave.
-#
-# see smbus2
-# https://smbus2.readthedocs.io/en/latest/#smbus2.SMBus.write_block_data
+# The protocol itself is implemented by I2CMaster.
 #
 
 import sys, traceback
-from smbus import SMBus
 
+from i2c_master import I2CMaster
 from response import Response
 
 if len(sys.argv) != 2:
@@ -36,25 +34,13 @@ CONFIG_REGISTER   = 1
 
 try:
 
-    # convert source string to a list of bytes as a payload
-    _payload = list(bytes(_value, 'utf-8'))
-    if len(_payload) > 32:
-        raise Exception('source text ({:d} chars) too long: 32 maximum.'.format(len(_payload)))
-
     print('creating connection to I2C bus on address 0x{:02X}…'.format(I2C_SLAVE_ADDRESS))
-    _i2cbus = SMBus(1)  # create a new I2C bus
+    _master = I2CMaster(1, I2C_SLAVE_ADDRESS, CONFIG_REGISTER)
 
     print("writing I2C payload of {:d} chars: '{}'…".format(len(_value), _value))
-    _i2cbus.write_block_data(I2C_SLAVE_ADDRESS, CONFIG_REGISTER, _payload)
-
-    print('writing completion code…')
-    _i2cbus.write_byte_data(I2C_SLAVE_ADDRESS, CONFIG_REGISTER, 0xff)
-
+    _response = _master.send(_value)
     print('write complete.')
 
-    _read_data = _i2cbus.read_byte_data(I2C_SLAVE_ADDRESS, CONFIG_REGISTER)
-    print("read data: '{}'".format(_read_data))
-    _response = Response.from_value(_read_data)
     if _response.value <= Response.OKAY.value:
         print("response: {}".format(_response.name))
     else:
@@ -15,7 +15,7 @@ from enum import Enum
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 class Response(Enum):
     # this variable must include all entries, whitespace-delimited
-    __order__ = " INIT OKAY BAD_ADDRESS OUT_OF_SYNC INVALID_CHAR SOURCE_TOO_LARGE UNVALIDATED EMPTY_PAYLOAD PAYLOAD_TOO_LARGE UNKNOWN_ERROR VALUE_OFF VALUE_ON "
+    __order__ = " INIT OKAY BAD_ADDRESS OUT_OF_SYNC INVALID_CHAR SOURCE_TOO_LARGE UNVALIDATED EMPTY_PAYLOAD PAYLOAD_TOO_LARGE UNKNOWN_ERROR BUSY VALUE_OFF VALUE_ON "
     '''
     Provides an enumeration of response codes from the I2C Slave.
     These match the hard-coded values in the MicroPython file.
@@ -30,10 +30,11 @@ class Response(Enum):
     EMPTY_PAYLOAD     = (  7, 'empty payload',     0x76 )
     PAYLOAD_TOO_LARGE = (  8, 'payload too large', 0x77 )
     UNKNOWN_ERROR     = (  9, 'unknown error',     0x78 )
+    BUSY              = ( 10, 'busy',              0x79 )
 
     # example extension
-    VALUE_OFF         = ( 10, 'off',               0x30 )
-    VALUE_ON          = ( 11, 'on',                0x31 )
+    VALUE_OFF         = ( 11, 'off',               0x30 )
+    VALUE_ON          = ( 12, 'on',                0x31 )
 
     # ignore the first param since it's already set by __new__
     def __init__(self, num, name, value):
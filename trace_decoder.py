@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# Decodes the binary bus trace kept by an I2CSlave (see upy/bus_trace.py) into
+# a timeline. The trace is either a file saved on the slave's flash, copied to
+# the host, or read from the slave over I2C:
+#
+#   % trace_decoder.py trace.bin
+#   % trace_decoder.py
+#
+
+import sys
+from collections import namedtuple
+
+from response import Response
+
+VERSION     = 1
+HEADER_SIZE = 16
+TICKS_MASK  = 0x3FFFFFFF
+
+# the event types of upy/bus_trace.py, by value
+EVENTS = { 1: 'START', 2: 'STOP', 3: 'TX_ABORT', 4: 'FRAME', 5: 'RESPONSE', 6: 'TRANSMIT',
+           7: 'ERROR', 8: 'GENERAL_CALL', 9: 'DUPLICATE' }
+
+TraceHeader = namedtuple('TraceHeader', 'capacity head held written time_us')
+TraceRecord = namedtuple('TraceRecord', 'time_us event register count code')
+
+def decode(data):
+    '''
+    Decodes a trace, returning its TraceHeader and the TraceRecords it holds,
+    oldest first. Each record's time_us is the time in µs from the first
+    record, unwrapped from the slave's 30-bit clock on the assumption that
+    no two consecutive records are more than 2**30 µs (about 18 minutes)
+    apart.
+    '''
+    data = bytes(data)
+    if len(data) < HEADER_SIZE:
+        raise ValueError('trace too short: {:d} bytes.'.format(len(data)))
+    if data[0] != VERSION:
+        raise ValueError('unsupported trace version: {:d}.'.format(data[0]))
+    _record_size = data[1]
+    _header = TraceHeader(int.from_bytes(data[2:4], 'little'), int.from_bytes(data[4:6], 'little'),
+            int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:12], 'little'),
+            int.from_bytes(data[12:16], 'little'))
+    if len(data) < HEADER_SIZE + _header.capacity * _record_size:
+        raise ValueError('trace truncated: {:d} of {:d} bytes.'.format(len(data), HEADER_SIZE + _header.capacity * _record_size))
+    # the oldest record is at the head once the ring has filled
+    _first = _header.head if _header.held == _header.capacity else 0
+    _records = []
+    _elapsed = 0
+    _previous = None
+    for i in range(_header.held):
+        _offset = HEADER_SIZE + (( _first + i ) % _header.capacity ) * _record_size
+        _time = int.from_bytes(data[_offset:_offset + 4], 'little')
+        if _previous is not None:
+            _elapsed += ( _time - _previous ) & TICKS_MASK
+        _previous = _time
+        _records.append(TraceRecord(_elapsed, data[_offset + 4], data[_offset + 5], data[_offset + 6], data[_offset + 7]))
+    return _header, _records
+
+def code_name(code):
+    try:
+        return Response.from_value(code).name
+    except NotImplementedError:
+        return '0x{:02X}'.format(code)
+
+def describe(record):
+    '''
+    Returns a one-line description of a record.
+    '''
+    _event = EVENTS.get(record.event, 'EVENT 0x{:02X}'.format(record.event))
+    if _event == 'FRAME':
+        return '{:<12} register 0x{:02X}, {:d} bytes'.format(_event, record.register, record.count)
+    elif _event == 'RESPONSE':
+        return '{:<12} register 0x{:02X}: 0x{:02X} ({})'.format(_event, record.register, record.code, code_name(record.code))
+    elif _event == 'TRANSMIT':
+        return '{:<12} register 0x{:02X}, {:d} bytes sent'.format(_event, record.register, record.count)
+    elif _event == 'ERROR':
+        return '{:<12} register 0x{:02X}: {}'.format(_event, record.register, code_name(record.code))
+    elif _event == 'DUPLICATE':
+        return '{:<12} register 0x{:02X}: sequence {:d} answered 0x{:02X} ({})'.format(_event, record.register, record.count, record.code, code_name(record.code))
+    elif _event == 'GENERAL_CALL':
+        return '{:<12} {:d} bytes'.format(_event, record.count)
+    return _event
+
+def timeline(data):
+    '''
+    Returns the lines of the timeline of a trace: each record's time in ms
+    from the first, the time since the record before, and what happened.
+    '''
+    _header, _records = decode(data)
+    _lines = [ '{:d} of {:d} events written are held.'.format(len(_records), _header.written) ]
+    _previous = 0
+    for _record in _records:
+        _lines.append('{:>12.3f} ms  +{:>9d} µs  {}'.format(_record.time_us / 1000, _record.time_us - _previous, describe(_record)))
+        _previous = _record.time_us
+    return _lines
+
+# main ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as _file:
+            _data = _file.read()
+    else:
+        from i2c_master import I2CMaster
+        _master = I2CMaster()
+        try:
+            _data = _master.read_trace()
+        finally:
+            _master.close()
+    for _line in timeline(_data):
+        print(_line)
+
+#EOF
@@ -1,5 +1,6 @@
 ### i2cSlave.py
-from machine import mem32
+import micropython
+from machine import mem32, Timer
 from RP2040_I2C_Registers import*
 
 
@@ -9,6 +10,8 @@ class i2c_slave:
     I2C0_BASE = 0x40044000
     I2C1_BASE = 0x40048000
     IO_BANK0_BASE = 0x40014000
+    FIFO_DEPTH = 16
+    FIRST_DATA_BYTE = 0x800   # IC_DATA_CMD: the byte began a write (see rx_first after read_into())
 
     # Atomic Register Access 
     mem_rw = 0x0000     # Normal read/write access
@@ -45,16 +48,25 @@ class i2c_slave:
     def RP2040_Get_32b_i2c_Bits(self, offset, bit_mask):
         return mem32[self.i2c_base | offset] & bit_mask
 
-    def __init__(self, i2cID = 0, sda=0, scl=1, slaveAddress=0x44):
+    def __init__(self, i2cID = 0, sda=0, scl=1, slaveAddress=0x44, timing=None):
         self.scl = scl
         self.sda = sda
         self.slaveAddress = slaveAddress
         self.i2c_ID = i2cID
+        self.irq_timer = None
+        self.irq_handler = None
+        # a byte read from IC_DATA_CMD but kept for the next read_into(), or -1
+        self.rx_held = -1
+        # set by read_into(): True if the first byte it returned began a write
+        self.rx_first = False
         if self.i2c_ID == 0:
             self.i2c_base = self.I2C0_BASE
         else:
             self.i2c_base = self.I2C1_BASE
 
+        # Resolve the register addresses and bit masks used per byte
+        self.resolve_Registers()
+
         """
           I2C Slave Mode Intructions
           https://datasheets.raspberrypi.com/rp2040/rp2040-datasheet.pdf
@@ -89,6 +101,14 @@ class i2c_slave:
         self.RP2040_Set_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CON"], 
                                       self.get_Bits_Mask("RX_FIFO_FULL_HLD_CTRL", I2C_IC_CON))
 
+        # Unmask the conditions reported by poll_events(); START_DET, STOP_DET
+        # and RESTART_DET are masked at reset and would never show in IC_INTR_STAT
+        self.RP2040_Write_32b_i2c_Reg(I2C_OFFSET["I2C_IC_INTR_MASK"], 
+                                      i2c_slave.I2CEvent.DISPATCHED)
+
+        # SDA hold, SDA setup and spike suppression can only be written while disabled
+        if timing:
+            self.write_Timing(timing)
         
         # 4. Enable the DW_apb_i2c by writing a ‘1’ to IC_ENABLE.ENABLE.
         self.RP2040_Set_32b_i2c_Reg(I2C_OFFSET["I2C_IC_ENABLE"], 
@@ -106,6 +126,52 @@ class i2c_slave:
 
         print('established I2C slave on ID={}; SDA={}; SCL={} at 0x{:02X}'.format(i2cID, sda, scl, self.slaveAddress))
 
+    def resolve_Registers(self):
+        """ Precompute absolute register addresses and bit masks for the hot path """
+        # < Base Addr > | < Register >, resolved once rather than on every access
+        base = self.i2c_base
+        self.ic_data_cmd        = base | I2C_OFFSET["I2C_IC_DATA_CMD"]
+        self.ic_status          = base | I2C_OFFSET["I2C_IC_STATUS"]
+        self.ic_intr_stat       = base | I2C_OFFSET["I2C_IC_INTR_STAT"]
+        self.ic_raw_intr_stat   = base | I2C_OFFSET["I2C_IC_RAW_INTR_STAT"]
+        self.ic_clr_rd_req      = base | I2C_OFFSET["I2C_IC_CLR_RD_REQ"]
+        self.ic_clr_tx_abrt     = base | I2C_OFFSET["I2C_IC_CLR_TX_ABRT"]
+        self.ic_clr_rx_done     = base | I2C_OFFSET["I2C_IC_CLR_RX_DONE"]
+        self.ic_clr_restart_det = base | I2C_OFFSET["I2C_IC_CLR_RESTART_DET"]
+        self.ic_clr_start_det   = base | I2C_OFFSET["I2C_IC_CLR_START_DET"]
+        self.ic_clr_stop_det    = base | I2C_OFFSET["I2C_IC_CLR_STOP_DET"]
+        self.ic_clr_gen_call    = base | I2C_OFFSET["I2C_IC_CLR_GEN_CALL"]
+        self.ic_ack_general_call = base | I2C_OFFSET["I2C_IC_ACK_GENERAL_CALL"]
+        self.ic_clr_intr        = base | I2C_OFFSET["I2C_IC_CLR_INTR"]
+        self.ic_intr_mask       = base | I2C_OFFSET["I2C_IC_INTR_MASK"]
+        self.ic_rx_tl           = base | I2C_OFFSET["I2C_IC_RX_TL"]
+        self.ic_tx_tl           = base | I2C_OFFSET["I2C_IC_TX_TL"]
+        self.ic_txflr           = base | I2C_OFFSET["I2C_IC_TXFLR"]
+        self.ic_rxflr           = base | I2C_OFFSET["I2C_IC_RXFLR"]
+        self.ic_dma_cr          = base | I2C_OFFSET["I2C_IC_DMA_CR"]
+        self.ic_dma_tdlr        = base | I2C_OFFSET["I2C_IC_DMA_TDLR"]
+        self.ic_dma_rdlr        = base | I2C_OFFSET["I2C_IC_DMA_RDLR"]
+        self.ic_enable          = base | I2C_OFFSET["I2C_IC_ENABLE"]
+        self.ic_enable_status   = base | I2C_OFFSET["I2C_IC_ENABLE_STATUS"]
+        self.ic_sda_hold        = base | I2C_OFFSET["I2C_IC_SDA_HOLD"]
+        self.ic_sda_setup       = base | I2C_OFFSET["I2C_IC_SDA_SETUP"]
+        self.ic_fs_spklen       = base | I2C_OFFSET["I2C_IC_FS_SPKLEN"]
+
+        self.mask_dat           = self.get_Bits_Mask("DAT", I2C_IC_DATA_CMD)
+        self.mask_first         = self.get_Bits_Mask(["FIRST_DATA_BYTE"], I2C_IC_DATA_CMD)
+        self.mask_rfne          = self.get_Bits_Mask("RFNE", I2C_IC_STATUS)
+        self.mask_slv_activity  = self.get_Bits_Mask(["SLV_ACTIVITY"], I2C_IC_STATUS)
+        self.mask_tx_abrt       = self.get_Bits_Mask("R_TX_ABRT", I2C_IC_INTR_STAT)
+        self.mask_rx_done       = self.get_Bits_Mask("R_RX_DONE", I2C_IC_INTR_STAT)
+        self.mask_restart_det   = self.get_Bits_Mask("R_RESTART_DET", I2C_IC_INTR_STAT)
+        self.mask_start_det     = self.get_Bits_Mask("R_START_DET", I2C_IC_INTR_STAT)
+        self.mask_stop_det      = self.get_Bits_Mask("R_STOP_DET", I2C_IC_INTR_STAT)
+        self.mask_gen_call      = self.get_Bits_Mask("R_GEN_CALL", I2C_IC_INTR_STAT)
+        self.mask_rd_req        = self.get_Bits_Mask("R_RD_REQ", I2C_IC_INTR_STAT)
+        self.mask_raw_rd_req    = self.get_Bits_Mask("RD_REQ", I2C_IC_RAW_INTR_STAT)
+        self.mask_rdmae         = self.get_Bits_Mask("RDMAE", I2C_IC_DMA_CR)
+        self.mask_tdmae         = self.get_Bits_Mask("TDMAE", I2C_IC_DMA_CR)
+
 
     class I2CStateMachine:
         I2C_RECEIVE = 0
@@ -114,6 +180,23 @@ class i2c_slave:
         I2C_START   = 3
 
    
+    class I2CEvent:
+        """ Event bits returned by poll_events(), laid out as in IC_INTR_STAT """
+        RX_FULL  = 0x00000004   # R_RX_FULL (interrupt trigger only)
+        TX_EMPTY = 0x00000010   # R_TX_EMPTY (only while unmasked by tx_Empty_Irq())
+        REQUEST  = 0x00000020   # R_RD_REQ
+        TX_ABORT = 0x00000040   # R_TX_ABRT
+        RX_DONE  = 0x00000080   # R_RX_DONE
+        STOP     = 0x00000200   # R_STOP_DET
+        START    = 0x00000400   # R_START_DET
+        GEN_CALL = 0x00000800   # R_GEN_CALL
+        RESTART  = 0x00001000   # R_RESTART_DET
+        RECEIVE  = 0x00010000   # IC_STATUS.RFNE (not an IC_INTR_STAT bit)
+        ACTIVE   = 0x00020000   # IC_STATUS.SLV_ACTIVITY, read after the snapshot (not an IC_INTR_STAT bit)
+
+        # the IC_INTR_STAT conditions unmasked and dispatched
+        DISPATCHED = REQUEST | TX_ABORT | RX_DONE | STOP | START | GEN_CALL | RESTART
+
     class I2CTransaction:
 
         def __init__(self, address: int, data_byte: list):
@@ -125,53 +208,49 @@ class i2c_slave:
             self.data_byte = []
 
     
+    @micropython.native
     def handle_event(self):
         
+        intr_stat = mem32[self.ic_intr_stat]
+
         # I2C Master has abort the transactions
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_INTR_STAT"],
-                                 self.get_Bits_Mask("R_TX_ABRT", I2C_IC_INTR_STAT))):
+        if intr_stat & self.mask_tx_abrt:
             # Clear int
-            self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CLR_TX_ABRT"])
+            mem32[self.ic_clr_tx_abrt]
             return i2c_slave.I2CStateMachine.I2C_FINISH
         
         # Last byte transmitted by I2C Slave but NACK from I2C Master 
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_INTR_STAT"],
-                                 self.get_Bits_Mask("R_RX_DONE", I2C_IC_INTR_STAT))):
+        if intr_stat & self.mask_rx_done:
             # Clear int
-            self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CLR_RX_DONE"])
+            mem32[self.ic_clr_rx_done]
             return i2c_slave.I2CStateMachine.I2C_FINISH
         
         # Restart condition detected 
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_INTR_STAT"],
-                                 self.get_Bits_Mask("R_RESTART_DET", I2C_IC_INTR_STAT))):
+        if intr_stat & self.mask_restart_det:
             # Clear int
-            self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CLR_RESTART_DET"])
+            mem32[self.ic_clr_restart_det]
         
 
         # Start condition detected by I2C Slave
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_INTR_STAT"],
-                                 self.get_Bits_Mask("R_START_DET", I2C_IC_INTR_STAT))):
+        if intr_stat & self.mask_start_det:
             # Clear start detection 
-            self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CLR_START_DET"])
+            mem32[self.ic_clr_start_det]
             return i2c_slave.I2CStateMachine.I2C_START
 
         # Stop condition detected by I2C Slave
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_INTR_STAT"],
-                                 self.get_Bits_Mask("R_STOP_DET", I2C_IC_INTR_STAT))):
+        if intr_stat & self.mask_stop_det:
             
             # Clear stop detection
-            self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CLR_STOP_DET"])
+            mem32[self.ic_clr_stop_det]
             return i2c_slave.I2CStateMachine.I2C_FINISH
         
         # Check if RX FIFO is not empty
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_STATUS"],
-                                 self.get_Bits_Mask("RFNE", I2C_IC_STATUS))):
+        if mem32[self.ic_status] & self.mask_rfne:
             
             return i2c_slave.I2CStateMachine.I2C_RECEIVE
         
         # Check if Master is requesting data 
-        if (self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_INTR_STAT"],
-                                 self.get_Bits_Mask("R_RD_REQ", I2C_IC_INTR_STAT))):
+        if intr_stat & self.mask_rd_req:
             
             # Shall Wait until transfer is done, timing recommended 10 * fastest SCL clock period
             # for 100 Khz = (1/100E3) * 10 = 100 uS
@@ -179,14 +258,132 @@ class i2c_slave:
                 
             return i2c_slave.I2CStateMachine.I2C_REQUEST
 
+    @micropython.native
+    def poll_events(self):
+        """ Return every pending event as an I2CEvent bitmask from one IC_INTR_STAT snapshot.
+            The snapshot does not say in which order the conditions arrived: RECEIVE is set
+            while bytes are waiting, which read_into() returns one write at a time, and ACTIVE
+            if a transaction was still under way after the snapshot, i.e. a STOP in it ended
+            an earlier write than the one now being received """
+
+        events = mem32[self.ic_intr_stat] & ( i2c_slave.I2CEvent.DISPATCHED | i2c_slave.I2CEvent.TX_EMPTY )
+
+        if events & self.mask_rd_req:
+            # While RD_REQ is pending the slave holds SCL low, so no START or
+            # STOP can arrive between the snapshot and the clear: one read of
+            # IC_CLR_INTR clears everything seen, RD_REQ included.
+            mem32[self.ic_clr_intr]
+        elif events:
+            # Otherwise the bus is live, so only the conditions actually seen
+            # are cleared, leaving any that arrive after the snapshot pending.
+            if events & self.mask_tx_abrt:
+                mem32[self.ic_clr_tx_abrt]
+            if events & self.mask_rx_done:
+                mem32[self.ic_clr_rx_done]
+            if events & self.mask_restart_det:
+                mem32[self.ic_clr_restart_det]
+            if events & self.mask_start_det:
+                mem32[self.ic_clr_start_det]
+            if events & self.mask_stop_det:
+                mem32[self.ic_clr_stop_det]
+            if events & self.mask_gen_call:
+                mem32[self.ic_clr_gen_call]
+
+        status = mem32[self.ic_status]
+        # Check if RX FIFO is not empty
+        if status & self.mask_rfne or self.rx_held >= 0:
+            events |= i2c_slave.I2CEvent.RECEIVE
+        if events and status & self.mask_slv_activity:
+            events |= i2c_slave.I2CEvent.ACTIVE
+
+        return events
+
+    def irq(self, handler=None, freq=5000):
+        """ Call handler(i2c_slave) while a masked I2C interrupt is pending; None detaches.
+            With freq None no timer is started: the caller samples with irq_Sample() """
+
+        if self.irq_timer:
+            self.irq_timer.deinit()
+            self.irq_timer = None
+
+        if handler is None:
+            mem32[self.ic_intr_mask] = i2c_slave.I2CEvent.DISPATCHED
+            return
+
+        # Raise RX_FULL as soon as a single byte is in the RX FIFO
+        mem32[self.ic_rx_tl] = 0
+        mem32[self.ic_intr_mask] = i2c_slave.I2CEvent.DISPATCHED | i2c_slave.I2CEvent.RX_FULL
+
+        # MicroPython offers no hook on the I2C0/I2C1 NVIC vectors, so the
+        # interrupt line is sampled from a hard timer interrupt instead: the
+        # handler must not allocate.
+        self.irq_handler = handler
+        if freq:
+            self.irq_timer = Timer(freq=freq, mode=Timer.PERIODIC, callback=self.irq_Sample, hard=True)
+
+    @micropython.native
+    def irq_Sample(self, timer):
+        """ Timer callback: run the handler if the I2C interrupt line is asserted """
+        if mem32[self.ic_intr_stat]:
+            self.irq_handler(self)
+
+    def write_Timing(self, timing):
+        """ Write and verify the SDA hold, SDA setup and spike suppression registers of an I2CTiming """
+
+        mem32[self.ic_sda_hold] = ( mem32[self.ic_sda_hold] & self.get_Bits_Mask("IC_SDA_RX_HOLD", I2C_IC_SDA_HOLD) ) \
+                | timing.sda_hold
+        mem32[self.ic_sda_setup] = timing.sda_setup
+        mem32[self.ic_fs_spklen] = timing.fs_spklen
+        # the controller ignores these writes while enabled
+        if ( mem32[self.ic_sda_hold] & self.get_Bits_Mask("IC_SDA_TX_HOLD", I2C_IC_SDA_HOLD) ) != timing.sda_hold \
+                or mem32[self.ic_sda_setup] != timing.sda_setup \
+                or mem32[self.ic_fs_spklen] != timing.fs_spklen:
+            raise RuntimeError('timing registers not written: is the controller enabled?')
+
+    def set_Timing(self, timing):
+        """ Apply an I2CTiming, disabling the controller while the registers are written """
+
+        mem32[self.ic_enable | self.mem_clr] = 1
+        while mem32[self.ic_enable_status] & 1:
+            pass
+        try:
+            self.write_Timing(timing)
+        finally:
+            mem32[self.ic_enable | self.mem_set] = 1
+
+    def general_Call(self, enable):
+        """ ACK (and receive) or NACK writes to the general call address 0x00 """
+        mem32[self.ic_ack_general_call] = 1 if enable else 0
+
+    def dma_Enable(self, rx=False, tx=False, rx_level=1, tx_level=8):
+        """ Enable the DMA handshake (DREQ) for the RX and/or TX FIFO """
+
+        # RX DREQ is asserted while the RX FIFO holds at least rx_level bytes,
+        # TX DREQ while the TX FIFO holds no more than tx_level bytes
+        mem32[self.ic_dma_rdlr] = rx_level - 1
+        mem32[self.ic_dma_tdlr] = tx_level
+        mem32[self.ic_dma_cr] = ( self.mask_rdmae if rx else 0 ) | ( self.mask_tdmae if tx else 0 )
+
+    def tx_Empty_Irq(self, enable, level=8):
+        """ Unmask TX_EMPTY, raised while the TX FIFO holds no more than level bytes, or mask it """
+
+        if enable:
+            mem32[self.ic_tx_tl] = level
+            mem32[self.ic_intr_mask | self.mem_set] = i2c_slave.I2CEvent.TX_EMPTY
+        else:
+            mem32[self.ic_intr_mask | self.mem_clr] = i2c_slave.I2CEvent.TX_EMPTY
+
+    @micropython.native
+    def TX_Level(self):
+        """ Return the number of bytes waiting in the TX FIFO """
+        return mem32[self.ic_txflr]
+
+    @micropython.native
     def is_Master_Req_Read(self):
         """ Return status if I2C Master is requesting a read sequence """
         
         # Check RD_REQ Interrupt bit (master wants to read data from the slave)
-        status = self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_RAW_INTR_STAT"],
-                                 self.get_Bits_Mask("RD_REQ", I2C_IC_RAW_INTR_STAT))
-
-        if status :
+        if mem32[self.ic_raw_intr_stat] & self.mask_raw_rd_req:
             return True
         return False
     
@@ -196,7 +393,7 @@ class i2c_slave:
    
         # Check whether is FIRST_DATA_BYTE bit is active in IC_DATA_CMD. 
         first_data_byte_stat = self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_DATA_CMD"],
-                                 self.get_Bits_Mask("FIRST_DATA_BYTE", I2C_IC_DATA_CMD))
+                                 self.get_Bits_Mask(["FIRST_DATA_BYTE"], I2C_IC_DATA_CMD))
                 
         # Check whether is STOP_DET_IFADDRESSED bit is active in IC_CON.
         stop_stat = self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_CON"],
@@ -212,33 +409,94 @@ class i2c_slave:
         return False
     """
 
+    @micropython.native
     def Slave_Write_Data(self, data):
         """ Write 8bits of data at destination of I2C Master """
     
         # Send data
-        self.RP2040_Write_32b_i2c_Reg(I2C_OFFSET["I2C_IC_DATA_CMD"], data & 
-                                  self.get_Bits_Mask("DAT", I2C_IC_DATA_CMD))
+        mem32[self.ic_data_cmd] = data & self.mask_dat
         
-        self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_CLR_RD_REQ"]) 
+        mem32[self.ic_clr_rd_req]
         
         
+    @micropython.native
     def Available(self):
         """ Return true if data has been received from I2C Master """
 
         # Get RFNE Bit (Receive FIFO Not Empty)
-        return self.RP2040_Get_32b_i2c_Bits(I2C_OFFSET["I2C_IC_STATUS"],
-                                self.get_Bits_Mask("RFNE", I2C_IC_STATUS))
+        return self.rx_held >= 0 or mem32[self.ic_status] & self.mask_rfne
         
 
+    @micropython.native
     def Read_Data_Received(self):
         """ Return data from I2C Master """
-              
-        return self.RP2040_Read_32b_i2c_Reg(I2C_OFFSET["I2C_IC_DATA_CMD"]) &  self.get_Bits_Mask("DAT", I2C_IC_DATA_CMD)
+
+        return self.Read_Data_First() & self.mask_dat
+
+    @micropython.native
+    def Read_Data_First(self):
+        """ Return data from I2C Master, with FIRST_DATA_BYTE set if it began a write """
+
+        held = self.rx_held
+        if held >= 0:
+            self.rx_held = -1
+            return held
+        return mem32[self.ic_data_cmd] & ( self.mask_dat | self.mask_first )
+
+    @micropython.native
+    def write_from(self, buf, start, end):
+        """ Write as much of buf[start:end] as the TX FIFO has room for, without allocating; return the count """
+
+        # IC_TXFLR is read once: the FIFO only drains while this runs
+        count = self.FIFO_DEPTH - mem32[self.ic_txflr]
+        if count > end - start:
+            count = end - start
+        data_cmd = self.ic_data_cmd
+        i = start
+        end = start + count
+        while i < end:
+            mem32[data_cmd] = buf[i]
+            i += 1
+        return count
+
+    @micropython.native
+    def read_into(self, buf, start=0):
+        """ Read the bytes of one write waiting in the RX FIFO into buf from start, without
+            allocating, and return the count; rx_first is then True if the first of them began
+            the write. The first byte of a following write is kept for the next call, so that
+            the writes of back-to-back transactions are never returned together """
+
+        # IC_RXFLR is read once: bytes arriving meanwhile are left for the next call
+        count = mem32[self.ic_rxflr]
+        data_cmd = self.ic_data_cmd
+        mask = self.mask_dat
+        first = self.mask_first
+        end = len(buf)
+        began = False
+        i = start
+        held = self.rx_held
+        if held >= 0 and i < end:
+            self.rx_held = -1
+            began = ( held & first ) != 0
+            buf[i] = held & mask
+            i += 1
+        while count > 0 and i < end:
+            data = mem32[data_cmd]
+            count -= 1
+            if data & first:
+                if i > start:
+                    self.rx_held = data & ( mask | first )
+                    break
+                began = True
+            buf[i] = data & mask
+            i += 1
+        self.rx_first = began
+        return i - start
 
 #   if __name__ == "__main__":
 #       #import utime
 #       import machine
-#       from machine import mem32
+#       from machine import mem32, Timer
 #       from RP2040_Slave import i2c_slave
 #       
 #       # Initialize an empty buffer list for sequential write sequences
@@ -0,0 +1,149 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import uasyncio as asyncio
+from i2c_slave import I2CSlave
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class AsyncI2CSlave(I2CSlave):
+    '''
+    An I2CSlave that runs as a uasyncio task, so that bus servicing can
+    share one scheduler with other coroutines, e.g. sensor sampling or an
+    LED animation, rather than enable() taking over the core.
+
+    Polled, the task makes one pass of poll() and then yields to the other
+    tasks, so the bus is serviced once per turn of the scheduler. In IRQ
+    mode the interrupt handler queues the bus traffic as usual and sets a
+    ThreadSafeFlag; the task sleeps on the flag and wakes to service() what
+    was queued, taking no time while the bus is quiet.
+
+    Received frames go into the work queue (see I2CSlave), from which a
+    second, consumer task passes them to the coroutine handle_frame(). That
+    may await other work without holding up the bus task, which does
+    nothing but service the bus. While the queue is full further frames are
+    answered with BUSY.
+
+    Start the tasks with start() from a running event loop, or run them
+    alone with enable(). disable() ends them.
+
+    :param: queue         the number of frames queued for handle_frame();
+                          default is 8
+    :param: kwargs        the I2CSlave constructor arguments
+    '''
+    def __init__(self, queue=8, **kwargs):
+        if kwargs.get('core1'):
+            raise ValueError('AsyncI2CSlave does not support core 1 mode.')
+        self._flag = asyncio.ThreadSafeFlag()
+        self._ready = asyncio.Event()
+        super().__init__(queue=queue, **kwargs)
+
+    def start(self):
+        '''
+        Creates and returns the task servicing the bus, which starts the
+        consumer task. Must be called with an event loop running.
+        '''
+        return asyncio.create_task(self.run())
+
+    def enable(self):
+        '''
+        Runs the tasks alone, returning when disable() is called.
+        '''
+        asyncio.run(self.run())
+
+    def disable(self):
+        super().disable()
+        # wake the bus task so that it sees it has been disabled
+        self._flag.set()
+
+    async def run(self):
+        '''
+        The bus task: services the bus until disabled, waking the consumer
+        task when frames have been queued, then waits for the consumer to
+        finish with the frames left in the queue.
+        '''
+        if self._enabled:
+            print("already enabled.")
+            return
+        self._enabled = True
+        if self._indicator:
+            self._indicator.start()
+        if self._irq:
+            print("starting async IRQ task…")
+            self.s_i2c.irq(self._flag_handler)
+        else:
+            print("starting async task…")
+        _consumer = asyncio.create_task(self._consume())
+        _queue = self._queue
+        _ready = self._ready
+        try:
+            while self._enabled:
+                if self._irq:
+                    await self._flag.wait()
+                    while self.service():
+                        pass
+                else:
+                    self.poll()
+                    await asyncio.sleep_ms(0)
+                if not _queue.is_empty():
+                    _ready.set()
+        except asyncio.CancelledError:
+            _consumer.cancel()
+            raise
+        finally:
+            self._enabled = False
+            if self._irq:
+                self.s_i2c.irq(None)
+            # wake the consumer so that it sees it has been disabled
+            _ready.set()
+        await _consumer
+
+    def _flag_handler(self, s_i2c):
+        '''
+        IRQ mode: queues the bus traffic, then wakes the task.
+        '''
+        self._irq_handler(s_i2c)
+        self._flag.set()
+
+    async def _consume(self):
+        '''
+        The consumer task: hands the frames queued by the bus task to
+        handle_frame(), returning once disabled with the queue emptied.
+        '''
+        _ready = self._ready
+        while True:
+            await _ready.wait()
+            _ready.clear()
+            await self._handle_frames()
+            if not self._enabled:
+                return
+
+    async def _handle_frames(self):
+        _queue = self._queue
+        _work = self._work
+        while True:
+            _length = _queue.get_into(_work.buffer)
+            if _length < 0:
+                return
+            _work.set_length(_length)
+            await self.handle_frame(_work)
+
+    async def handle_frame(self, buffer):
+        '''
+        Called with each received frame as a FrameBuffer, which is reused
+        for the next frame. The default passes it to process_buffer(); this
+        can be overridden to act on the frame, awaiting as needed. This runs
+        in the consumer task, so the bus is serviced while it awaits; frames
+        received meanwhile wait in the queue.
+        '''
+        self.process_buffer(buffer)
+
+#EOF
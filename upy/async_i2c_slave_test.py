@@ -0,0 +1,41 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# Test file for AsyncI2CSlave. This runs the slave in IRQ mode as a uasyncio
+# task alongside a second task standing in for sensor sampling, printing each
+# message received and, once a second, how many samples have been taken, to
+# show that neither holds up the other. No NeoPixel support.
+#
+
+import uasyncio as asyncio
+from async_i2c_slave import AsyncI2CSlave
+
+class AsyncTest(AsyncI2CSlave):
+
+    async def handle_frame(self, buffer):
+        print("received: '{}'".format(buffer.to_string()))
+
+async def sample(period_ms=10):
+    _count = 0
+    while True:
+        _count += 1
+        if _count % ( 1000 // period_ms ) == 0:
+            print('{:d} samples taken.'.format(_count))
+        await asyncio.sleep_ms(period_ms)
+
+async def main():
+    _i2c_slave = AsyncTest(irq=True)
+    asyncio.create_task(sample())
+    await _i2c_slave.start()
+
+asyncio.run(main())
+
+#EOF
@@ -0,0 +1,131 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import micropython
+import utime
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class BusTrace(object):
+    '''
+    A compact binary trace of the bus events seen by an I2CSlave, kept in a
+    preallocated ring of fixed-size records, the newest overwriting the
+    oldest. Nothing is formatted when an event is recorded: the trace is
+    read over I2C or saved to flash, then decoded into a timeline on the
+    host (see trace_decoder.py).
+
+    Each record is RECORD_SIZE bytes: the time in µs (utime.ticks_us(), four
+    bytes, least significant first, modulo 2**30), the event type, the
+    register address, a byte count (at most 255) and a response code.
+
+    The trace is one buffer, a header of HEADER_SIZE bytes then the ring, so
+    that it can be sent or written as it stands. The header holds VERSION,
+    RECORD_SIZE, the capacity in records, the index of the slot the next
+    record goes into and the number of records held (two bytes each), the
+    number of records ever written (four bytes, modulo 2**30) and the time
+    the header was updated (four bytes), all least significant first.
+
+    :param capacity:  the number of records kept, up to 65535; default is 256
+    '''
+    VERSION     = 1
+    RECORD_SIZE = 8
+    HEADER_SIZE = 16
+    TICKS_MASK  = 0x3FFFFFFF
+
+    # event types
+    START        = 1  # a transaction has begun
+    STOP         = 2  # it has ended
+    TX_ABORT     = 3  # a read was aborted
+    FRAME        = 4  # a frame was received: register, length
+    RESPONSE     = 5  # a read was answered with one byte: register, the byte as code
+    TRANSMIT     = 6  # a multi-byte read has ended: register, bytes taken
+    ERROR        = 7  # a frame failed: register, the error code
+    GENERAL_CALL = 8  # a general call was received: its length
+    DUPLICATE    = 9  # a resent frame was answered from the cache: register, sequence number as count, response
+
+    def __init__(self, capacity=256):
+        if capacity < 1 or capacity > 0xFFFF:
+            raise ValueError('trace capacity must be between 1 and 65535 records.')
+        self._capacity = capacity
+        self._data = bytearray(self.HEADER_SIZE + capacity * self.RECORD_SIZE)
+        self._head = 0
+        self._held = 0
+        self._written = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def held(self):
+        '''
+        The number of records held, at most the capacity.
+        '''
+        return self._held
+
+    @micropython.native
+    def record(self, kind, register=0, count=0, code=0):
+        '''
+        Appends a record, overwriting the oldest once the ring is full.
+        This does not allocate.
+        '''
+        _time = utime.ticks_us() & self.TICKS_MASK
+        _data = self._data
+        _offset = self.HEADER_SIZE + self._head * self.RECORD_SIZE
+        _data[_offset] = _time & 0xFF
+        _data[_offset + 1] = ( _time >> 8 ) & 0xFF
+        _data[_offset + 2] = ( _time >> 16 ) & 0xFF
+        _data[_offset + 3] = _time >> 24
+        _data[_offset + 4] = kind
+        _data[_offset + 5] = register
+        _data[_offset + 6] = count if count < 0xFF else 0xFF
+        _data[_offset + 7] = code
+        _head = self._head + 1
+        self._head = 0 if _head == self._capacity else _head
+        if self._held < self._capacity:
+            self._held += 1
+        # kept below 2**30, so as to remain a small int
+        self._written = ( self._written + 1 ) & 0x3FFFFFFF
+
+    def clear(self):
+        self._head = 0
+        self._held = 0
+        self._written = 0
+
+    def seal(self):
+        '''
+        Updates the header, returning the buffer: the header and the whole
+        ring, in the layout expected by trace_decoder.py.
+        '''
+        _data = self._data
+        _data[0] = self.VERSION
+        _data[1] = self.RECORD_SIZE
+        self._put(2, self._capacity, 2)
+        self._put(4, self._head, 2)
+        self._put(6, self._held, 2)
+        self._put(8, self._written, 4)
+        self._put(12, utime.ticks_us() & self.TICKS_MASK, 4)
+        return _data
+
+    def _put(self, offset, value, length):
+        _data = self._data
+        for i in range(length):
+            _data[offset + i] = ( value >> ( 8 * i )) & 0xFF
+
+    def save(self, path='trace.bin'):
+        '''
+        Writes the trace to a file, e.g. on the board's flash, to be copied
+        to the host (say with 'mpremote cp :trace.bin .') and decoded there.
+        '''
+        with open(path, 'wb') as _file:
+            _file.write(self.seal())
+
+#EOF
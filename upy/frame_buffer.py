@@ -0,0 +1,114 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import micropython
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class FrameBuffer(object):
+    '''
+    A fixed-size, reusable buffer for the payload of a received frame, in
+    place of a StringBuilder: the bytes are copied into a preallocated
+    bytearray and the length is kept as a counter, so filling it allocates
+    nothing and length() costs nothing. Text is only decoded when asked for
+    with to_string().
+
+    The buffer is overwritten by the next frame, so a handler should copy
+    or decode anything it keeps.
+
+    :param size:    the maximum payload length in bytes
+    '''
+    def __init__(self, size):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._size = size
+        self._length = 0
+
+    @property
+    def buffer(self):
+        '''
+        The underlying bytearray; only the first length() bytes are valid.
+        '''
+        return self._buffer
+
+    @property
+    def size(self):
+        return self._size
+
+    def clear(self):
+        self._length = 0
+
+    def append(self, byte):
+        '''
+        Appends a single byte, raising IndexError if the buffer is full.
+        '''
+        if self._length == self._size:
+            raise IndexError('frame buffer full: {:d} bytes.'.format(self._size))
+        self._buffer[self._length] = byte
+        self._length += 1
+
+    @micropython.native
+    def copy_from(self, buf, start, end):
+        '''
+        Replaces the contents with buf[start:end], truncated to the size of
+        the buffer. Returns the new length.
+        '''
+        _buffer = self._buffer
+        if end - start > self._size:
+            end = start + self._size
+        i = 0
+        while start < end:
+            _buffer[i] = buf[start]
+            start += 1
+            i += 1
+        self._length = i
+        return i
+
+    def set_length(self, length):
+        '''
+        Sets the number of valid bytes, after writing to the buffer directly.
+        '''
+        if length < 0 or length > self._size:
+            raise IndexError('frame buffer length out of range.')
+        self._length = length
+
+    def length(self):
+        return self._length
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if index < 0 or index >= self._length:
+            raise IndexError('frame buffer index out of range.')
+        return self._buffer[index]
+
+    def view(self):
+        '''
+        Returns a memoryview of the valid bytes, without copying them.
+        '''
+        return self._view[:self._length]
+
+    def to_bytes(self):
+        return bytes(self._view[:self._length])
+
+    def to_string(self):
+        '''
+        Decodes the valid bytes as text.
+        '''
+        return str(self._view[:self._length], 'utf-8')
+
+    def __str__(self):
+        return self.to_string()
+
+#EOF
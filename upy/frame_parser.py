@@ -0,0 +1,341 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import micropython
+from frame_buffer import FrameBuffer
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class FrameParser(object):
+    '''
+    A resumable parser for the string protocol written by the master: the
+    register address, a length byte, that many characters between SPACE (32)
+    and '~' (126), then 0x01 to validate and 0xFF to end the record. 0x00
+    is padding wherever a control byte is allowed, and a 0x01 before the
+    length byte also validates. (So a payload of one character, whose length
+    byte would be 0x01, cannot be sent.)
+
+    The bytes may be fed in chunks of any size, as they come off the RX
+    FIFO. The parser's state is kept between chunks and across the end of a
+    write, as master.py sends the validation and end-of-record bytes in a
+    second write transaction. A frame is complete when the 0xFF arrives, or
+    when the write ends with the frame already validated.
+
+    Errors raise a FrameError carrying the I2CSlave response code; the
+    parser then discards the rest of the transaction until end() is called.
+    The error's message is only formatted if it is printed.
+
+    With sequenced set, the first byte of each payload is a sequence number,
+    counted in the length, which may take any value.
+
+    :param max_length:  the maximum payload length; default is 32
+    :param sequenced:   if True, the first payload byte is a sequence number
+    '''
+    # parser states
+    ADDRESS = 0  # the next byte is the register address
+    LENGTH  = 1  # leading control bytes, then the length byte
+    DATA    = 2  # the characters
+    TRAILER = 3  # validation and padding bytes up to the end of record
+    DISCARD = 4  # an error occurred: ignore bytes until the end of the write
+
+    # the I2CSlave response codes for framing errors
+    OUT_OF_SYNC       = 0x72
+    INVALID_CHAR      = 0x73
+    SOURCE_TOO_LARGE  = 0x74
+    UNVALIDATED       = 0x75
+    PAYLOAD_TOO_LARGE = 0x77
+
+    def __init__(self, max_length=32, sequenced=False):
+        self._frame = FrameBuffer(max_length)
+        self._max_length = max_length
+        self._sequenced = sequenced
+        self.reset()
+
+    @property
+    def frame(self):
+        '''
+        The FrameBuffer holding the payload, valid once complete is True
+        until the characters of the next frame arrive, or reset().
+        '''
+        return self._frame
+
+    @property
+    def address(self):
+        '''
+        The register address of the current record, or 0 if none yet.
+        '''
+        return self._address
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def complete(self):
+        return self._complete
+
+    def reset(self):
+        self._state = self.ADDRESS
+        self._address = 0
+        self._valid = False
+        self._expected = 0
+        self._complete = False
+        self._frame.clear()
+
+    def discard(self):
+        '''
+        Ignores the bytes of the rest of the transaction, until end().
+        '''
+        self._state = self.DISCARD
+
+    def _next_record(self):
+        # the payload is left in the frame until the next one's characters begin
+        self._state = self.ADDRESS
+        self._valid = False
+        self._expected = 0
+        self._complete = False
+
+    def _text(self):
+        '''
+        Returns the characters received, without any sequence number, for
+        an error message.
+        '''
+        _frame = self._frame
+        if self._sequenced and _frame.length() > 0:
+            return str(_frame.buffer[1:_frame.length()], 'utf-8')
+        return _frame.to_string()
+
+    def __str__(self):
+        # formatted into a FrameError message only when that is printed
+        return self._text()
+
+    def _fail(self, code, message, *values):
+        self._state = self.DISCARD
+        raise FrameError(code, message, *values)
+
+    @micropython.native
+    def feed(self, buf, start, end):
+        '''
+        Parses the bytes buf[start:end]. Returns the index after the last
+        byte consumed: end, or the index after an end-of-record byte that
+        completed a frame, in which case complete is True and the remaining
+        bytes should be fed once the frame has been handled.
+        '''
+        if self._complete:
+            self._next_record()
+        _state = self._state
+        if _state == self.DISCARD:
+            return end
+        _frame = self._frame
+        _data = _frame.buffer
+        _length = _frame.length()
+        _expected = self._expected
+        _valid = self._valid
+        while start < end:
+            _byte = buf[start]
+            start += 1
+            if _state == 2: # DATA
+                if 32 <= _byte <= 126:
+                    _data[_length] = _byte
+                    _length += 1
+                    if _length == _expected:
+                        _state = 3
+                    continue
+                elif _length == 0 and self._sequenced:
+                    # the sequence number, which need not be a character
+                    _data[0] = _byte
+                    _length = 1
+                    if _length == _expected:
+                        _state = 3
+                    continue
+                elif _byte > 0x01 and _byte != 0xFF:
+                    _frame.set_length(_length)
+                    self._fail(self.INVALID_CHAR, "invalid character received: '0x{:02X}' (int: '{:d}'); buf length: {:d}; sb: '{}'",
+                            _byte, _byte, _length, self)
+                # a control byte ends the characters early
+                _state = 3
+            if _state == 3: # TRAILER
+                if _byte == 0x01:
+                    _valid = True
+                elif _byte == 0xFF:
+                    self._state = _state
+                    self._valid = _valid
+                    self._expected = _expected
+                    _frame.set_length(_length)
+                    if self._end_of_record():
+                        return start
+                    _state = self._state
+                    _valid = False
+                elif _byte != 0x00:
+                    _frame.set_length(_length)
+                    self._fail(self.OUT_OF_SYNC, "out of sync: '0x{:02X}' (int: '{:d}'); buf length: {:d}; sb: '{}'",
+                            _byte, _byte, _expected, self)
+            elif _state == 1: # LENGTH
+                if _byte == 0x01:
+                    _valid = True
+                elif _byte == 0xFF:
+                    # end of a record without a payload
+                    _state = 0
+                    _valid = False
+                elif _byte != 0x00:
+                    if _byte > self._max_length:
+                        self._fail(self.SOURCE_TOO_LARGE, "WARNING: packet failed with {:d} chars, exceeded maximum length of {:d}.",
+                                _byte, self._max_length)
+                    _expected = _byte
+                    _length = 0
+                    _state = 2
+            elif _state == 0: # ADDRESS
+                self._address = _byte
+                _state = 1
+        self._state = _state
+        self._valid = _valid
+        self._expected = _expected
+        _frame.set_length(_length)
+        return end
+
+    def end(self):
+        '''
+        Called at the end of a write (STOP, or a read request after a repeated
+        start). Returns True if a validated frame is then complete; a frame
+        not yet validated is kept for the next write.
+        '''
+        if self._complete:
+            self._next_record()
+        elif self._state == self.DISCARD:
+            self._next_record()
+        elif self._state == self.LENGTH and not self._valid:
+            # only the register address was written, e.g. before a read
+            self._next_record()
+        elif self._state == self.DATA or self._state == self.TRAILER:
+            if self._valid:
+                try:
+                    return self._end_of_record()
+                except FrameError:
+                    # the write has already ended, so there is nothing to discard
+                    self._next_record()
+                    raise
+        return False
+
+    def _end_of_record(self):
+        '''
+        Checks the frame at its end, marking it complete if it is valid.
+        '''
+        _length = self._frame.length()
+        if _length == 0:
+            self._next_record()
+            return False
+        if not self._valid:
+            self._fail(self.UNVALIDATED, "unvalidated buffer: '{}'", self)
+        if _length != self._expected:
+            self._fail(self.PAYLOAD_TOO_LARGE, "package failed with expected length: {:d}; actual length: {:d}.",
+                    self._expected, _length)
+        self._complete = True
+        return True
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class BinaryFrameParser(FrameParser):
+    '''
+    A resumable parser for binary frames: the register address, a length
+    byte, then that many bytes of any value. There are no control bytes, so
+    nothing need be escaped, and each write transaction carries exactly one
+    frame, which end() completes: the I2CSlave calls it at the write's STOP,
+    or at the first byte of the next write if both arrive before the slave
+    has looked at either. This is the layout of an SMBus block write
+    (write_block_data()), so the master needs no second transaction.
+
+    A frame longer than its length byte fails with OUT_OF_SYNC as soon as
+    the extra byte arrives; one cut short fails at end() with
+    PAYLOAD_TOO_LARGE (the expected and actual lengths differ). A write of
+    the register address alone, as before a read, is not a frame.
+
+    :param max_length:  the maximum payload length; default is 32
+    '''
+    def __init__(self, max_length=32):
+        super().__init__(max_length)
+
+    @micropython.native
+    def feed(self, buf, start, end):
+        '''
+        Parses the bytes buf[start:end], returning end. Frames are completed
+        by end().
+        '''
+        if self._complete:
+            self._next_record()
+        _state = self._state
+        if _state == self.DISCARD:
+            return end
+        _frame = self._frame
+        if _state == 0 and start < end: # ADDRESS
+            self._address = buf[start]
+            start += 1
+            _state = 1
+        if _state == 1 and start < end: # LENGTH
+            _expected = buf[start]
+            start += 1
+            if _expected > self._max_length:
+                self._fail(self.SOURCE_TOO_LARGE, "WARNING: packet failed with {:d} bytes, exceeded maximum length of {:d}.",
+                        _expected, self._max_length)
+            self._expected = _expected
+            _frame.set_length(0)
+            _state = 2
+        if _state == 2 and start < end: # DATA
+            _data = _frame.buffer
+            _length = _frame.length()
+            _expected = self._expected
+            while start < end:
+                if _length == _expected:
+                    _frame.set_length(_length)
+                    self._fail(self.OUT_OF_SYNC, "out of sync: more than {:d} bytes received.", _expected)
+                _data[_length] = buf[start]
+                _length += 1
+                start += 1
+            _frame.set_length(_length)
+        self._state = _state
+        return end
+
+    def end(self):
+        '''
+        Called at the end of a write. Returns True if it carried a complete
+        frame.
+        '''
+        _state = self._state
+        if self._complete or _state != self.DATA:
+            self._next_record()
+            return False
+        _expected = self._expected
+        self._next_record()
+        _length = self._frame.length()
+        if _length != _expected:
+            # the write has already ended, so there is nothing to discard
+            raise FrameError(self.PAYLOAD_TOO_LARGE, "package failed with expected length: {:d}; actual length: {:d}.",
+                    _expected, _length)
+        self._complete = True
+        return True
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class FrameError(Exception):
+    '''
+    Carries the response code, and the message with the raw values that
+    fill it in, formatted only when the error is printed.
+    '''
+    def __init__(self, code, message, *values):
+        super().__init__(message)
+        self._code = code
+        self._values = values
+
+    def __str__(self):
+        return self.args[0].format(*self._values)
+
+    @property
+    def code(self):
+        return self._code
+
+#EOF
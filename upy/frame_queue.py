@@ -0,0 +1,93 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import _thread
+from array import array
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class FrameQueue(object):
+    '''
+    A fixed-capacity FIFO of byte frames, used to pass frames between the
+    RP2040's two cores. All storage is allocated up front: each slot is a
+    bytearray of the maximum frame size, and frames are copied in and out.
+
+    There is a single producer and a single consumer. Each copies into or
+    out of a slot the other side cannot touch, and takes the lock only to
+    move its index, so neither core waits on the other for long.
+
+    :param slots:   the number of frames the queue holds
+    :param size:    the maximum length of a frame in bytes
+    '''
+    def __init__(self, slots=8, size=64):
+        self._slots = [ bytearray(size) for i in range(slots) ]
+        self._lengths = array('H', [0] * slots)
+        self._capacity = slots
+        self._size = size
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        self._lock = _thread.allocate_lock()
+        self.dropped = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def put(self, data, count=None):
+        '''
+        Copies the first count bytes of data (by default all of it) into the
+        queue. Returns False, counting a drop, if the queue is full or the
+        frame is too long.
+        '''
+        if count is None:
+            count = len(data)
+        if count > self._size or self._count == self._capacity:
+            self.dropped += 1
+            return False
+        _head = self._head
+        _slot = self._slots[_head]
+        for i in range(count):
+            _slot[i] = data[i]
+        self._lengths[_head] = count
+        with self._lock:
+            self._head = ( _head + 1 ) % self._capacity
+            self._count += 1
+        return True
+
+    def get_into(self, buf):
+        '''
+        Copies the oldest frame into buf and removes it, returning its
+        length, or -1 if the queue is empty. buf must be at least the size
+        of the queue's frames.
+        '''
+        if self._count == 0:
+            return -1
+        _tail = self._tail
+        _count = self._lengths[_tail]
+        _slot = self._slots[_tail]
+        for i in range(_count):
+            buf[i] = _slot[i]
+        with self._lock:
+            self._tail = ( _tail + 1 ) % self._capacity
+            self._count -= 1
+        return _count
+
+    def is_empty(self):
+        return self._count == 0
+
+    def is_full(self):
+        return self._count == self._capacity
+
+    def __len__(self):
+        return self._count
+
+#EOF
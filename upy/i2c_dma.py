@@ -0,0 +1,99 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# DMA channels that move bytes between an I2C controller's IC_DATA_CMD
+# register and a buffer, paced by the controller's DMA handshake (DREQ).
+#
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class DmaChannel(object):
+    '''
+    The interface I2CSlave uses for DMA transfers. A channel is created
+    for one direction of one controller as:
+
+        channel = DmaChannelClass(s_i2c, transmit)
+
+    where s_i2c is the i2c_slave and transmit is False for a channel that
+    streams received bytes into a buffer, True for one that feeds a buffer
+    to the TX FIFO. This allows a simulated channel to stand in for the
+    RP2040's DMA controller.
+    '''
+    def start(self, buf, count):
+        '''
+        Starts transferring count bytes to (or from) buf.
+        '''
+        raise NotImplementedError
+
+    def remaining(self):
+        '''
+        Returns the number of bytes of the current transfer not yet moved.
+        '''
+        raise NotImplementedError
+
+    def active(self):
+        '''
+        Returns True while a transfer is in progress.
+        '''
+        raise NotImplementedError
+
+    def abort(self):
+        '''
+        Stops the current transfer.
+        '''
+        raise NotImplementedError
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class RP2DmaChannel(DmaChannel):
+    '''
+    A DmaChannel on the RP2040's DMA controller, using the rp2.DMA class
+    available from MicroPython v1.23.0.
+
+    Transfers are a byte wide. A byte read of IC_DATA_CMD returns the DAT
+    field; a byte write is replicated across the word, but the CMD, STOP
+    and RESTART bits it lands on are ignored in slave mode.
+    '''
+    # DREQ numbers of the I2C controllers (RP2040 datasheet 2.5.3.1)
+    DREQ_I2C0_TX = 32
+    DREQ_I2C0_RX = 33
+    DREQ_I2C1_TX = 34
+    DREQ_I2C1_RX = 35
+
+    def __init__(self, s_i2c, transmit=False):
+        import rp2 # imported here so that DmaChannel is usable off the device
+        self._dma = rp2.DMA()
+        self._transmit = transmit
+        self._data_cmd = s_i2c.ic_data_cmd
+        if transmit:
+            _dreq = self.DREQ_I2C1_TX if s_i2c.i2c_ID else self.DREQ_I2C0_TX
+            self._ctrl = self._dma.pack_ctrl(size=0, inc_read=True, inc_write=False, treq_sel=_dreq)
+        else:
+            _dreq = self.DREQ_I2C1_RX if s_i2c.i2c_ID else self.DREQ_I2C0_RX
+            self._ctrl = self._dma.pack_ctrl(size=0, inc_read=False, inc_write=True, treq_sel=_dreq)
+
+    def start(self, buf, count):
+        if self._transmit:
+            self._dma.config(read=buf, write=self._data_cmd, count=count, ctrl=self._ctrl, trigger=True)
+        else:
+            self._dma.config(read=self._data_cmd, write=buf, count=count, ctrl=self._ctrl, trigger=True)
+
+    def remaining(self):
+        return self._dma.count
+
+    def active(self):
+        return self._dma.active()
+
+    def abort(self):
+        self._dma.active(0)
+
+    def close(self):
+        self._dma.close()
+
+#EOF
@@ -7,7 +7,7 @@
 #
 # author:   Murray Altheim
 # created:  2024-08-18
-# modified: 2024-08-18
+# modified: 2024-08-21
 #
 # Extends I2CSlave as a driver file for the Adafruit ItsyBitsy RP2040, using
 # its callback to print the message and set the NeoPixel color.
@@ -25,14 +25,14 @@ class I2CDriver(I2CSlave):
     for providing visual feedback via a NeoPixel, as found on the Adafruit
     ItsyBitsy RP2040.
     '''
-    def __init__(self, i2c_address=0x44, blink=True):
+    def __init__(self, i2c_address=0x44, blink=True, core1=False):
         # NeoPixel control pin 17
         self._neopixel = Neopixel(num_leds=10, state_machine=0, pin=17, mode="RGB")
         self._neopixel.brightness(108)
         # turn on NeoPixel power pin 16
         _pin16 = Pin(16, Pin.OUT)
         _pin16.value(1)
-        I2CSlave.__init__(self, i2c_address=i2c_address, blink=blink, callback=self.callback)
+        I2CSlave.__init__(self, i2c_address=i2c_address, blink=blink, callback=self.callback, core1=core1)
         print('I2C driver ready.')
 
     def callback(self, message, color):
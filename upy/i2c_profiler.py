@@ -0,0 +1,137 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import utime
+from array import array
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class I2CProfiler(object):
+    '''
+    Latency histograms for the I2CSlave loop, one per section: the four
+    states of the loop (numbered as in I2CStateMachine), then the callbacks
+    run from it. A state's time includes that of any callback run within
+    it, so comparing the two shows where the time goes.
+
+    Each histogram has BUCKETS fixed buckets of powers of two: bucket 0
+    counts durations under 1µs, bucket b those from 2**(b-1) up to 2**b µs,
+    and the last bucket anything longer. The counts are kept in one
+    preallocated array, so recording does not allocate.
+
+    wrap() returns a callback that times the one it is given, so that the
+    slave need only wrap its callbacks when profiling and pays nothing for
+    them otherwise.
+    '''
+    RECEIVE        = 0
+    REQUEST        = 1
+    FINISH         = 2
+    START          = 3
+    PROCESS_BUFFER = 4
+    ON_WRITE       = 5
+    ON_READ        = 6
+    STATUS         = 7  # the status callback, e.g. the NeoPixel
+    SECTIONS = ( 'receive', 'request', 'finish', 'start', 'process_buffer', 'on_write', 'on_read', 'status' )
+    BUCKETS  = 16
+
+    def __init__(self):
+        self._counts = array('I', [0] * ( len(self.SECTIONS) * self.BUCKETS ))
+        self._max = array('I', [0] * len(self.SECTIONS))
+
+    def record(self, section, start):
+        '''
+        Counts the time since start, a utime.ticks_us() value, in the
+        section's histogram. Returns the current ticks, so that the next of
+        several consecutive sections can be timed from the same reading.
+        '''
+        _now = utime.ticks_us()
+        _us = utime.ticks_diff(_now, start)
+        if _us > self._max[section]:
+            self._max[section] = _us
+        _bucket = 0
+        _last = self.BUCKETS - 1
+        while _us > 0 and _bucket < _last:
+            _us >>= 1
+            _bucket += 1
+        self._counts[section * self.BUCKETS + _bucket] += 1
+        return _now
+
+    def wrap(self, section, callback, args=1):
+        '''
+        Returns a callback taking the same number of arguments (0, 1 or 2)
+        that calls the given one and records its time in the section.
+        '''
+        _record = self.record
+        if args == 0:
+            def _timed():
+                _start = utime.ticks_us()
+                try:
+                    return callback()
+                finally:
+                    _record(section, _start)
+        elif args == 1:
+            def _timed(arg):
+                _start = utime.ticks_us()
+                try:
+                    return callback(arg)
+                finally:
+                    _record(section, _start)
+        else:
+            def _timed(arg0, arg1):
+                _start = utime.ticks_us()
+                try:
+                    return callback(arg0, arg1)
+                finally:
+                    _record(section, _start)
+        return _timed
+
+    def histogram(self, section):
+        '''
+        Returns the bucket counts of a section as a list.
+        '''
+        _first = section * self.BUCKETS
+        return list(self._counts[_first:_first + self.BUCKETS])
+
+    def count(self, section):
+        return sum(self.histogram(section))
+
+    def max_us(self, section):
+        return self._max[section]
+
+    def reset(self):
+        _counts = self._counts
+        for i in range(len(_counts)):
+            _counts[i] = 0
+        for i in range(len(self._max)):
+            self._max[i] = 0
+
+    def dump(self):
+        '''
+        Prints the count, longest time and non-empty buckets of each
+        section recorded, each bucket as its upper bound in µs (the last
+        as its lower bound).
+        '''
+        print('section          count     max µs  buckets (< µs: count)')
+        for _section, _name in enumerate(self.SECTIONS):
+            _histogram = self.histogram(_section)
+            _count = sum(_histogram)
+            if _count == 0:
+                continue
+            _buckets = []
+            for _bucket, _n in enumerate(_histogram):
+                if _n:
+                    if _bucket == self.BUCKETS - 1:
+                        _bound = '{:d}+'.format(1 << ( _bucket - 1 ))
+                    else:
+                        _bound = '{:d}'.format(1 << _bucket)
+                    _buckets.append('{}: {:d}'.format(_bound, _n))
+            print('{:<14} {:>7d} {:>10d}  {}'.format(_name, _count, self._max[_section], ', '.join(_buckets)))
+
+#EOF
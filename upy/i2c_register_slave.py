@@ -0,0 +1,129 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import micropython
+from i2c_slave import I2CSlave
+
+from colors import*
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class I2CRegisterSlave(I2CSlave):
+    '''
+    An I2CSlave that behaves like an EEPROM or a typical sensor chip: a bank
+    of byte registers backed by a bytearray, with an address pointer.
+
+    The first byte of each write transaction sets the pointer; any further
+    bytes are stored from there, the pointer incrementing (and wrapping)
+    after each. A read streams the registers from the current pointer,
+    which then advances past the bytes the master took. Reads stop at the
+    end of the bank: any further bytes read are 0xFF.
+
+    This matches the smbus write_i2c_block_data() and read_i2c_block_data()
+    calls, so that a master can update or fetch many values in a single
+    transaction. The legacy string protocol is not used.
+
+    Register reads are streamed with respond_with(), which is supported in
+    polled mode only.
+
+    :param: size          the number of registers, up to 256; default is 256
+    :param: kwargs        the I2CSlave constructor arguments
+    '''
+    def __init__(self, size=256, **kwargs):
+        if size < 1 or size > 256:
+            raise ValueError('register bank size must be between 1 and 256.')
+        if kwargs.get('irq'):
+            raise ValueError('I2CRegisterSlave does not support IRQ mode.')
+        self._registers = bytearray(size)
+        self._size = size
+        self._pointer = 0
+        super().__init__(**kwargs)
+
+    @property
+    def registers(self):
+        '''
+        The bytearray backing the register bank, for the application to read
+        and update.
+        '''
+        return self._registers
+
+    @property
+    def pointer(self):
+        '''
+        The current register address.
+        '''
+        return self._pointer
+
+    def _receive(self):
+        '''
+        Stores the received bytes at the register pointer, the first byte
+        of each write (flagged FIRST_DATA_BYTE by the controller) setting
+        the pointer, so that writes arriving together each land in place.
+        '''
+        self.status('rx', COLOR_YELLOW)
+        _buf = self._rx_chunk
+        _s_i2c = self.s_i2c
+        _count = self._rx_read_into(_buf, 0)
+        while _count:
+            self._stats[self.STAT_BYTES_IN] += _count
+            _index = 0
+            if _s_i2c.rx_first:
+                self._pointer = _buf[0] % self._size
+                self._currentTransaction.address = self._pointer
+                _index = 1
+            if _index < _count:
+                _start = self._pointer
+                self._pointer = self._store(_buf, _index, _count, _start)
+                self.frames_received += 1
+                self.registers_written(_start, _count - _index)
+            _count = self._rx_read_into(_buf, 0)
+        self.status('rxd', COLOR_YELLOW_GREEN)
+
+    @micropython.native
+    def _store(self, buf, start, end, pointer):
+        '''
+        Copies buf[start:end] into the registers from pointer, wrapping at
+        the end of the bank. Returns the new pointer.
+        '''
+        _registers = self._registers
+        _size = self._size
+        while start < end:
+            _registers[pointer] = buf[start]
+            pointer += 1
+            if pointer == _size:
+                pointer = 0
+            start += 1
+        return pointer
+
+    def _request(self):
+        '''
+        Answers a read request by streaming the registers from the pointer.
+        '''
+        if self._tx_active:
+            # the master has read past the end of the bank
+            self.write_response(0xFF)
+        else:
+            self.respond_with(memoryview(self._registers)[self._pointer:])
+            self._transmit()
+
+    def transmit_complete(self, count):
+        self._pointer = ( self._pointer + count ) % self._size
+        self.status("read: {:d} registers".format(count), COLOR_GREEN)
+
+    def registers_written(self, address, count):
+        '''
+        Called after the master has written count registers from address
+        (wrapping at the end of the bank). This can be overridden to act
+        on the new values.
+        '''
+        self.status("wrote: {:d} registers at 0x{:02X}".format(count, address), COLOR_GREEN)
+
+#EOF
@@ -0,0 +1,24 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# Test file for I2CRegisterSlave. This starts a 32 register bank, without any
+# support for a NeoPixel. From the master, for example:
+#
+#   i2cset -y 1 0x44 0x04 0x01 0x02 0x03 i
+#   i2cdump -y -r 0x00-0x1f 1 0x44 i
+#
+
+from i2c_register_slave import I2CRegisterSlave
+
+_i2c_slave = I2CRegisterSlave(size=32)
+_i2c_slave.enable()
+
+#EOF
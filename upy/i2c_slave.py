@@ -7,16 +7,26 @@
 #
 # author:   Murray Altheim
 # created:  2024-08-14
-# modified: 2024-08-18
+# modified: 2024-08-21
 #
 
+import _thread
 import machine
+from array import array
+import micropython
 import utime
 from RP2040_Slave import i2c_slave
+from ring_buffer import RingBuffer
+from frame_queue import FrameQueue
+from frame_buffer import FrameBuffer
+from frame_parser import FrameParser, BinaryFrameParser, FrameError
+from i2c_timing import I2CTiming
+from status_indicator import StatusIndicator
+from i2c_profiler import I2CProfiler
+from bus_trace import BusTrace
 
 import itertools
 from colors import*
-from stringbuilder import StringBuilder
 
 # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
 class I2CSlave(object):
@@ -29,17 +39,116 @@ class I2CSlave(object):
     ASCII characters between SPACE (20) and '~' (126).
 
     I2C requests return a response code in the form of a single byte.
+    A read joined to a write by a repeated start first commits the write,
+    so a master may send a validated packet and read its response in one
+    combined transaction (see I2CMaster.request()).
 
     This also provides an optional callback method that calls status()
-    with an RGB value and optional message.
+    with an RGB value and optional message. Status updates are posted to a
+    StatusIndicator, which calls the callback from a timer once enabled, so
+    that the bus loop never sleeps or waits on the LED.
+
+    By default enable() busy-polls the peripheral. In IRQ mode an interrupt
+    handler instead moves received bytes and bus events, in order, into a
+    preallocated ring buffer and answers read requests from a prepared
+    response byte; framing and application processing run in the main
+    context, which sleeps while there is nothing to do.
+
+    A read may be answered with more than the response byte: respond_with()
+    preloads the TX FIFO from a buffer as soon as the read is addressed and
+    refills it from the TX_EMPTY interrupt, so the master need not wait
+    between bytes.
+
+    Frames written to a register, and reads of it, may instead be passed
+    to handlers set with register(), looked up by the register address, so
+    that one slave can expose many independent functions.
+
+    A handler may also set a longer answer with set_response(), returned to
+    a read of RESPONSE_REGISTER in the SMBus block-read layout: a count byte,
+    then that many bytes of data, all in one read transaction. This is
+    copied into a preallocated buffer of MAX_RESPONSE bytes and kept until
+    it is replaced; reads of any other register return the response byte.
+
+    Given a DMA channel class, bulk transfers may bypass the byte-at-a-time
+    path: receive_into() streams the data of each write transaction into a
+    caller-supplied buffer, transmit_from() feeds a prepared buffer to the
+    master's next read. Completion of each is reported to process_dma() and
+    transmit_complete() respectively. Multi-byte responses and DMA are
+    supported in polled mode only.
+
+    With general_call set, writes to the general call address 0x00 are
+    acknowledged and passed to process_general_call() rather than parsed as
+    frames, so that a master can update every slave with one transaction.
+
+    With core1 set, enable() starts the polling loop on the RP2040's second
+    core and returns. Each payload received is then also queued for the
+    application on core 0, which collects it with receive_frame() and may
+    queue a multi-byte answer to a later read with send_response(). Both
+    queues are preallocated, holding FRAME_SLOTS frames of FRAME_SIZE bytes.
+
+    Given a queue size, frames are not processed as they arrive, holding
+    the bus while process_buffer() runs, but copied into a preallocated
+    queue of that many frames. The application takes them in its own time
+    with process_frames(), which passes each to process_buffer(), or with
+    receive_frame(). While the queue is full further frames are dropped and
+    answered with BUSY; the queue's depth, high-water mark and drops are
+    available to size it.
+
+    Performance counters are kept in a preallocated array (see stats):
+    bus transactions, bytes in and out, TX aborts, each error code, the
+    longest and mean time spent handling the events of one pass of the
+    loop, and the longest time from a read request to its response. In
+    polled mode a master reads them from STATS_REGISTER in one transaction
+    (see I2CMaster.read_stats()).
+
+    With profile set, the time spent in each state of the loop and in each
+    callback run from it (process_buffer(), the register() handlers and the
+    status callback) is recorded in latency histograms (see I2CProfiler and
+    profiler). Without it the only cost is a few tests per event snapshot.
+
+    Given a trace size, bus events (transactions, frames, responses and
+    errors) are recorded in a BusTrace of that many records, a compact
+    binary ring buffer. Errors are then recorded rather than formatted and
+    printed. In polled mode a master reads the trace from TRACE_REGISTER in
+    one transaction; it may also be saved to flash. Either is decoded on the
+    host by trace_decoder.py.
+
+    With sequenced set, the first byte of each frame's payload is a sequence
+    number, removed before the frame is handled. The response to each is
+    kept in a small cache indexed by its low bits, so that a frame the
+    master resends, not knowing whether it arrived, is answered with the
+    cached response rather than handled twice. The master advances the
+    number by one for each new frame, skipping 0 when it wraps: 0 starts a
+    new sequence, clearing the cache, unless it follows a frame numbered 0,
+    when it is the resend of that frame and is answered from the cache.
 
     :param: i2c_id        the I2C bus identifier; default is 0
     :param: sda           the SDA pin; default is 24
     :param: scl           the SCL pin; default is 25
     :param: i2c_address   the I2C address of the device; default is 0x44
     :param: blink         if True, will periodically call status()
-                          to indicate the loop is operating.
+                          to indicate the loop is operating; if False each
+                          status is shown for FLASH_MS then turned off
     :param: callback      the optional callback method
+    :param: irq           if True, service the bus from an interrupt handler
+                          rather than by polling
+    :param: dma           the DmaChannel class used by receive_into() and
+                          transmit_from(), e.g. i2c_dma.RP2DmaChannel
+    :param: core1         if True, enable() runs the polling loop on core 1
+    :param: general_call  if True, acknowledge writes to the general call
+                          address and pass them to process_general_call()
+    :param: bus_speed     the bus speed in Hz, up to 1MHz (Fast-mode Plus): if
+                          set, the SDA hold, SDA setup and spike suppression
+                          times are configured to suit it (see I2CTiming)
+    :param: binary        if True, receive binary frames (register, length,
+                          then up to MAX_CHARS bytes of any value, in one
+                          write) rather than the text protocol
+    :param: queue         if set, the number of received frames queued for
+                          process_frames() rather than processed at once
+    :param: profile       if True, record latency histograms of the loop
+    :param: trace         if set, the number of bus events kept in the trace
+    :param: sequenced     if True, each payload begins with a sequence number
+                          and resent frames are answered from a cache
     '''
     # default constants:
     I2C_ID      = 0
@@ -47,6 +156,36 @@ class I2CSlave(object):
     SCL_PIN     = 25
     I2C_ADDRESS = 0x44
     MAX_CHARS   = 32
+    RING_SIZE   = 256   # IRQ mode ring buffer entries, a power of two
+    TX_THRESHOLD = 8    # respond_with() refills the TX FIFO at or below this level
+    FRAME_SLOTS = 8     # core 1 mode: frames held by each queue
+    FRAME_SIZE  = 64    # core 1 mode: maximum frame length
+    FLASH_MS    = 10    # without blink, how long a status is shown
+    HEARTBEAT_MS = 4    # how long the heartbeat blink is shown
+    RESPONSE_REGISTER = 0xA0  # reads return the set_response() block
+    MAX_RESPONSE      = 255   # the largest count a block's length byte holds
+    STATS_REGISTER    = 0xC0  # reads return the counters from STATS_REGISTER + index, below + STAT_COUNT
+    TRACE_REGISTER    = 0xE0  # reads return the bus trace
+    SEQUENCE_SLOTS    = 8     # sequenced mode: responses cached, a power of two
+
+    # performance counters: indices into stats, in the order they are read
+    STAT_TRANSACTIONS   = 0   # transactions addressed to the slave, counted at START
+    STAT_BYTES_IN       = 1
+    STAT_BYTES_OUT      = 2
+    STAT_TX_ABORTS      = 3
+    STAT_LOOP_MAX_US    = 4   # longest time handling the events of one pass
+    STAT_LOOP_MEAN_US   = 5   # running mean of the same, over about 16 passes
+    STAT_REQUEST_MAX_US = 6   # longest time from a read request to its response
+    STAT_ERRORS         = 7   # one counter per code, BAD_ADDRESS to BUSY
+    STAT_DUPLICATES     = 16  # sequenced frames answered from the cache
+    STAT_COUNT          = 17
+
+    # IRQ mode ring buffer entries up to RX_ENTRY_MAX are received bytes, the
+    # first of each write with FIRST_DATA_BYTE set; entries above are I2CEvent
+    # bits shifted left by 8, the low byte flagging a read request already
+    # answered by the handler
+    RX_ENTRY_MAX = i2c_slave.FIRST_DATA_BYTE | 0xFF
+    SERVED      = 0x01
 
     # response codes: (note: extension values <= 0x4F are considered 'okay')
     INIT              = 0x10
@@ -59,26 +198,120 @@ class I2CSlave(object):
     EMPTY_PAYLOAD     = 0x76
     PAYLOAD_TOO_LARGE = 0x77
     UNKNOWN_ERROR     = 0x78
+    BUSY              = 0x79
 
-    def __init__(self, i2c_id=I2C_ID, sda=SDA_PIN, scl=SCL_PIN, i2c_address=I2C_ADDRESS, blink=True, callback=None):
+    def __init__(self, i2c_id=I2C_ID, sda=SDA_PIN, scl=SCL_PIN, i2c_address=I2C_ADDRESS, blink=True, callback=None, irq=False, dma=None, core1=False, general_call=False, bus_speed=None, binary=False, queue=0, profile=False, trace=0, sequenced=False):
         super().__init__()
         self._blink = blink
+        self._profiler = None
+        if profile:
+            self._profiler = I2CProfiler()
+            # the callbacks are timed by wrapping them, costing nothing otherwise
+            self.process_buffer = self._profiler.wrap(I2CProfiler.PROCESS_BUFFER, self.process_buffer)
+            if callback:
+                callback = self._profiler.wrap(I2CProfiler.STATUS, callback, 2)
         self._callback = callback
+        self._indicator = StatusIndicator(callback) if callback else None
+        self._trace = BusTrace(trace) if trace else None
+        self._irq = irq
         self._enabled = False
         self._counter = itertools.count()
         print("starting I2C slave…")
-        self.s_i2c = i2c_slave(i2cID=i2c_id, sda=sda, scl=scl, slaveAddress=i2c_address)
+        _timing = None
+        if bus_speed:
+            _timing = I2CTiming(bus_speed, machine.freq())
+            print(_timing)
+        self.s_i2c = i2c_slave(i2cID=i2c_id, sda=sda, scl=scl, slaveAddress=i2c_address, timing=_timing)
         # initial conditions
         self._index = 0
         self._payload = ''
         self._response = self.INIT
+        self._requested = False
+        # bytes of a write have been received and it has not yet been ended
+        self._writing = False
+        # a write began in the bytes received since the last STOP was handled
+        self._began = False
         self._currentTransaction = self.s_i2c.I2CTransaction(0x00, [])
+        # counters
+        self.frames_received = 0
+        self.requests_served = 0
+        self.error_count = 0
+        self._stats = array('I', [0] * self.STAT_COUNT)
+        self._stats_block = bytearray(4 * self.STAT_COUNT)
+        self._loop_mean16 = 0
+        self._request_at = 0
         self._state = self.s_i2c.I2CStateMachine.I2C_START
+        self._dma_rx = None
+        self._dma_tx = None
+        self._rx_buffer = None
+        self._rx_overrun = False
+        self._tx_buffer = None
+        self._tx_count = 0
+        self._tx_index = 0
+        self._tx_dma = False
+        self._tx_active = False
+        # the register() handler tables, allocated when first needed
+        self._on_write = None
+        self._on_read = None
+        # count byte, then the data of the set_response() block
+        self._block = bytearray(self.MAX_RESPONSE + 1)
+        self._block_view = memoryview(self._block)
+        if dma:
+            if self._irq:
+                raise ValueError('DMA transfers are not supported in IRQ mode.')
+            self._dma_rx = dma(self.s_i2c, False)
+            self._dma_tx = dma(self.s_i2c, True)
+        if self._irq:
+            micropython.alloc_emergency_exception_buf(100)
+            self._ring = RingBuffer(self.RING_SIZE)
+            self._deferred = 0
+            self._stale = False
+            self._prepared = self.EMPTY_PAYLOAD
+            # the handler may only answer on its own if write_response() is not overridden
+            self._fast_response = type(self).write_response is I2CSlave.write_response
+            self._rx_available = self._ring_available
+            self._rx_read = self._ring_read
+            self._rx_read_into = self._ring_read_into
+        else:
+            self._rx_available = self.s_i2c.Available
+            self._rx_read = self.s_i2c.Read_Data_Received
+            self._rx_read_into = self.s_i2c.read_into
+        # register, length, characters, validate and end-of-record
+        self._rx_chunk = bytearray(self.MAX_CHARS + 4)
+        self._binary = binary
+        self._parser = BinaryFrameParser(self.MAX_CHARS) if binary else FrameParser(self.MAX_CHARS, sequenced)
+        self._sequenced = sequenced
+        if sequenced:
+            self._seq_numbers = bytearray(self.SEQUENCE_SLOTS)
+            self._seq_responses = bytearray(self.SEQUENCE_SLOTS)
+            self._seq_cached = bytearray(self.SEQUENCE_SLOTS)
+            self._seq_last = -1
+        self._frame = self._parser.frame
+        self.s_i2c.general_Call(general_call)
+        self._general_call = False
+        self._gc_buffer = bytearray(self.MAX_CHARS)
+        self._gc_count = 0
+        self._gc_overrun = False
+        self._core1 = core1
+        self._inbox = None
+        if core1:
+            if self._irq:
+                raise ValueError('IRQ mode is not supported on core 1.')
+            self._inbox = FrameQueue(self.FRAME_SLOTS, self.FRAME_SIZE)
+            self._outbox = FrameQueue(self.FRAME_SLOTS, self.FRAME_SIZE)
+            self._reply = bytearray(self.FRAME_SIZE)
+        self._queue = None
+        self.queue_high_water = 0
+        if queue:
+            if core1:
+                raise ValueError('a work queue is not supported on core 1.')
+            self._queue = FrameQueue(queue, self.MAX_CHARS)
+            self._work = FrameBuffer(self.MAX_CHARS)
         # indicate startup…
         for i in range(3):
-            self.status(None, COLOR_CYAN)
+            self._show(None, COLOR_CYAN)
             utime.sleep_ms(50)
-            self.status(None, COLOR_BLACK)
+            self._show(None, COLOR_BLACK)
             utime.sleep_ms(50)
         utime.sleep_ms(333)
         print("ready.")
@@ -88,123 +321,929 @@ class I2CSlave(object):
             print("already enabled.")
             return
         self._enabled = True
-        self._loop()
+        if self._indicator:
+            self._indicator.start()
+        if self._core1:
+            _thread.start_new_thread(self._core1_loop, ())
+        elif self._irq:
+            self._irq_loop()
+        else:
+            self._loop()
 
     def disable(self):
         if not self._enabled:
             print("already disabled.")
             return
         self._enabled = False
+        if self._indicator:
+            self._indicator.stop()
+        if self._irq:
+            self.s_i2c.irq(None)
+
+    @property
+    def indicator(self):
+        '''
+        The StatusIndicator rendering status updates, or None if there is
+        no callback.
+        '''
+        return self._indicator
+
+    @property
+    def profiler(self):
+        '''
+        The I2CProfiler holding the latency histograms, with dump() and
+        reset(), or None if not profiling.
+        '''
+        return self._profiler
+
+    @property
+    def trace(self):
+        '''
+        The BusTrace recording bus events, or None if not tracing.
+        '''
+        return self._trace
+
+    @property
+    def stats(self):
+        '''
+        The performance counters, an array of unsigned 32 bit integers
+        indexed by the STAT_ constants. This is the live array, updated
+        in place; counters wrap at 2**32.
+        '''
+        return self._stats
+
+    def reset_stats(self):
+        _stats = self._stats
+        for i in range(self.STAT_COUNT):
+            _stats[i] = 0
+        self._loop_mean16 = 0
 
     def _loop(self):
         print("starting loop…")
         while self._enabled:
             try:
-                self._state = self.s_i2c.handle_event()
-                if self._state == None:
-                    pass
-                elif self._state == self.s_i2c.I2CStateMachine.I2C_START:
-                    self.status('start', COLOR_MAGENTA)
-                elif self._state == self.s_i2c.I2CStateMachine.I2C_RECEIVE:
-                    self.status('rx', COLOR_YELLOW)
-                    '''
-                    Receive data from the master. The first byte is 0x00, followed by a byte
-                    indicating the count of bytes in the payload, then the data bytes followed
-                    by 0x01 to validate, then 0xff to finish.
-                    '''
-                    if self._currentTransaction.address == 0x00:
-                        # first byte received is the register address
-                        _register_address = self.s_i2c.Read_Data_Received()
-                        self._currentTransaction.address = _register_address
-
-                    _valid = False
-                    self._index = 0
-                    _sb = StringBuilder()
-                    _expected_length = 0
-
-                    # read all data byte received until Rx FIFO is empty
-                    while self.s_i2c.Available():
-                        _data_rx = self.s_i2c.Read_Data_Received()
-                        _int_value = int(_data_rx)
-                        if _data_rx == 0x00:
-                            pass
-                        elif _data_rx == 0x01:
-                            _valid = True
-                        elif _data_rx == 0xFF:
-                            self.status('eor', COLOR_MAGENTA)
-                            break
-                        else:
-                            if self._index == 0:
-                                _expected_length = _int_value
-                                if _expected_length > self.MAX_CHARS:
-                                    self.status('error', COLOR_ORANGE)
-                                    raise I2CSlaveError(self.SOURCE_TOO_LARGE, "WARNING: packet failed with {:d} chars, exceeded maximum length of {:d}.".format(
-                                            _expected_length, self.MAX_CHARS))
-                            elif _sb.length() < _expected_length:
-                                if ( _int_value >= 32 ) and ( _int_value < 127 ):
-                                    _sb.append(chr(_data_rx))
-                                else:
-                                    self.status('error', COLOR_RED)
-                                    raise I2CSlaveError(self.INVALID_CHAR, "invalid character received: '0x{:02X}' (int: '{:d}'); buf length: {:d}; sb: '{}'".format(
-                                            _data_rx, _int_value, _sb.length(), _sb.to_string()))
-                            else:
-                                self.status('error', COLOR_RED)
-                                raise I2CSlaveError(self.OUT_OF_SYNC, "out of sync: '0x{:02X}' (int: '{:d}'); buf length: {:d}; sb: '{}'".format(
-                                        _data_rx, _int_value, _sb.length(), _sb.to_string()))
-                        self._index = self._index + 1
-                        self._currentTransaction.data_byte.append(_data_rx)
-
-                    if _sb.length() > 0:
-                        if _valid:
-                            if _expected_length != _sb.length():
-                                self.status('error', COLOR_RED)
-                                raise I2CSlaveError(self.PAYLOAD_TOO_LARGE, "package failed with expected length: {:d}; actual length: {:d}.".format(
-                                        _expected_length, _sb.length()))
-                            else:
-                                self._payload = self.process_buffer(_sb)
-                        else:
-                            self.status('error', COLOR_RED)
-                            raise I2CSlaveError(self.UNVALIDATED, "unvalidated buffer: '{}'".format(_sb.to_string()))
-
-                    # end of receive loop
-                    self.status('rxd', COLOR_YELLOW_GREEN)
-
-                elif self._state == self.s_i2c.I2CStateMachine.I2C_REQUEST:
-                    if len(self._payload) > 0:
-                        self.status('okay', COLOR_GREEN)
-                        self._response = self.OKAY
-                    else:
-                        self.status('nop', COLOR_RED)
-                        self._response = self.EMPTY_PAYLOAD
-                    # otherwise use existing response
-                    while (self.s_i2c.is_Master_Req_Read()):
-#                       self.s_i2c.Slave_Write_Data(self._response)
-                        self.write_response(self._response)
-                elif self._state == self.s_i2c.I2CStateMachine.I2C_FINISH:
-                    self.reset()
-
-                if self._blink: # is alive indicator
-                    if next(self._counter) % 1000 == 0:
-                        self.status(None, COLOR_DARK_CYAN)
-                        utime.sleep_ms(4)
-                        self.status(None, COLOR_BLACK)
+                self.poll()
+            except KeyboardInterrupt:
+                break
+
+    def _core1_loop(self):
+        print("starting loop on core 1…")
+        _outbox = self._outbox
+        while self._enabled:
+            if self._tx_buffer is None and not _outbox.is_empty():
+                # a response queued by core 0 answers the next read
+                self.respond_with(self._reply, _outbox.get_into(self._reply))
+            self.poll()
+
+    def receive_frame(self, buf):
+        '''
+        Core 1 mode, called from core 0: copies the oldest received payload
+        into buf, which must hold FRAME_SIZE bytes, and returns its length,
+        or -1 if none is waiting. With a work queue, takes the oldest queued
+        frame, buf holding MAX_CHARS bytes.
+        '''
+        if self._queue is not None:
+            return self._queue.get_into(buf)
+        return self._inbox.get_into(buf)
+
+    def process_frames(self, limit=None):
+        '''
+        With a work queue: passes queued frames, oldest first, to
+        process_buffer(), up to limit frames (by default all of them).
+        Returns the number processed. The FrameBuffer passed is reused for
+        each frame.
+        '''
+        _queue = self._queue
+        _work = self._work
+        _count = 0
+        while limit is None or _count < limit:
+            _length = _queue.get_into(_work.buffer)
+            if _length < 0:
+                break
+            _work.set_length(_length)
+            self.process_buffer(_work)
+            _count += 1
+        return _count
+
+    @property
+    def queue_depth(self):
+        '''
+        With a work queue: the number of frames waiting.
+        '''
+        return len(self._queue)
+
+    def send_response(self, data, count=None):
+        '''
+        Core 1 mode, called from core 0: queues the first count bytes of data
+        (by default all of it) as the answer to a later read request. Returns
+        False if the queue is full or the response too long.
+        '''
+        return self._outbox.put(data, count)
+
+    @property
+    def frames_dropped(self):
+        '''
+        Core 1 mode: the number of payloads dropped because core 0 had not
+        collected earlier ones. With a work queue, the number of frames
+        answered with BUSY because the queue was full.
+        '''
+        if self._queue is not None:
+            return self._queue.dropped
+        return self._inbox.dropped
 
+    def _post(self, payload):
+        '''
+        Core 1 mode: queues a received payload for core 0.
+        '''
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if not self._inbox.put(payload):
+            self.status('dropped', COLOR_ORANGE)
+
+    def _irq_loop(self):
+        print("starting IRQ loop…")
+        self.s_i2c.irq(self._irq_handler)
+        while self._enabled:
+            try:
+                if not self.service():
+                    machine.idle()
             except KeyboardInterrupt:
+                self.disable()
                 break
-            except I2CSlaveError as se:
-                _msg = 'I2C slave error {} on transaction: {}'.format(se.code, str(se))
-                self.status(_msg, COLOR_RED)
-                print(_msg)
-                # empty buffer
-                while self.s_i2c.Available():
-                    _data_rx = self.s_i2c.Read_Data_Received()
+
+    def poll(self):
+        '''
+        A single pass of the service loop: every event pending in one snapshot
+        of the interrupt status is handled before returning (see _dispatch()
+        for the order).
+        This is called repeatedly by enable() but may also be called directly
+        by an external scheduler.
+        '''
+        _events = 0
+        _start = 0
+        try:
+            _events = self.s_i2c.poll_events()
+            if _events:
+                _start = utime.ticks_us()
+                # any read request in this snapshot is measured from here
+                self._request_at = _start
+                self._dispatch(_events)
+
+            if self._blink and self._indicator: # is alive indicator
+                if next(self._counter) % 1000 == 0:
+                    self._indicator.post(None, COLOR_DARK_CYAN, self.HEARTBEAT_MS)
+
+        except KeyboardInterrupt:
+            raise
+        except I2CSlaveError as se:
+            self._error(se, _events)
+        except Exception as e:
+            print('Exception raised: {}'.format(e))
+        if _events:
+            self._loop_timed(_start)
+
+    def _loop_timed(self, start):
+        '''
+        Records the time taken by one pass of the loop that handled events.
+        '''
+        _us = utime.ticks_diff(utime.ticks_us(), start)
+        _stats = self._stats
+        if _us > _stats[self.STAT_LOOP_MAX_US]:
+            _stats[self.STAT_LOOP_MAX_US] = _us
+        # a running mean in 1/16ths of a microsecond, updated without division
+        self._loop_mean16 += _us - ( self._loop_mean16 >> 4 )
+        _stats[self.STAT_LOOP_MEAN_US] = self._loop_mean16 >> 4
+
+    def _responded(self):
+        '''
+        Records the time from the read request to its response.
+        '''
+        _us = utime.ticks_diff(utime.ticks_us(), self._request_at)
+        if _us > self._stats[self.STAT_REQUEST_MAX_US]:
+            self._stats[self.STAT_REQUEST_MAX_US] = _us
+
+    def _count_error(self, code):
+        if self.BAD_ADDRESS <= code <= self.BUSY:
+            self._stats[self.STAT_ERRORS + code - self.BAD_ADDRESS] += 1
+
+    def service(self):
+        '''
+        The main-context half of IRQ mode: replays the bytes and events queued
+        by the interrupt handler, in order, then prepares the response byte
+        for the handler's next read request. Returns False if there was
+        nothing to do.
+        '''
+        _ring = self._ring
+        if _ring.is_empty():
+            return False
+        _events = 0
+        _start = utime.ticks_us()
+        try:
+            while not _ring.is_empty():
+                _entry = _ring.peek()
+                if _entry > self.RX_ENTRY_MAX:
+                    _ring.get()
+                    _events = _entry >> 8
+                    if _entry & self.SERVED:
+                        _events &= ~self.s_i2c.I2CEvent.REQUEST
+                        self._requested = True
+                        self.requests_served += 1
+                        self._stats[self.STAT_BYTES_OUT] += 1
+                else:
+                    _events = self.s_i2c.I2CEvent.RECEIVE
+                self._dispatch(_events)
+        except KeyboardInterrupt:
+            raise
+        except I2CSlaveError as se:
+            self._error(se, _events)
+        except Exception as e:
+            print('Exception raised: {}'.format(e))
+        finally:
+            self._prepared = self._current_response()
+            _state = machine.disable_irq()
+            if self._deferred:
+                # events the handler could not queue while the ring was full
+                self._irq_handler(self.s_i2c)
+            if _ring.is_empty():
+                # everything the handler queued has been seen
+                self._stale = False
+            machine.enable_irq(_state)
+        self._loop_timed(_start)
+        return True
+
+    @micropython.native
+    def _irq_handler(self, s_i2c):
+        '''
+        Runs in interrupt context and so must not allocate: moves RX FIFO
+        bytes into the ring buffer between the events that bracket them and,
+        unless something queued may still change it, answers a read request
+        with the prepared response. Only START, GEN_CALL and RESTART leave the
+        prepared response current; anything else marks it stale until the main
+        context has caught up.
+        '''
+        _event = i2c_slave.I2CEvent
+        _ring = self._ring
+        _events = s_i2c.poll_events() | self._deferred
+        self._deferred = 0
+        _before = _events & ( _event.TX_ABORT | _event.RX_DONE | _event.START | _event.GEN_CALL | _event.RESTART )
+        if _before:
+            if not _ring.put(_before << 8):
+                # the ring is full: keep every event, and the bytes in the
+                # FIFO, until service() has made room
+                self._deferred = _events & ~_event.RECEIVE
+                return
+            if _before & ( _event.TX_ABORT | _event.RX_DONE ):
+                self._stale = True
+        if _events & _event.RECEIVE:
+            self._stale = True
+            while s_i2c.Available():
+                if _ring.is_full():
+                    # leave the rest in the FIFO (holding the bus) and keep
+                    # the trailing events until the bytes before them are queued
+                    self._deferred = _events & ( _event.REQUEST | _event.STOP | _event.ACTIVE )
+                    return
+                _ring.put(s_i2c.Read_Data_First())
+        _after = _events & ( _event.REQUEST | _event.STOP )
+        if _after & _event.STOP:
+            _after |= _events & _event.ACTIVE
+        if _after and _ring.is_full():
+            # a write that filled the ring exactly: queued once service() has made room
+            self._deferred = _after
+            return
+        if _after & _event.REQUEST and self._fast_response and not self._stale:
+            s_i2c.Slave_Write_Data(self._prepared)
+            if _after & _event.STOP:
+                self._stale = True
+            _ring.put(( _after << 8 ) | self.SERVED)
+        elif _after:
+            if _after & _event.REQUEST:
+                # left to the main context: measured from here
+                self._request_at = utime.ticks_us()
+            self._stale = True
+            _ring.put(_after << 8)
+
+    def _ring_available(self):
+        '''
+        IRQ mode: True if the next ring buffer entry is a received byte.
+        '''
+        _entry = self._ring.peek()
+        return _entry is not None and _entry <= self.RX_ENTRY_MAX
+
+    def _ring_read(self):
+        '''
+        IRQ mode: removes and returns the received byte at the head of the
+        ring buffer.
+        '''
+        return self._ring.get() & 0xFF
+
+    @micropython.native
+    def _ring_read_into(self, buf, start=0):
+        '''
+        IRQ mode: moves the received bytes at the head of the ring buffer, up
+        to the next event or the first byte of the next write, into buf from
+        start. As i2c_slave.read_into(), which it stands in for, returns the
+        count and sets s_i2c.rx_first if the first byte began a write.
+        '''
+        _ring = self._ring
+        _first = i2c_slave.FIRST_DATA_BYTE
+        _began = False
+        _index = start
+        _end = len(buf)
+        while _index < _end:
+            _entry = _ring.peek()
+            if _entry is None or _entry > self.RX_ENTRY_MAX:
+                break
+            if _entry & _first:
+                if _index > start:
+                    break
+                _began = True
+            buf[_index] = _ring.get() & 0xFF
+            _index += 1
+        self.s_i2c.rx_first = _began
+        return _index - start
+
+    def _error(self, se, events):
+        if self._trace:
+            # recorded for decoding on the host rather than formatted here
+            self._trace.record(BusTrace.ERROR, self._parser.address, 0, se.code)
+            self.status(None, COLOR_RED)
+        else:
+            # formatted before reset() clears the frame it may quote
+            _text = str(se)
+            _msg = 'I2C slave error {} on transaction: {}'.format(se.code, _text)
+            self.status(_msg, COLOR_RED)
+            print(_msg)
+        self.error_count += 1
+        self._count_error(se.code)
+        self.reset()
+        if self._writing:
+            # the rest of the failed write is ignored until it ends, leaving
+            # the bytes of any write after it in place
+            self._parser.discard()
+        # the error code is returned on the next read request
+        self._response = se.code
+        if events & self.s_i2c.I2CEvent.REQUEST and not self._requested:
+            if not self._trace:
+                print("sending error response: {}".format(_text))
+            self._request()
+
+    def _dispatch(self, events):
+        '''
+        Handles the events of one snapshot. The snapshot does not record the
+        order of conditions that arrive together, so they are taken in the
+        order of a single transaction: the end of a previous read, START,
+        received data, the read request, then STOP. Where a snapshot spans
+        more than one transaction the received bytes carry the boundary: a
+        write is ended at the first byte of the next (see _write_began()),
+        and a STOP is not taken to end a write that began in the snapshot if
+        the slave is still active, as it then ended the write before.
+        '''
+        _event = self.s_i2c.I2CEvent
+        _profiler = self._profiler
+        _trace = self._trace
+        if _profiler:
+            # each state is timed from the end of the one before
+            _start = utime.ticks_us()
+        if events & ( _event.TX_ABORT | _event.RX_DONE ):
+            if events & _event.TX_ABORT:
+                self._stats[self.STAT_TX_ABORTS] += 1
+                if _trace:
+                    _trace.record(BusTrace.TX_ABORT, self._currentTransaction.address)
+            # the master has finished reading (or aborted)
+            self._state = self.s_i2c.I2CStateMachine.I2C_FINISH
+            if self._tx_active:
+                self._transmitted()
+            self.reset()
+            if _profiler:
+                _start = _profiler.record(I2CProfiler.FINISH, _start)
+        if events & _event.START:
+            self._state = self.s_i2c.I2CStateMachine.I2C_START
+            self._stats[self.STAT_TRANSACTIONS] += 1
+            if _trace:
+                _trace.record(BusTrace.START)
+            if events & _event.RESTART and self._rx_buffer is not None:
+                # the write half of a write-then-read has ended
+                self._dma_received()
+            self.status('start', COLOR_MAGENTA)
+        if events & _event.GEN_CALL:
+            # the data up to STOP is a broadcast, not a frame for this slave
+            self._general_call = True
+            self._gc_count = 0
+            self._gc_overrun = False
+        if _profiler and events & ( _event.START | _event.GEN_CALL ):
+            _start = _profiler.record(I2CProfiler.START, _start)
+        if events & _event.RECEIVE:
+            self._state = self.s_i2c.I2CStateMachine.I2C_RECEIVE
+            if self._general_call and self._rx_buffer is None:
+                self._receive_general_call()
+            elif self._rx_buffer is None:
+                self._receive()
+            elif not self._dma_rx.active():
+                # the channel has filled the buffer and the master is still writing
+                self._dma_overrun()
+            if _profiler:
+                _start = _profiler.record(I2CProfiler.RECEIVE, _start)
+        if events & _event.REQUEST:
+            self._state = self.s_i2c.I2CStateMachine.I2C_REQUEST
+            if not self._requested and self._rx_buffer is None:
+                # a read after a repeated start ends the write
+                self._end_of_write()
+            if self._tx_buffer is None:
+                self._request()
+            elif not self._tx_active:
+                self._transmit()
+            elif not self._tx_dma and self._tx_index < self._tx_count:
+                # the TX FIFO ran dry before TX_EMPTY was serviced
+                self._refill()
+            else:
+                # the master has read past the end of the buffer
+                self._request()
+        if events & _event.TX_EMPTY and self._tx_active:
+            self._refill()
+        if _profiler and events & ( _event.REQUEST | _event.TX_EMPTY ):
+            _start = _profiler.record(I2CProfiler.REQUEST, _start)
+        if events & _event.STOP:
+            self._state = self.s_i2c.I2CStateMachine.I2C_FINISH
+            if _trace:
+                _trace.record(BusTrace.STOP)
+            if self._rx_buffer is not None:
+                self._dma_received()
+            if self._tx_active:
+                self._transmitted()
+            if self._general_call:
+                self._general_call = False
+                if self._rx_buffer is None:
+                    self._general_call_received()
+            elif self._rx_buffer is None and not self._requested:
+                if not ( self._began and events & _event.ACTIVE ):
+                    self._end_of_write()
+            self._began = False
+            # a write's STOP leaves the payload in place for the master's read
+            if self._requested:
                 self.reset()
-                while (self.s_i2c.is_Master_Req_Read()):
-                    print("sending error response: {}".format(str(se)))
-#                   self.s_i2c.Slave_Write_Data(se.code)
-                    self.write_response(se.code)
-            except Exception as e:
-                print('Exception raised: {}'.format(e))
+            if _profiler:
+                _profiler.record(I2CProfiler.FINISH, _start)
+
+    def _receive(self):
+        '''
+        Receive data from the master. The first byte is the register address,
+        followed by a byte indicating the count of bytes in the payload, then
+        the data bytes followed by 0x01 to validate, then 0xff to finish. In
+        binary mode the data bytes end the frame, at the end of the write.
+
+        The waiting bytes are read as a chunk into a preallocated buffer and
+        fed to the FrameParser, which keeps its place between chunks, so a
+        frame may arrive over any number of RX events.
+        '''
+        self.status('rx', COLOR_YELLOW)
+        _buf = self._rx_chunk
+        _parser = self._parser
+        _s_i2c = self.s_i2c
+        _count = self._rx_read_into(_buf, 0)
+        while _count:
+            if _s_i2c.rx_first:
+                self._write_began()
+            self._writing = True
+            self._stats[self.STAT_BYTES_IN] += _count
+            _index = 0
+            while _index < _count:
+                try:
+                    _index = _parser.feed(_buf, _index, _count)
+                except FrameError as fe:
+                    raise I2CSlaveError(fe.code, '{}', fe)
+                if _parser.complete:
+                    self.status('eor', COLOR_MAGENTA)
+                    self._frame_received()
+            _count = self._rx_read_into(_buf, 0)
+        self._currentTransaction.address = _parser.address
+        self.status('rxd', COLOR_YELLOW_GREEN)
+
+    def _write_began(self):
+        '''
+        Called at the first byte of a write (FIRST_DATA_BYTE). A write still
+        open has then ended, its STOP or repeated start having arrived in the
+        same snapshot as the bytes on either side of it, so it is ended here.
+        An error ending it is reported without losing the new write.
+        '''
+        self._began = True
+        if self._writing:
+            try:
+                self._end_of_write()
+            except I2CSlaveError as se:
+                self._error(se, 0)
+
+    def _end_of_write(self):
+        '''
+        Tells the parser the master has finished writing, completing a frame
+        that has been validated but not ended with 0xFF.
+        '''
+        self._writing = False
+        try:
+            if self._parser.end():
+                self._frame_received()
+        except FrameError as fe:
+            raise I2CSlaveError(fe.code, '{}', fe)
+
+    def _frame_received(self):
+        if self._trace:
+            self._trace.record(BusTrace.FRAME, self._parser.address, self._frame.length())
+        if self._sequenced:
+            _sequence = self._sequence(self._frame)
+            if _sequence >= 0:
+                self._handle_frame()
+                self._cache_response(_sequence)
+        else:
+            self._handle_frame()
+
+    def _sequence(self, frame):
+        '''
+        Sequenced mode: takes the sequence number off the front of the frame
+        and returns it, or if the frame is a duplicate answers the next read
+        with the cached response and returns -1.
+        '''
+        _length = frame.length()
+        if _length == 0:
+            raise I2CSlaveError(self.OUT_OF_SYNC, 'sequenced frame without a sequence number.')
+        _sequence = frame.buffer[0]
+        _slot = _sequence & ( self.SEQUENCE_SLOTS - 1 )
+        _last = self._seq_last
+        self._seq_last = _sequence
+        if _sequence == 0 and _last != 0:
+            # a new sequence: the cached responses are of the last one. A 0
+            # straight after a 0 is a resend, as the master retries a frame
+            # before numbering the next, and is looked up in the cache
+            for i in range(self.SEQUENCE_SLOTS):
+                self._seq_cached[i] = 0
+        elif self._seq_cached[_slot] and self._seq_numbers[_slot] == _sequence:
+            self._response = self._seq_responses[_slot]
+            self._stats[self.STAT_DUPLICATES] += 1
+            if self._trace:
+                self._trace.record(BusTrace.DUPLICATE, self._parser.address, _sequence, self._response)
+            self.status('duplicate', COLOR_ORANGE)
+            return -1
+        frame.copy_from(frame.buffer, 1, _length)
+        return _sequence
+
+    def _cache_response(self, sequence):
+        '''
+        Sequenced mode: keeps the response to a frame for a resend of it. A
+        frame refused with BUSY was not handled, so a resend is handled.
+        '''
+        _response = self._current_response()
+        _slot = sequence & ( self.SEQUENCE_SLOTS - 1 )
+        if _response == self.BUSY:
+            self._seq_cached[_slot] = 0
+            return
+        self._seq_numbers[_slot] = sequence
+        self._seq_responses[_slot] = _response
+        self._seq_cached[_slot] = 1
+
+    def _handle_frame(self):
+        if self._on_write is not None:
+            _on_write = self._on_write[self._parser.address]
+            if _on_write is not None:
+                self._payload = self._frame
+                self.frames_received += 1
+                _response = _on_write(self._frame)
+                if _response is not None:
+                    self._response = _response
+                return
+        if self._queue is not None:
+            self._enqueue(self._frame)
+            return
+        self._payload = self.process_buffer(self._frame)
+        self.frames_received += 1
+        if self._inbox is not None:
+            self._post(self._payload)
+
+    def _enqueue(self, frame):
+        '''
+        Copies a frame into the work queue, or if it is full answers the
+        next read with BUSY.
+        '''
+        _queue = self._queue
+        if _queue.put(frame.buffer, frame.length()):
+            self._payload = frame
+            self.frames_received += 1
+            if len(_queue) > self.queue_high_water:
+                self.queue_high_water = len(_queue)
+        else:
+            self._response = self.BUSY
+            self._count_error(self.BUSY)
+            if self._trace:
+                self._trace.record(BusTrace.ERROR, self._parser.address, frame.length(), self.BUSY)
+            self.status('busy', COLOR_ORANGE)
+
+    def _receive_general_call(self):
+        '''
+        Collects the data of a general call into its own buffer, leaving the
+        framing state of the slave alone.
+        '''
+        _buf = self._gc_buffer
+        _read = self._rx_read_into(_buf, self._gc_count)
+        while _read:
+            self._stats[self.STAT_BYTES_IN] += _read
+            self._gc_count += _read
+            _read = self._rx_read_into(_buf, self._gc_count)
+        if self._rx_available():
+            # longer than the buffer: the broadcast is discarded at STOP
+            self._gc_overrun = True
+            while self._rx_available():
+                self._rx_read()
+
+    def _general_call_received(self):
+        if self._gc_overrun:
+            self.error_count += 1
+            self.status("general call exceeded {:d} bytes: discarded.".format(len(self._gc_buffer)), COLOR_RED)
+        elif self._gc_count > 0:
+            if self._trace:
+                self._trace.record(BusTrace.GENERAL_CALL, 0, self._gc_count)
+            self.process_general_call(self._gc_buffer, self._gc_count)
+
+    def receive_into(self, buf):
+        '''
+        Streams the data bytes of each following write transaction into buf
+        by DMA rather than through the byte parser. When the write ends (at
+        STOP or a repeated START) the count received is passed to
+        process_dma(), then the channel is re-armed on the same buffer for
+        the next transaction. None returns to the byte parser.
+        '''
+        if self._dma_rx is None:
+            raise ValueError('no DMA channel class was provided.')
+        self._dma_rx.abort()
+        self._rx_buffer = buf
+        self._rx_overrun = False
+        self._dma_control()
+        if buf is not None:
+            self._dma_rx.start(buf, len(buf))
+
+    def transmit_from(self, buf, count=None):
+        '''
+        Answers the master's next read request with the first count bytes
+        of buf (by default all of it), fed to the TX FIFO by DMA. When the
+        read ends the number of bytes the master took is passed to
+        transmit_complete(). buf must not be modified until then.
+        '''
+        if self._dma_tx is None:
+            raise ValueError('no DMA channel class was provided.')
+        self._tx_buffer = buf
+        self._tx_count = len(buf) if count is None else count
+        self._tx_dma = True
+        self._dma_control()
+
+    def respond_with(self, buf, count=None):
+        '''
+        Answers the master's next read request with the first count bytes
+        of buf (by default all of it). As soon as the read is addressed the
+        TX FIFO is preloaded from the buffer, then refilled whenever it falls
+        to TX_THRESHOLD bytes. When the read ends the number of bytes the
+        master took is passed to transmit_complete(). buf must not be
+        modified until then.
+        '''
+        if self._irq:
+            raise ValueError('multi-byte responses are not supported in IRQ mode.')
+        self._tx_buffer = buf
+        self._tx_count = len(buf) if count is None else count
+        self._tx_dma = False
+
+    def register(self, address, on_write=None, on_read=None):
+        '''
+        Sets the handlers of a register, replacing any set before; with
+        neither given the register is returned to the default handling.
+
+        on_write is called with the FrameBuffer of each frame written to the
+        register, in place of process_buffer(). It may return a response
+        code to answer the next read, otherwise the response is OKAY. The
+        buffer is reused by the next frame, so the handler should copy
+        anything it keeps. In core 1 mode the frame is not queued for core 0.
+
+        on_read is called when the master reads the register, i.e. after
+        writing just its address (e.g. read_byte_data() or a combined
+        request), and returns either an int, the single response byte, or a
+        buffer streamed as with respond_with() (polled mode only).
+
+        The handlers are kept in two tables of 256 entries, indexed by the
+        register address, allocated by the first call. When profiling they
+        are wrapped to record their time.
+
+        :param: address    the register address, 0-255
+        :param: on_write   the optional write handler
+        :param: on_read    the optional read handler
+        '''
+        if address < 0 or address > 0xFF:
+            raise ValueError('register address 0x{:X} out of range.'.format(address))
+        if self._on_write is None:
+            self._on_write = [None] * 256
+            self._on_read = [None] * 256
+        if self._profiler:
+            if on_write is not None:
+                on_write = self._profiler.wrap(I2CProfiler.ON_WRITE, on_write)
+            if on_read is not None:
+                on_read = self._profiler.wrap(I2CProfiler.ON_READ, on_read, 0)
+        self._on_write[address] = on_write
+        self._on_read[address] = on_read
+        if on_read is not None and self._irq:
+            # the interrupt handler can no longer answer reads on its own
+            self._fast_response = False
+
+    def set_response(self, data, count=None):
+        '''
+        Sets the answer to reads of RESPONSE_REGISTER to the first count
+        bytes of data (by default all of it), up to MAX_RESPONSE bytes. The
+        data is copied, so the caller's buffer may be reused at once. The
+        master reads the count byte and the data in a single transaction,
+        e.g. with read_i2c_block_data(); bytes read past the end are the
+        response byte. An empty response returns a count of zero.
+        '''
+        if self._irq:
+            raise ValueError('multi-byte responses are not supported in IRQ mode.')
+        _count = len(data) if count is None else count
+        if _count > self.MAX_RESPONSE:
+            raise ValueError('response ({:d} bytes) too long: {:d} maximum.'.format(_count, self.MAX_RESPONSE))
+        self._block_view[1:_count + 1] = memoryview(data)[:_count]
+        self._block[0] = _count
+
+    def _dma_control(self):
+        self.s_i2c.dma_Enable(rx=self._rx_buffer is not None, tx=self._tx_buffer is not None and self._tx_dma)
+
+    def _dma_received(self):
+        '''
+        Ends a DMA write transaction: reports the bytes received, if any,
+        and re-arms the channel.
+        '''
+        _channel = self._dma_rx
+        while _channel.active() and self.s_i2c.Available():
+            pass # let the channel empty the RX FIFO
+        _buffer = self._rx_buffer
+        _count = len(_buffer) - _channel.remaining()
+        _channel.abort()
+        self._stats[self.STAT_BYTES_IN] += _count
+        try:
+            if self._rx_overrun:
+                self._rx_overrun = False
+                self.status('error', COLOR_RED)
+                raise I2CSlaveError(self.PAYLOAD_TOO_LARGE, "write exceeded the DMA receive buffer of {:d} bytes.", len(_buffer))
+            elif self._general_call:
+                self.process_general_call(_buffer, _count)
+            elif _count > 0:
+                self.status('rxd', COLOR_YELLOW_GREEN)
+                self._payload = self.process_dma(_buffer, _count)
+                self.frames_received += 1
+                if self._inbox is not None:
+                    self._post(self._payload)
+        finally:
+            _channel.start(_buffer, len(_buffer))
+
+    def _dma_overrun(self):
+        '''
+        The write transaction is longer than the receive buffer: the rest of
+        it is discarded, the error raised when it ends.
+        '''
+        self._rx_overrun = True
+        while self.s_i2c.Available():
+            self.s_i2c.Read_Data_Received()
+
+    def _transmit(self):
+        '''
+        Answers a read request from the staged buffer, either by starting the
+        TX channel or by preloading the TX FIFO.
+        '''
+        self.status('tx', COLOR_GREEN)
+        self._requested = True
+        self.requests_served += 1
+        self._tx_active = True
+        if self._tx_dma:
+            self._dma_tx.start(self._tx_buffer, self._tx_count)
+        else:
+            self._tx_index = self.s_i2c.write_from(self._tx_buffer, 0, self._tx_count)
+            if self._tx_index < self._tx_count:
+                self.s_i2c.tx_Empty_Irq(True, self.TX_THRESHOLD)
+        self._responded()
+
+    def _refill(self):
+        '''
+        Tops up the TX FIFO from the staged buffer, masking TX_EMPTY once the
+        whole buffer has been queued.
+        '''
+        if self._tx_index < self._tx_count:
+            self._tx_index += self.s_i2c.write_from(self._tx_buffer, self._tx_index, self._tx_count)
+            if self._tx_index == self._tx_count:
+                self.s_i2c.tx_Empty_Irq(False)
+
+    def _transmitted(self):
+        '''
+        Ends a read answered from the staged buffer. Bytes queued but not
+        taken by the master are left in the TX FIFO, which the controller
+        flushes on the next read.
+        '''
+        if self._tx_dma:
+            _remaining = self._dma_tx.remaining()
+            self._dma_tx.abort()
+        else:
+            _remaining = self._tx_count - self._tx_index
+            self.s_i2c.tx_Empty_Irq(False)
+        _sent = self._tx_count - _remaining - self.s_i2c.TX_Level()
+        self._stats[self.STAT_BYTES_OUT] += _sent
+        if self._trace:
+            self._trace.record(BusTrace.TRANSMIT, self._currentTransaction.address, _sent)
+        self._tx_active = False
+        self._tx_buffer = None
+        if self._tx_dma:
+            self._tx_dma = False
+            self._dma_control()
+        self.transmit_complete(_sent)
+
+    def _request(self):
+        '''
+        Answers a read request with the single byte response. An error code
+        set by a failed receive is kept, otherwise the response reflects
+        whether a payload has been received. A read of a register with an
+        on_read handler is answered by the handler, a read of
+        RESPONSE_REGISTER with the set_response() block, a read of
+        STATS_REGISTER + index with the counters from that index on, and
+        with a trace, a read of TRACE_REGISTER with the trace.
+        '''
+        _address = self._currentTransaction.address
+        if self._on_read is not None and not self._tx_active:
+            _on_read = self._on_read[_address]
+            if _on_read is not None:
+                self._read_handler(_on_read)
+                return
+        if _address == self.RESPONSE_REGISTER and not self._tx_active and not self._irq:
+            self.respond_with(self._block, self._block[0] + 1)
+            self._transmit()
+            return
+        if self.STATS_REGISTER <= _address < self.STATS_REGISTER + self.STAT_COUNT and not self._tx_active and not self._irq:
+            self.respond_with(self._stats_block, self._pack_stats(_address - self.STATS_REGISTER))
+            self._transmit()
+            return
+        if _address == self.TRACE_REGISTER and self._trace and not self._tx_active and not self._irq:
+            # the ring is not written while it is sent, as the loop only records after the read
+            self.respond_with(self._trace.seal())
+            self._transmit()
+            return
+        self._response = self._current_response()
+        if self._response == self.OKAY:
+            self.status('okay', COLOR_GREEN)
+        elif self._response == self.EMPTY_PAYLOAD:
+            self.status('nop', COLOR_RED)
+        # poll_events() has already cleared RD_REQ, so the byte is written once per request
+        self._requested = True
+        self.requests_served += 1
+        self._stats[self.STAT_BYTES_OUT] += 1
+        self.write_response(self._response)
+        self._responded()
+        if self._trace:
+            self._trace.record(BusTrace.RESPONSE, _address, 1, self._response)
+
+    @micropython.native
+    def _pack_stats(self, first):
+        '''
+        Copies the counters from index first into the stats block, four
+        bytes each, least significant first, so that the read sees them as
+        they were when it began. Returns the length in bytes.
+        '''
+        _stats = self._stats
+        _block = self._stats_block
+        _offset = 0
+        for i in range(first, self.STAT_COUNT):
+            _value = _stats[i]
+            _block[_offset] = _value & 0xFF
+            _block[_offset + 1] = ( _value >> 8 ) & 0xFF
+            _block[_offset + 2] = ( _value >> 16 ) & 0xFF
+            _block[_offset + 3] = ( _value >> 24 ) & 0xFF
+            _offset += 4
+        return _offset
+
+    def _read_handler(self, on_read):
+        '''
+        Answers a read request with the result of a register's on_read
+        handler: an int is the response byte, anything else a buffer
+        streamed as with respond_with().
+        '''
+        _result = on_read()
+        if isinstance(_result, int):
+            self._requested = True
+            self.requests_served += 1
+            self._stats[self.STAT_BYTES_OUT] += 1
+            self.write_response(_result)
+            self._responded()
+            if self._trace:
+                self._trace.record(BusTrace.RESPONSE, self._currentTransaction.address, 1, _result)
+        else:
+            self.respond_with(_result)
+            self._transmit()
+
+    def _current_response(self):
+        '''
+        Returns the response to a read request: any error code set by a failed
+        receive, otherwise OKAY if a payload has been received.
+        '''
+        if self._response != self.INIT:
+            return self._response
+        elif len(self._payload) > 0:
+            return self.OKAY
+        return self.EMPTY_PAYLOAD
 
     def write_response(self, response):
         '''
@@ -214,37 +1253,89 @@ class I2CSlave(object):
 
     def status(self, message, color):
         '''
-        If the callback has been provided, it is called with a message (which may
-        be None) and an RGB color tuple to display the color on the NeoPixel.
+        If the callback has been provided, the message (which may be None)
+        and RGB color tuple are posted for it, to display the color on the
+        NeoPixel at the indicator's next tick. Only the latest status posted
+        before a tick is shown.
+        '''
+        if self._indicator:
+            # without blink the LED is turned off again after FLASH_MS
+            self._indicator.post(message, color, 0 if self._blink else self.FLASH_MS)
+
+    def _show(self, message, color):
+        '''
+        Shows a status at once, outside the bus loop.
         '''
-        if self._callback:
-            self._callback(message, color)
-            if not self._blink:
-                # callback but no blink so we need to un-blink the LED  
-                utime.sleep_ms(10)
-                self._callback(None, COLOR_BLACK)
+        if self._indicator:
+            self._indicator.show(message, color)
 
     def process_buffer(self, buffer):
         '''
-        Receives the packet sent by the master, returning the contents as a string.
-        This can be expanded to further process the value.
+        Receives the packet sent by the master as a FrameBuffer, returning the
+        contents as a string, or in binary mode as bytes. This can be expanded
+        to further process the value, e.g. with struct.unpack_from() on
+        buffer.buffer; the buffer is reused by the next frame, and the copy
+        made here is the only step that allocates.
         '''
+        if self._binary:
+            __payload = buffer.to_bytes()
+            self.status("payload: {:d} bytes".format(len(__payload)), COLOR_GREEN)
+            return __payload
         __payload = buffer.to_string()
         self.status("payload: '{}'".format(__payload), COLOR_GREEN)
         return __payload
 
+    def process_dma(self, buf, count):
+        '''
+        Receives the count bytes written by the master into the receive_into()
+        buffer, returning the payload. The buffer is reused by the following
+        write, so this returns a copy; it can be overridden to process the
+        bytes in place.
+        '''
+        __payload = bytes(memoryview(buf)[:count])
+        self.status("payload: {:d} bytes".format(count), COLOR_GREEN)
+        return __payload
+
+    def process_general_call(self, buf, count):
+        '''
+        Called with the count bytes of a write to the general call address
+        0x00, a broadcast to every slave on the bus. The buffer is reused, so
+        this should copy anything it keeps. This can be overridden to act on
+        the broadcast; no response is returned to the master.
+        '''
+        self.status("general call: {:d} bytes".format(count), COLOR_BLUE)
+
+    def transmit_complete(self, count):
+        '''
+        Called when a read answered from the transmit_from() or respond_with()
+        buffer has ended, with the number of bytes the master took.
+        '''
+        self.status("sent: {:d} bytes".format(count), COLOR_GREEN)
+
     def reset(self):
         self._index = 0
         self._payload = ''
         self._response = self.INIT
-        self._currentTransaction.reset()
+        self._requested = False
+        self._parser.reset()
+        # the transaction's data_byte list is no longer filled
+        self._currentTransaction.address = 0x00
         self._state = self.s_i2c.I2CStateMachine.I2C_START
 
 # ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
 class I2CSlaveError(Exception):
-    def __init__(self, code, message):
+    '''
+    Carries the response code, and the message with the values that fill
+    it in: as with a FrameError, nothing is formatted unless it is printed,
+    which with a bus trace it is not.
+    '''
+    def __init__(self, code, message, *values):
         super().__init__(message)
         self._code = code
+        self._values = values
+
+    def __str__(self):
+        return self.args[0].format(*self._values)
 
     @property
     def code(self):
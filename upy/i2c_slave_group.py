@@ -0,0 +1,142 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import machine
+import micropython
+from machine import Timer
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class I2CSlaveGroup(object):
+    '''
+    Services several I2CSlave instances from one loop, so that one RP2040
+    can appear as more than one slave device: one on each of the I2C0 and
+    I2C1 controllers, either on two buses or, with both controllers' pins
+    wired to the same bus, at two addresses.
+
+    Each slave keeps its own framing state, handlers and counters; the group
+    only decides when each is serviced, taking them in turn so that a busy
+    slave cannot starve the other. Each slave's status indicator is started
+    and stopped with the group.
+
+    The slaves must all be polled or all be in IRQ mode. In IRQ mode one
+    timer samples every controller's interrupt line, rather than one timer
+    per slave.
+
+    :param: slaves        the I2CSlave instances
+    :param: freq          IRQ mode: the sampling frequency; default is 5000
+    '''
+    def __init__(self, *slaves, freq=5000):
+        if not slaves:
+            raise ValueError('no slaves provided.')
+        self._slaves = slaves
+        self._count = len(slaves)
+        self._irq = slaves[0]._irq
+        for _slave in slaves:
+            if _slave._irq != self._irq:
+                raise ValueError('slaves must all be polled or all be in IRQ mode.')
+        self._controllers = tuple(_slave.s_i2c for _slave in slaves)
+        self._freq = freq
+        self._timer = None
+        self._enabled = False
+
+    @property
+    def slaves(self):
+        return self._slaves
+
+    def enable(self):
+        if self._enabled:
+            print("already enabled.")
+            return
+        self._enabled = True
+        for _slave in self._slaves:
+            if _slave.indicator:
+                _slave.indicator.start()
+        if self._irq:
+            self._irq_loop()
+        else:
+            self._loop()
+
+    def disable(self):
+        if not self._enabled:
+            print("already disabled.")
+            return
+        self._enabled = False
+        for _slave in self._slaves:
+            if _slave.indicator:
+                _slave.indicator.stop()
+        if self._timer:
+            self._timer.deinit()
+            self._timer = None
+        if self._irq:
+            for _slave in self._slaves:
+                _slave.s_i2c.irq(None)
+
+    def _loop(self):
+        print("starting group loop…")
+        while self._enabled:
+            try:
+                self.poll()
+            except KeyboardInterrupt:
+                break
+
+    def _irq_loop(self):
+        print("starting group IRQ loop…")
+        self.attach()
+        while self._enabled:
+            try:
+                if not self.service():
+                    machine.idle()
+            except KeyboardInterrupt:
+                self.disable()
+                break
+
+    def poll(self):
+        '''
+        A single pass of the polled loop: one I2CSlave.poll() of each slave.
+        '''
+        for _slave in self._slaves:
+            _slave.poll()
+
+    def attach(self):
+        '''
+        IRQ mode: attaches each slave's interrupt handler to its controller
+        and starts the one hard timer that samples them all; as with
+        i2c_slave.irq(), the handlers must not allocate.
+        '''
+        for _slave in self._slaves:
+            _slave.s_i2c.irq(_slave._irq_handler, freq=None)
+        self._timer = Timer(freq=self._freq, mode=Timer.PERIODIC, callback=self._irq_sample, hard=True)
+
+    def service(self):
+        '''
+        A single pass of the IRQ mode loop: one I2CSlave.service() of each
+        slave. Returns False if none of them had anything to do.
+        '''
+        _busy = False
+        for _slave in self._slaves:
+            if _slave.service():
+                _busy = True
+        return _busy
+
+    @micropython.native
+    def _irq_sample(self, timer):
+        '''
+        Timer callback: samples each controller in turn. Indexed rather than
+        iterated, as an iterator would allocate in interrupt context.
+        '''
+        _controllers = self._controllers
+        i = 0
+        while i < self._count:
+            _controllers[i].irq_Sample(timer)
+            i += 1
+
+#EOF
@@ -0,0 +1,25 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# Test file for I2CSlaveGroup. This serves two I2C slaves from one loop: at
+# 0x44 on I2C0 (SDA pin 24, SCL pin 25) and at 0x45 on I2C1 (SDA pin 26,
+# SCL pin 27), without any support for a NeoPixel.
+#
+
+from i2c_slave import I2CSlave
+from i2c_slave_group import I2CSlaveGroup
+
+_group = I2CSlaveGroup(
+        I2CSlave(i2c_id=0, sda=24, scl=25, i2c_address=0x44, blink=False),
+        I2CSlave(i2c_id=1, sda=26, scl=27, i2c_address=0x45, blink=False))
+_group.enable()
+
+#EOF
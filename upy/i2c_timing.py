@@ -0,0 +1,93 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class I2CTiming(object):
+    '''
+    The slave-side timing registers for a given bus speed, computed from
+    the I2C specification's limits (UM10204 table 10) in cycles of the
+    system clock, which clocks the I2C peripheral:
+
+      IC_SDA_HOLD    the time SDA is held after SCL falls when transmitting:
+                     300ns, or 120ns in Fast-mode Plus (as the Pico SDK)
+      IC_SDA_SETUP   the data setup time tSU;DAT before SCL rises, plus one
+                     cycle, as the RP2040 datasheet recommends
+      IC_FS_SPKLEN   the longest spike suppressed, 50ns
+
+    The values are validated against the register widths and against the
+    specification's minimum SCL low time and maximum data valid time.
+
+    :param speed:       the bus speed in Hz, up to 1MHz
+    :param sys_clock:   the system clock in Hz; default is 125MHz
+    '''
+    STANDARD_MODE  = 100000
+    FAST_MODE      = 400000
+    FAST_MODE_PLUS = 1000000
+    SPIKE_NS       = 50
+
+    # maximum speed, tSU;DAT min, SDA hold, tLOW min, tVD;DAT max, all in ns
+    MODES = (
+        ( STANDARD_MODE,  250, 300, 4700, 3450 ),
+        ( FAST_MODE,      100, 300, 1300,  900 ),
+        ( FAST_MODE_PLUS,  50, 120,  500,  450 )
+    )
+
+    def __init__(self, speed, sys_clock=125000000):
+        if speed <= 0 or speed > self.FAST_MODE_PLUS:
+            raise ValueError('bus speed of {:d}Hz is not supported: 1MHz maximum.'.format(speed))
+        for _mode in self.MODES:
+            if speed <= _mode[0]:
+                break
+        _max_speed, _setup_ns, _hold_ns, _low_ns, _valid_ns = _mode
+        self._speed = speed
+        self._sys_clock = sys_clock
+        self._sda_hold  = self._cycles(_hold_ns) + 1
+        self._sda_setup = -( -sys_clock * _setup_ns // 1000000000 ) + 1
+        self._fs_spklen = max(1, -( -sys_clock * self.SPIKE_NS // 1000000000 ))
+        # validation
+        if self._sda_setup < 2 or self._sda_setup > 0xFF:
+            raise ValueError('IC_SDA_SETUP of {:d} cycles is out of range 2-255 at {:d}Hz.'.format(self._sda_setup, sys_clock))
+        if self._fs_spklen > 0xFF:
+            raise ValueError('IC_FS_SPKLEN of {:d} cycles is out of range 1-255 at {:d}Hz.'.format(self._fs_spklen, sys_clock))
+        if self._sda_hold > 0xFFFF or self._sda_hold >= self._cycles(_low_ns) - 2:
+            raise ValueError('IC_SDA_HOLD of {:d} cycles does not fit the SCL low time at {:d}Hz.'.format(self._sda_hold, sys_clock))
+        if self._sda_hold * 1000000000 // sys_clock >= _valid_ns:
+            raise ValueError('IC_SDA_HOLD of {:d} cycles exceeds the data valid time at {:d}Hz.'.format(self._sda_hold, sys_clock))
+
+    def _cycles(self, ns):
+        return self._sys_clock * ns // 1000000000
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @property
+    def sys_clock(self):
+        return self._sys_clock
+
+    @property
+    def sda_hold(self):
+        return self._sda_hold
+
+    @property
+    def sda_setup(self):
+        return self._sda_setup
+
+    @property
+    def fs_spklen(self):
+        return self._fs_spklen
+
+    def __str__(self):
+        return 'I2CTiming: {:d}Hz at {:d}Hz; sda_hold={:d}; sda_setup={:d}; fs_spklen={:d}'.format(
+                self._speed, self._sys_clock, self._sda_hold, self._sda_setup, self._fs_spklen)
+
+#EOF
@@ -0,0 +1,191 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import micropython
+from i2c_slave import I2CSlave
+from bus_trace import BusTrace
+
+from colors import*
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class I2CTransferSlave(I2CSlave):
+    '''
+    An I2CSlave in binary mode that also receives messages longer than one
+    frame, such as configuration blobs or waypoint lists, reassembling them
+    into a preallocated buffer. Frames written to other registers are
+    handled as usual.
+
+    A transfer is a BEGIN frame giving the total length as four bytes, least
+    significant first, then CHUNK frames, each holding a two-byte sequence
+    number (least significant first) and up to CHUNK_SIZE bytes of data.
+    Chunks are accepted only in order: one out of sequence is dropped, and
+    the following chunks with it, until the master goes back to it.
+
+    The master sends a window of chunks, then reads a three-byte
+    acknowledgement from the ACK register: a response code, then the
+    sequence number of the next chunk expected. OKAY means every chunk so
+    far has been accepted; OUT_OF_SYNC means some were dropped and the
+    master should resume from the sequence number given. Any other code
+    ends the transfer. Once every byte has arrived the message is passed to
+    transfer_received().
+
+    Acknowledgements are sent with respond_with(), which is supported in
+    polled mode only.
+
+    :param: capacity      the largest message in bytes; default is 4096
+    :param: kwargs        the I2CSlave constructor arguments
+    '''
+    BEGIN_REGISTER = 0xB0
+    CHUNK_REGISTER = 0xB1
+    ACK_REGISTER   = 0xB2
+    CHUNK_SIZE     = I2CSlave.MAX_CHARS - 2
+    ACK_LENGTH     = 3
+
+    def __init__(self, capacity=4096, **kwargs):
+        if kwargs.get('irq'):
+            raise ValueError('I2CTransferSlave does not support IRQ mode.')
+        kwargs['binary'] = True
+        self._message = bytearray(capacity)
+        self._capacity = capacity
+        self._ack = bytearray(self.ACK_LENGTH)
+        self._total = 0
+        self._received = 0
+        self._next_sequence = 0
+        self._active = False
+        self._status = self.OKAY
+        self.chunks_received = 0
+        self.chunks_dropped = 0
+        self.transfers_received = 0
+        super().__init__(**kwargs)
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _frame_received(self):
+        _register = self._parser.address
+        if _register == self.CHUNK_REGISTER:
+            self._chunk(self._frame)
+        elif _register == self.BEGIN_REGISTER:
+            self._begin(self._frame)
+        else:
+            super()._frame_received()
+
+    def _begin(self, frame):
+        if frame.length() != 4:
+            self._end_transfer(self.OUT_OF_SYNC, 'transfer rejected: BEGIN frame of {:d} bytes.', frame.length())
+            return
+        _data = frame.buffer
+        _total = _data[0] | ( _data[1] << 8 ) | ( _data[2] << 16 ) | ( _data[3] << 24 )
+        if _total > self._capacity:
+            self._end_transfer(self.SOURCE_TOO_LARGE, 'transfer rejected: {:d} bytes exceeds capacity of {:d}.', _total, self._capacity)
+            return
+        self._total = _total
+        self._received = 0
+        self._next_sequence = 0
+        self._active = True
+        self._status = self.OKAY
+        self.status('transfer: {:d} bytes'.format(_total), COLOR_BLUE)
+        if _total == 0:
+            self._complete()
+
+    def _chunk(self, frame):
+        if not self._active:
+            # e.g. chunks that follow a rejected BEGIN
+            self.chunks_dropped += 1
+            return
+        _count = frame.length() - 2
+        _data = frame.buffer
+        _sequence = _data[0] | ( _data[1] << 8 )
+        if _count < 0 or _sequence != self._next_sequence:
+            # resent or out of order: the master resumes from the acknowledgement
+            self.chunks_dropped += 1
+            self._status = self.OUT_OF_SYNC
+            return
+        if self._received + _count > self._total:
+            self._end_transfer(self.PAYLOAD_TOO_LARGE, 'transfer failed: more than {:d} bytes sent.', self._total)
+            return
+        self._received = self._store(_data, 2, _count + 2, self._received)
+        self._next_sequence = ( _sequence + 1 ) & 0xFFFF
+        self.chunks_received += 1
+        if self._received == self._total:
+            self._complete()
+
+    @micropython.native
+    def _store(self, buf, start, end, offset):
+        '''
+        Copies buf[start:end] into the message at offset, returning the new
+        offset.
+        '''
+        _message = self._message
+        while start < end:
+            _message[offset] = buf[start]
+            offset += 1
+            start += 1
+        return offset
+
+    def _complete(self):
+        self._active = False
+        self._status = self.OKAY
+        self.transfers_received += 1
+        self.transfer_received(memoryview(self._message)[:self._total], self._total)
+
+    def _end_transfer(self, code, message, *values):
+        '''
+        Ends the transfer with the error code, acknowledged on the next read
+        of the ACK register. As with an I2CSlaveError the message is only
+        formatted from its values to be printed: with a bus trace the code
+        is recorded instead.
+        '''
+        self._active = False
+        self._status = code
+        self.error_count += 1
+        self._count_error(code)
+        if self._trace:
+            self._trace.record(BusTrace.ERROR, self._parser.address, 0, code)
+            self.status(None, COLOR_RED)
+        else:
+            _message = message.format(*values)
+            self.status(_message, COLOR_RED)
+            print(_message)
+
+    def _request(self):
+        '''
+        Answers a read of the ACK register with the acknowledgement; other
+        reads are answered as usual.
+        '''
+        if self._tx_active:
+            # the master has read past the end of the acknowledgement
+            self.write_response(0xFF)
+        elif self._currentTransaction.address == self.ACK_REGISTER:
+            _ack = self._ack
+            _ack[0] = self._status
+            _ack[1] = self._next_sequence & 0xFF
+            _ack[2] = self._next_sequence >> 8
+            if self._status == self.OUT_OF_SYNC and self._active:
+                # the master now resumes from the next chunk expected
+                self._status = self.OKAY
+            self.respond_with(_ack)
+            self._transmit()
+        else:
+            super()._request()
+
+    def transfer_received(self, message, length):
+        '''
+        Called with a memoryview of the reassembled message once all length
+        bytes have arrived. The buffer is reused by the next transfer, so
+        this should copy anything it keeps. This can be overridden to act on
+        the message.
+        '''
+        self.status('transfer complete: {:d} bytes'.format(length), COLOR_GREEN)
+
+#EOF
@@ -0,0 +1,33 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+# Test file for I2CTransferSlave. This receives chunked transfers of up to
+# 4KB, printing the length and a simple checksum of each, without any
+# support for a NeoPixel. From the master, for example:
+#
+#   from i2c_master import I2CMaster
+#   I2CMaster().send_stream(bytes(range(256)) * 8)
+#
+
+from i2c_transfer_slave import I2CTransferSlave
+
+class TransferTest(I2CTransferSlave):
+
+    def transfer_received(self, message, length):
+        _sum = 0
+        for _byte in message:
+            _sum = ( _sum + _byte ) & 0xFFFF
+        print('received {:d} bytes; checksum: 0x{:04X}'.format(length, _sum))
+
+_i2c_slave = TransferTest(capacity=4096)
+_i2c_slave.enable()
+
+#EOF
@@ -0,0 +1,92 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-20
+# modified: 2024-08-20
+#
+
+import micropython
+from array import array
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class RingBuffer(object):
+    '''
+    A fixed-capacity FIFO of unsigned integers, allocated once so that it
+    may be filled from an interrupt handler.
+
+    There is a single producer and a single consumer: put() only moves the
+    head and get() only moves the tail, so neither side needs interrupts
+    disabled. Both indices run modulo twice the capacity, which tells a
+    full buffer from an empty one without a separate count.
+
+    :param capacity:  the number of entries, a power of two; default 256
+    :param typecode:  the array typecode of an entry; default 'I' (32 bits)
+    '''
+    def __init__(self, capacity=256, typecode='I'):
+        if capacity < 2 or capacity & ( capacity - 1 ):
+            raise ValueError('capacity must be a power of two.')
+        self._buffer = array(typecode, [0] * capacity)
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._wrap = ( capacity << 1 ) - 1
+        self._head = 0
+        self._tail = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @micropython.native
+    def put(self, value):
+        '''
+        Appends the value, returning False if the buffer is full.
+        '''
+        _head = self._head
+        if (( _head - self._tail ) & self._wrap ) == self._capacity:
+            return False
+        self._buffer[_head & self._mask] = value
+        self._head = ( _head + 1 ) & self._wrap
+        return True
+
+    @micropython.native
+    def get(self):
+        '''
+        Removes and returns the oldest value, or None if the buffer is empty.
+        '''
+        _tail = self._tail
+        if _tail == self._head:
+            return None
+        _value = self._buffer[_tail & self._mask]
+        self._tail = ( _tail + 1 ) & self._wrap
+        return _value
+
+    @micropython.native
+    def peek(self):
+        '''
+        Returns the oldest value without removing it, or None if empty.
+        '''
+        if self._tail == self._head:
+            return None
+        return self._buffer[self._tail & self._mask]
+
+    def is_empty(self):
+        return self._tail == self._head
+
+    def is_full(self):
+        return (( self._head - self._tail ) & self._wrap ) == self._capacity
+
+    def __len__(self):
+        return ( self._head - self._tail ) & self._wrap
+
+    def clear(self):
+        '''
+        Discards the contents. Only the consumer may call this.
+        '''
+        self._tail = self._head
+
+#EOF
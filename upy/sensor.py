@@ -7,7 +7,7 @@
 #
 # author:   Murray Altheim
 # created:  2024-08-18
-# modified: 2024-08-18
+# modified: 2024-08-21
 #
 # An example class that extends I2CDriver (which extends I2CSlave),
 # to return the value of a generic GPIO pin-based sensor.
@@ -24,8 +24,8 @@ class Sensor(I2CDriver):
     '''
     A simple class to read the value of a GPIO pin.
     '''
-    def __init__(self, pin=18):
-        I2CDriver.__init__(self)
+    def __init__(self, pin=18, core1=False):
+        I2CDriver.__init__(self, core1=core1)
         self._pin = Pin(18, Pin.IN)
 
     @property
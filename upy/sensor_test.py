@@ -7,13 +7,15 @@
 #
 # author:   Murray Altheim
 # created:  2024-08-18
-# modified: 2024-08-18
+# modified: 2024-08-21
 #
 # This is a test script for the Sensor class, which extends I2CDriver to
 # return the value of a generic GPIO pin-based sensor. The enumerated
 # set of single byte response codes is likewise extended to return new
 # values suitable to the sensor ("on" or "off").
 #
+# The slave loop runs on core 1, leaving this loop free on core 0.
+#
 
 import sys
 import utime
@@ -23,10 +25,11 @@ from sensor import Sensor
 
 try:
 
-    _sensor = Sensor(18)
+    _sensor = Sensor(18, core1=True)
     _sensor.enable()
 
     while True:
+        print('sensor: {}'.format('on' if _sensor.on else 'off'))
         utime.sleep(3)
 
 except KeyboardInterrupt:
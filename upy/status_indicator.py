@@ -0,0 +1,120 @@
+#!/micropython
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020-2024 by Murray Altheim. All rights reserved. This file is part
+# of the Robot Operating System project, released under the MIT License. Please
+# see the LICENSE file included as part of this package.
+#
+# author:   Murray Altheim
+# created:  2024-08-21
+# modified: 2024-08-21
+#
+
+import utime
+from machine import Timer
+from colors import COLOR_BLACK
+
+# ┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈┈
+class StatusIndicator(object):
+    '''
+    Takes the status updates of an I2CSlave off the bus loop. post() only
+    records the latest message and color, so it never sleeps or touches the
+    LED; a periodic timer then calls render(), which passes the latest
+    status to the callback. Updates posted between two ticks are coalesced,
+    the last one winning, and a color already shown is not shown again
+    unless it comes with a message.
+
+    As the callback may allocate, e.g. to print or write a NeoPixel, the
+    timer is created with hard=False: it runs as a scheduled callback
+    rather than in interrupt context.
+
+    A status may be posted with a hold time, after which the indicator is
+    turned off (COLOR_BLACK), in place of sleeping between the two. The
+    hold is measured from the tick that shows it, so it lasts at least one
+    timer period.
+
+    The counters 'posted' and 'rendered' compare the updates posted with
+    those passed to the callback.
+
+    :param callback:  called with a message (which may be None) and an RGB
+                      color tuple to display the status
+    :param freq:      the timer frequency in Hz; default is 50
+    '''
+    def __init__(self, callback, freq=50):
+        self._callback = callback
+        self._freq = freq
+        self._timer = None
+        self._message = None
+        self._color = COLOR_BLACK
+        self._hold_ms = 0
+        self._pending = False
+        self._shown = None
+        self._shown_at = 0
+        self._hold = 0
+        self._off_pending = False
+        self.posted = 0
+        self.rendered = 0
+
+    def start(self):
+        '''
+        Starts the soft timer that renders posted updates.
+        '''
+        if self._timer is None:
+            self._timer = Timer(freq=self._freq, mode=Timer.PERIODIC, callback=self._tick, hard=False)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def post(self, message, color, hold_ms=0):
+        '''
+        Records a status to be shown at the next tick, replacing any not yet
+        shown. With hold_ms set the indicator is turned off that long after.
+        This neither allocates nor blocks.
+        '''
+        self._message = message
+        self._color = color
+        self._hold_ms = hold_ms
+        # set last: a tick taken part way through a post sees it complete at the next
+        self._pending = True
+        self.posted += 1
+
+    def show(self, message, color):
+        '''
+        Shows a status at once, for use outside the bus loop, e.g. at startup.
+        '''
+        self._pending = False
+        self._off_pending = False
+        self._render(message, color)
+
+    def _tick(self, timer):
+        self.render()
+
+    def render(self):
+        '''
+        Shows the latest status posted, or turns the indicator off once a
+        held status has expired. Called by the timer, or directly by an
+        application loop that runs the indicator without one.
+        '''
+        if self._pending:
+            self._pending = False
+            _message = self._message
+            _color = self._color
+            _hold_ms = self._hold_ms
+            if _color != self._shown or _message is not None:
+                self._render(_message, _color)
+            self._shown_at = utime.ticks_ms()
+            self._hold = _hold_ms
+            self._off_pending = _hold_ms > 0
+        elif self._off_pending and utime.ticks_diff(utime.ticks_ms(), self._shown_at) >= self._hold:
+            self._off_pending = False
+            if self._shown != COLOR_BLACK:
+                self._render(None, COLOR_BLACK)
+
+    def _render(self, message, color):
+        self._shown = color
+        self.rendered += 1
+        self._callback(message, color)
+
+#EOF